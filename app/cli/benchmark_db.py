@@ -0,0 +1,185 @@
+"""
+Measure insert throughput and lookup latency of the SQLite storage profiles.
+
+Usage:
+    python -m app.cli.benchmark_db [--rows 1000000] [--writers 32] [--inserts 20] [--lookups 1000] [--configs original wal wal+group]
+
+Each configuration runs in a fresh process on its own database file:
+
+    original   SQLITE_PROFILE=default, no invoice_type/created_at indexes, one transaction per write
+    wal        SQLITE_PROFILE=performance with the indexes, one transaction per write
+    wal+group  as wal, with concurrent writes group-committed (DB_GROUP_COMMIT_MAX_BATCH)
+
+The database is first loaded with --rows parsed invoices and their PDF rows
+(search index included) in bulk batches. Then --writers concurrent tasks
+each store --inserts invoices the way the ingestion pipeline does, and
+--lookups record queries are timed: newest invoices of one type, the
+newest overall, and a single invoice by id with its PDFs. The report shows
+bulk and concurrent insert rates, lookup p50/p99 and the database size.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+# Configuration name: (SQLITE_PROFILE, group commit, invoice_type/created_at indexes)
+CONFIGS = {
+    "original": ("default", False, False),
+    "wal": ("performance", False, True),
+    "wal+group": ("performance", True, True),
+}
+INVOICE_TYPES = ["proforma_invoice", "sales_invoice", "purchase_invoice", "credit_note", "debit_note"]
+LOAD_BATCH = 10000
+INDEXED_COLUMNS = {"invoice_type", "created_at"}
+
+def _invoice_rows(start: int, count: int, now: datetime) -> tuple[list[dict], list[dict]]:
+    jsons, pdfs = [], []
+    for no in range(start, start + count):
+        created_at = now - timedelta(seconds=no)
+        json_id = str(uuid.uuid4())
+        invoice_type = INVOICE_TYPES[no % len(INVOICE_TYPES)]
+        jsons.append({
+            "id": json_id, "created_at": created_at, "updated_at": created_at, "invoice_type": invoice_type,
+            "json_data": f'{{"invoice_number":"INV-{no:07d}","amount":{no % 10000}.5}}',
+            "invoice_number": f"INV-{no:07d}", "amount": no % 10000 + 0.5, "billed_to": f"Customer {no % 5000}",
+        })
+        pdfs.append({
+            "id": str(uuid.uuid4()), "created_at": created_at, "updated_at": created_at, "invoice_type": invoice_type,
+            "filename": f"invoice-{no}.pdf", "invoice_json_id": json_id,
+            "extracted_text": f"INVOICE INV-{no:07d} billed to Customer {no % 5000} consulting services",
+        })
+    return jsons, pdfs
+
+def _drop_type_created_indexes(engine):
+    # The schema before the storage profile: only the primary keys and lookup fields were indexed
+    from sqlalchemy import inspect, text
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in ("invoice_jsons", "invoice_pdfs"):
+            for index in inspector.get_indexes(table):
+                if INDEXED_COLUMNS & set(index["column_names"]):
+                    conn.execute(text(f'DROP INDEX "{index["name"]}"'))
+
+def _percentiles(latencies: list[float]) -> tuple[float, float]:
+    latencies = sorted(latencies)
+    return statistics.median(latencies) * 1000, latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+
+def _bench_config(config: str, rows: int, writers: int, inserts: int, lookups: int, workdir: str) -> dict:
+    # Runs in its own process; settings are read from the environment on import
+    profile, group_commit, indexed = CONFIGS[config]
+    path = os.path.join(workdir, "invoices.db")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite+aiosqlite:///{path}",
+        "SQLITE_PROFILE": profile,
+        "LOG_DIR": "",
+        "LOG_LEVEL": "WARNING",
+    })
+    if not group_commit:
+        os.environ["DB_GROUP_COMMIT_MAX_BATCH"] = "1"
+    from app.core.db_config import SessionLocal, dispose_async_engine, engine, init_db
+    from app.core.db_writer import db_writer
+    from app.models.invoice_json import InvoiceJSON
+    from app.models.invoice_pdf import InvoicePDF
+    from app.services.records import get_invoice, list_invoices
+
+    init_db()
+    if not indexed:
+        _drop_type_created_indexes(engine)
+
+    now = datetime.utcnow()
+    start = time.perf_counter()
+    for batch_start in range(0, rows, LOAD_BATCH):
+        jsons, pdfs = _invoice_rows(batch_start, min(LOAD_BATCH, rows - batch_start), now)
+        with engine.begin() as conn:
+            conn.execute(InvoiceJSON.__table__.insert(), jsons)
+            conn.execute(InvoicePDF.__table__.insert(), pdfs)
+    bulk_seconds = time.perf_counter() - start
+
+    async def store(db, json_row: dict, pdf_row: dict):
+        db.add(InvoiceJSON(**json_row))
+        db.add(InvoicePDF(**pdf_row))
+
+    async def writer(first: int):
+        jsons, pdfs = _invoice_rows(first, inserts, datetime.utcnow())
+        for json_row, pdf_row in zip(jsons, pdfs):
+            await db_writer.submit(store, json_row, pdf_row)
+
+    async def concurrent_inserts() -> float:
+        start = time.perf_counter()
+        await asyncio.gather(*(writer(rows + no * inserts) for no in range(writers)))
+        elapsed = time.perf_counter() - start
+        await db_writer.aclose()
+        await dispose_async_engine()
+        return elapsed
+
+    insert_seconds = asyncio.run(concurrent_inserts())
+
+    with engine.connect() as conn:
+        sample_ids = [row[0] for row in conn.exec_driver_sql(
+            "SELECT id FROM invoice_jsons ORDER BY random() LIMIT ?", (min(lookups, 1000),)
+        )]
+    timings = {"by_type": [], "newest": [], "by_id": []}
+    with SessionLocal() as db:
+        for no in range(lookups):
+            start = time.perf_counter()
+            list_invoices(db, invoice_type=random.choice(INVOICE_TYPES), limit=20)
+            timings["by_type"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            list_invoices(db, limit=20)
+            timings["newest"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            get_invoice(db, sample_ids[no % len(sample_ids)])
+            timings["by_id"].append(time.perf_counter() - start)
+            db.rollback()
+    engine.dispose()
+    size = sum(os.path.getsize(f"{path}{suffix}") for suffix in ("", "-wal") if os.path.exists(f"{path}{suffix}"))
+    return {
+        "bulk_per_second": rows / bulk_seconds if rows else 0.0,
+        "insert_per_second": writers * inserts / insert_seconds,
+        **{f"{name}_ms": _percentiles(latencies) for name, latencies in timings.items()},
+        "size_mb": size / (1024 * 1024),
+    }
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure insert throughput and lookup latency of the storage profiles.")
+    parser.add_argument("--rows", type=int, default=1000000, help="Invoices loaded before measuring")
+    parser.add_argument("--writers", type=int, default=32, help="Concurrent writer tasks")
+    parser.add_argument("--inserts", type=int, default=20, help="Invoices stored per writer")
+    parser.add_argument("--lookups", type=int, default=1000, help="Timed lookups of each kind")
+    parser.add_argument("--configs", nargs="+", choices=list(CONFIGS), default=list(CONFIGS))
+    args = parser.parse_args(argv)
+
+    print(f"{args.rows} invoices loaded; {args.writers} writers x {args.inserts} invoices; {args.lookups} lookups each")
+    print(
+        f"{'config':<10} {'bulk/s':>8} {'writes/s':>9} {'type p50/p99 ms':>16} {'newest p50/p99 ms':>18} "
+        f"{'by id p50/p99 ms':>17} {'size MB':>8}"
+    )
+    context = multiprocessing.get_context("spawn")
+    for config in args.configs:
+        workdir = tempfile.mkdtemp(prefix="benchmark-db-")
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                row = pool.submit(
+                    _bench_config, config, args.rows, args.writers, args.inserts, args.lookups, workdir
+                ).result()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        latencies = [f"{row[name][0]:.2f}/{row[name][1]:.2f}" for name in ("by_type_ms", "newest_ms", "by_id_ms")]
+        print(
+            f"{config:<10} {row['bulk_per_second']:>8.0f} {row['insert_per_second']:>9.0f} {latencies[0]:>16} "
+            f"{latencies[1]:>18} {latencies[2]:>17} {row['size_mb']:>8.1f}"
+        )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
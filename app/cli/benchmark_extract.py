@@ -0,0 +1,183 @@
+"""
+Benchmark the PDF text extraction backends on a corpus of sample invoices.
+
+Usage:
+    python -m app.cli.benchmark_extract [--backends tempfile pymupdf pdfplumber auto] [--pages 1 5 20] [--repeat 5] [--corpus DIR]
+    python -m app.cli.benchmark_extract --sharding [--pages 10 50 200] [--workers 4] [--repeat 3]
+
+Without --corpus, invoices are generated in two layouts: plain text lines
+and ruled tables (the layout auto hands to pdfplumber). With --corpus, every
+*.pdf in DIR is used instead. The tempfile backend is the original path:
+write the upload to a temporary file, open it and concatenate the pages.
+For every document the report shows the mean and worst latency per backend,
+pages extracted per second and the length of the extracted text, so missing
+text shows up next to the speed.
+
+With --sharding, generated text invoices are extracted with pymupdf by one
+pool worker and then split into page ranges across --workers warm worker
+processes, read from one spooled file as the ingestion pipeline does. The
+report shows both latencies and the speedup per page count, which is what
+PAGE_SHARD_THRESHOLD should be tuned against.
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_PAGES = [1, 5, 20]
+DEFAULT_SHARD_PAGES = [10, 50, 200]
+BACKEND_TEMPFILE = "tempfile"
+
+def sample_pdf(pages: int, table: bool = False, rows: int = 30, number: int = 0) -> bytes:
+    """
+    Deterministic invoice PDF with the given number of pages.
+
+    Args:
+        pages (int): Page count.
+        table (bool): Draw each page's line items as a ruled table instead of plain text lines.
+        rows (int): Line items per page.
+        number (int): Invoice number printed on every page, to make distinct documents.
+
+    Returns:
+        bytes: The PDF.
+    """
+    import fitz
+
+    doc = fitz.open()
+    for page_no in range(pages):
+        page = doc.new_page()
+        page.insert_text((50, 50), f"INVOICE INV-{number:06d} page {page_no + 1} of {pages}", fontsize=14)
+        page.insert_text((50, 70), "Billed to: Raghavendra, Dhanban Jharkhand 826001", fontsize=9)
+        for row in range(rows):
+            no = page_no * rows + row + 1
+            y = 100 + row * 22
+            cells = [str(no), f"Consulting services phase {no % 12 + 1}", str(no % 7 + 1), f"{10 + no * 37 % 1000 / 7:.2f}"]
+            for x, text in zip((55, 95, 400, 470), cells):
+                page.insert_text((x, y + 15), text, fontsize=9)
+            if table:
+                page.draw_rect(fitz.Rect(50, y, 545, y + 22), width=0.5)
+                for x in (90, 395, 465):
+                    page.draw_line((x, y), (x, y + 22), width=0.5)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def _extract_tempfile(data: bytes) -> str:
+    # The original extraction path, kept as the baseline
+    import fitz
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp:
+        temp.write(data)
+    try:
+        text = ""
+        with fitz.open(temp.name) as pdf:
+            for page in pdf:
+                page_text = page.get_text("text")
+                if page_text:
+                    text += page_text
+        return text
+    finally:
+        os.remove(temp.name)
+
+def _extract(data: bytes, backend: str) -> str:
+    from app.utils.pdf_extract import extract_text
+
+    if backend == BACKEND_TEMPFILE:
+        return _extract_tempfile(data)
+    return extract_text(data, backend)
+
+def _corpus(args) -> list[tuple[str, bytes]]:
+    if args.corpus:
+        documents = []
+        for path in sorted(glob.glob(os.path.join(args.corpus, "*.pdf"))):
+            with open(path, "rb") as pdf_file:
+                documents.append((os.path.basename(path), pdf_file.read()))
+        return documents
+    return [
+        (f"{layout} {pages}p", sample_pdf(pages, table=layout == "table"))
+        for layout in ("text", "table")
+        for pages in args.pages
+    ]
+
+def _bench_sharding(pages: list[int], workers: int, repeat: int):
+    from app.utils.pdf_extract import BACKEND_PYMUPDF, extract_page_range, extract_text, page_ranges
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as single, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=context) as sharded:
+        # Warm both pools so worker start-up and imports are not timed
+        warmup = sample_pdf(1)
+        single.submit(extract_text, warmup, BACKEND_PYMUPDF).result()
+        for future in [sharded.submit(extract_text, warmup, BACKEND_PYMUPDF) for _ in range(workers)]:
+            future.result()
+
+        print(f"{'pages':>6} {'shards':>7} {'single ms':>10} {'sharded ms':>11} {'speedup':>8}")
+        for page_count in pages:
+            data = sample_pdf(page_count)
+            ranges = page_ranges(page_count, workers)
+            with tempfile.NamedTemporaryFile(prefix="shard-", suffix=".pdf", delete=False) as spool:
+                spool.write(data)
+            try:
+                single_times, sharded_times = [], []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    single.submit(extract_text, data, BACKEND_PYMUPDF).result()
+                    single_times.append(time.perf_counter() - start)
+
+                    start = time.perf_counter()
+                    futures = [
+                        sharded.submit(extract_page_range, spool.name, first, end, BACKEND_PYMUPDF)
+                        for first, end in ranges
+                    ]
+                    "\n".join(future.result() for future in futures)
+                    sharded_times.append(time.perf_counter() - start)
+            finally:
+                os.remove(spool.name)
+            single_ms = statistics.mean(single_times) * 1000
+            sharded_ms = statistics.mean(sharded_times) * 1000
+            print(f"{page_count:>6} {len(ranges):>7} {single_ms:>10.1f} {sharded_ms:>11.1f} {single_ms / sharded_ms:>7.2f}x")
+
+def main(argv: list[str] | None = None) -> int:
+    from app.utils.pdf_extract import BACKEND_AUTO, BACKEND_PDFPLUMBER, BACKEND_PYMUPDF, open_pdf
+
+    backends = [BACKEND_TEMPFILE, BACKEND_PYMUPDF, BACKEND_PDFPLUMBER, BACKEND_AUTO]
+    parser = argparse.ArgumentParser(description="Benchmark the PDF text extraction backends.")
+    parser.add_argument("--backends", nargs="+", choices=backends, default=backends)
+    parser.add_argument("--pages", nargs="+", type=int, help="Pages per generated invoice")
+    parser.add_argument("--repeat", type=int, default=5, help="Extractions per document and backend")
+    parser.add_argument("--corpus", help="Directory of PDFs to use instead of generated invoices")
+    parser.add_argument("--sharding", action="store_true", help="Measure the sharding speedup by page count instead")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Pool workers when sharding")
+    args = parser.parse_args(argv)
+
+    if args.sharding:
+        _bench_sharding(args.pages or DEFAULT_SHARD_PAGES, args.workers, args.repeat)
+        return 0
+    args.pages = args.pages or DEFAULT_PAGES
+    documents = _corpus(args)
+    if not documents:
+        print(f"No PDFs found in {args.corpus}")
+        return 1
+    print(f"{'document':<16} {'backend':<11} {'mean ms':>9} {'max ms':>9} {'pages/s':>9} {'chars':>8}")
+    for name, data in documents:
+        with open_pdf(data) as doc:
+            page_count = doc.page_count
+        for backend in args.backends:
+            latencies = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                text = _extract(data, backend)
+                latencies.append(time.perf_counter() - start)
+            print(
+                f"{name[:16]:<16} {backend:<11} {statistics.mean(latencies) * 1000:>9.1f} {max(latencies) * 1000:>9.1f} "
+                f"{page_count * len(latencies) / sum(latencies):>9.0f} {len(text):>8}"
+            )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+Simulate a multi-chat upload load to check scheduling fairness and reply throttling.
+
+Usage:
+    python -m app.cli.benchmark_fair_queue [--heavy 2] [--heavy-uploads 50] [--light 20] [--workers 4] [--job-ms 200]
+
+--heavy chats each upload --heavy-uploads PDFs at once, and --light chats
+upload one PDF each during the first second. --workers workers process the
+jobs, each taking --job-ms, and send the confirmation through the bot
+outbox with Telegram's limits (BOT_SEND_RATE, BOT_CHAT_SEND_RATE,
+BOT_CHAT_SEND_BURST) to a stub bot. Schedulers compared:
+
+    fifo        one queue in arrival order, no quota, as before
+    fair        FairQueue: round-robin across chats, no quota
+    fair+quota  FairQueue, and uploads beyond QUEUE_MAX_PER_CHAT jobs in progress are refused
+
+The report shows jobs per second, the time from upload to processed for
+light and heavy chats, the refused uploads, and the outbox: how long until
+the last reply was delivered, how often it throttled, and the most messages
+seen in any one second overall and to a single chat.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+SCHEDULERS = ["fifo", "fair", "fair+quota"]
+
+class _StubBot:
+    """Records the delivery time of every message per chat."""
+
+    def __init__(self):
+        self.sent: dict[str, list[float]] = defaultdict(list)
+
+    async def send_message(self, chat_id, text: str, **kwargs):
+        self.sent[str(chat_id)].append(time.perf_counter())
+
+def _max_per_second(times: list[float]) -> int:
+    times = sorted(times)
+    most, first = 0, 0
+    for last, sent_at in enumerate(times):
+        while sent_at - times[first] >= 1.0:
+            first += 1
+        most = max(most, last - first + 1)
+    return most
+
+def _percentiles(latencies: list[float]) -> tuple[float, float, float]:
+    if not latencies:
+        return 0.0, 0.0, 0.0
+    latencies = sorted(latencies)
+    return (
+        statistics.median(latencies),
+        latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        latencies[-1],
+    )
+
+async def _simulate(scheduler: str, args) -> dict:
+    from app.core.config import settings
+    from app.core.rate_limit import RateLimit
+    from app.services.bot_outbox import BotOutbox
+    from app.utils.fair_queue import FairQueue
+
+    bot = _StubBot()
+    outbox = BotOutbox(
+        global_limit=RateLimit(settings.BOT_SEND_RATE, 1.0, settings.BOT_SEND_RATE),
+        chat_limit=RateLimit(settings.BOT_CHAT_SEND_RATE, 1.0, settings.BOT_CHAT_SEND_BURST),
+        group_limit=RateLimit(settings.BOT_GROUP_SEND_PER_MINUTE, 60.0, settings.BOT_GROUP_SEND_PER_MINUTE),
+        max_pending_per_chat=args.heavy_uploads + 1,
+    )
+    outbox.start(bot)
+    fair = scheduler != "fifo"
+    quota = settings.QUEUE_MAX_PER_CHAT if scheduler == "fair+quota" else None
+    queue = FairQueue() if fair else asyncio.Queue()
+    in_progress: dict[str, int] = defaultdict(int)
+    latencies = {"light": [], "heavy": []}
+    refused = 0
+    processed = 0
+    all_processed = asyncio.Event()
+    expected = 0
+    start = time.perf_counter()
+
+    def upload(kind: str, chat_id: str):
+        nonlocal refused, expected
+        if quota is not None and in_progress[chat_id] >= quota:
+            refused += 1
+            return
+        in_progress[chat_id] += 1
+        expected += 1
+        job = (kind, chat_id, time.perf_counter())
+        if fair:
+            queue.put_nowait(chat_id, job)
+        else:
+            queue.put_nowait(job)
+
+    async def worker():
+        nonlocal processed
+        while True:
+            kind, chat_id, queued_at = await queue.get()
+            await asyncio.sleep(args.job_ms / 1000)
+            latencies[kind].append(time.perf_counter() - queued_at)
+            in_progress[chat_id] -= 1
+            outbox.send(chat_id, "Record Saved into sales_invoice table")
+            processed += 1
+            if processed == expected and arrivals.done():
+                all_processed.set()
+
+    async def light_arrivals():
+        rng = random.Random(19)
+        offsets = sorted(rng.uniform(0.05, 1.0) for _ in range(args.light))
+        for no, offset in enumerate(offsets):
+            await asyncio.sleep(max(0.0, start + offset - time.perf_counter()))
+            upload("light", str(2000 + no))
+
+    for no in range(args.heavy):
+        for _ in range(args.heavy_uploads):
+            upload("heavy", str(1000 + no))
+    workers = [asyncio.create_task(worker()) for _ in range(args.workers)]
+    arrivals = asyncio.create_task(light_arrivals())
+    await arrivals
+    if processed == expected:
+        all_processed.set()
+    await all_processed.wait()
+    processed_seconds = time.perf_counter() - start
+    for task in workers:
+        task.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    await outbox.stop(timeout=args.heavy_uploads * 2 + 10)
+    sent = [sent_at for times in bot.sent.values() for sent_at in times]
+    return {
+        "per_second": processed / processed_seconds,
+        "light": _percentiles(latencies["light"]),
+        "heavy": _percentiles(latencies["heavy"]),
+        "refused": refused,
+        "delivered_s": max(sent) - start if sent else 0.0,
+        "throttled": outbox.counters["throttled"],
+        "max_global": _max_per_second(sent),
+        "max_chat": max((_max_per_second(times) for times in bot.sent.values()), default=0),
+    }
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Simulate multi-chat load on the fair scheduler and bot outbox.")
+    parser.add_argument("--heavy", type=int, default=2, help="Chats uploading many PDFs at once")
+    parser.add_argument("--heavy-uploads", type=int, default=50, help="PDFs uploaded by each heavy chat")
+    parser.add_argument("--light", type=int, default=20, help="Chats uploading one PDF each")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent processing workers")
+    parser.add_argument("--job-ms", type=int, default=200, help="Processing time of one PDF")
+    parser.add_argument("--schedulers", nargs="+", choices=SCHEDULERS, default=SCHEDULERS)
+    args = parser.parse_args(argv)
+
+    from app.core.config import settings
+
+    print(
+        f"{args.heavy} chats x {args.heavy_uploads} PDFs, {args.light} chats x 1 PDF; {args.workers} workers x "
+        f"{args.job_ms} ms; sends {settings.BOT_SEND_RATE}/s overall, {settings.BOT_CHAT_SEND_RATE}/s per chat "
+        f"(burst {settings.BOT_CHAT_SEND_BURST})"
+    )
+    print(
+        f"{'scheduler':<11} {'jobs/s':>7} {'light p50/p99/max s':>20} {'heavy p50/max s':>16} {'refused':>8} "
+        f"{'delivered s':>12} {'throttled':>10} {'max/s':>6} {'chat max/s':>11}"
+    )
+    for scheduler in args.schedulers:
+        row = asyncio.run(_simulate(scheduler, args))
+        light, heavy = row["light"], row["heavy"]
+        print(
+            f"{scheduler:<11} {row['per_second']:>7.1f} {f'{light[0]:.2f}/{light[1]:.2f}/{light[2]:.2f}':>20} "
+            f"{f'{heavy[0]:.2f}/{heavy[2]:.2f}':>16} {row['refused']:>8} {row['delivered_s']:>12.2f} "
+            f"{row['throttled']:>10} {row['max_global']:>6} {row['max_chat']:>11}"
+        )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
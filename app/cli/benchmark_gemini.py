@@ -0,0 +1,148 @@
+"""
+Measure Gemini client latency under concurrency against a local fake API.
+
+Usage:
+    python -m app.cli.benchmark_gemini [--concurrency 1 8 32] [--requests 200] [--latency-ms 200] [--error-rate 0.05]
+
+A fake generateContent endpoint runs on localhost. It answers after
+--latency-ms (plus up to 50% jitter) and fails --error-rate of the requests
+with 429 or 503, which the client retries with backoff. For every number of
+concurrent callers, --requests prompts are sent through one long-lived
+GeminiClient (pooled connections, GEMINI_MAX_CONCURRENCY in flight) and, for
+comparison, through a new client per call, as the original code built a new
+model object per request. The report shows throughput, p50/p99/max latency
+per call, retries included, and the failed calls.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPONSE = json.dumps({"candidates": [{"content": {"parts": [{"text": '{"invoice_number": "INV-000001"}'}]}}]})
+
+class _FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so connection reuse shows
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        server = self.server
+        time.sleep(server.latency * random.uniform(1, 1.5))
+        if random.random() < server.error_rate:
+            with server.lock:
+                server.errors_served += 1
+            self._reply(random.choice((429, 503)), json.dumps({"error": {"message": "try again"}}), {"Retry-After": "0"})
+            return
+        self._reply(200, RESPONSE)
+
+    def _reply(self, status: int, body: str, headers: dict | None = None):
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+def _start_fake_api(latency_ms: int, error_rate: float) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeGeminiHandler)
+    server.daemon_threads = True
+    server.latency = latency_ms / 1000
+    server.error_rate = error_rate
+    server.errors_served = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, name="fake-gemini", daemon=True).start()
+    return server
+
+async def _run(make_client, shared: bool, concurrency: int, requests: int) -> dict:
+    client = make_client() if shared else None
+    latencies: list[float] = []
+    failed = 0
+    remaining = requests
+
+    async def caller():
+        nonlocal remaining, failed
+        while remaining > 0:
+            remaining -= 1
+            call_client = client or make_client()
+            start = time.perf_counter()
+            try:
+                await call_client.generate("Convert the following invoice text into JSON. Text: INVOICE INV-000001")
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                failed += 1
+            finally:
+                if client is None:
+                    await call_client.aclose()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    if client is not None:
+        await client.aclose()
+    latencies.sort()
+    return {
+        "per_second": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else 0.0,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        "failed": failed,
+    }
+
+def main(argv: list[str] | None = None) -> int:
+    from app.core.config import settings
+    from app.services.gemini_service import GeminiClient
+
+    parser = argparse.ArgumentParser(description="Measure Gemini client latency against a local fake API.")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32], help="Concurrent callers")
+    parser.add_argument("--requests", type=int, default=200, help="Calls per concurrency level and client mode")
+    parser.add_argument("--latency-ms", type=int, default=200, help="Base latency of the fake API")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Share of requests answered with 429/503")
+    parser.add_argument("--max-concurrency", type=int, default=settings.GEMINI_MAX_CONCURRENCY,
+                        help="Client in-flight request cap")
+    args = parser.parse_args(argv)
+
+    # Retries are counted by the fake API rather than logged one by one
+    logging.getLogger("app.services.gemini_service").setLevel(logging.ERROR)
+    server = _start_fake_api(args.latency_ms, args.error_rate)
+
+    def make_client() -> GeminiClient:
+        return GeminiClient(
+            api_key="benchmark",
+            model="fake",
+            base_url=f"http://127.0.0.1:{server.server_port}",
+            max_concurrency=args.max_concurrency,
+            max_retries=settings.GEMINI_MAX_RETRIES,
+            backoff_base=settings.GEMINI_BACKOFF_BASE,
+            backoff_max=settings.GEMINI_BACKOFF_MAX,
+            timeout=settings.GEMINI_TIMEOUT,
+        )
+
+    print(f"Fake API: {args.latency_ms} ms base latency, {args.error_rate:.0%} errors; client cap {args.max_concurrency}")
+    print(f"{'callers':>7} {'client':<7} {'calls/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'failed':>7}")
+    ok = True
+    try:
+        for concurrency in args.concurrency:
+            for mode, shared in (("pooled", True), ("fresh", False)):
+                row = asyncio.run(_run(make_client, shared, concurrency, args.requests))
+                ok = ok and not row["failed"]
+                print(
+                    f"{concurrency:>7} {mode:<7} {row['per_second']:>8.1f} {row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f} "
+                    f"{row['max_ms']:>8.1f} {row['failed']:>7}"
+                )
+    finally:
+        server.shutdown()
+    print(f"Retryable errors served: {server.errors_served}")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""
+Load test the bot's upload pipeline with concurrent uploads.
+
+Usage:
+    python -m app.cli.benchmark_ingestion [--uploads 32] [--pages 20] [--workers 1 2 4] [--gemini-ms 500]
+
+Every upload comes from its own chat and goes through the real upload
+handler, ingestion queue, extraction pool and database, with the Telegram
+bot and the Gemini call stubbed out (Gemini answers after --gemini-ms).
+Each worker count runs in a fresh process with its own database, using that
+many extraction workers and pool processes. The inline row is the original
+handler: extraction and the Gemini call on the event loop, one upload at a
+time. The report shows throughput, the latency from upload to confirmation,
+and the longest the event loop was blocked, which is how long every other
+chat waited for the bot to answer.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from app.cli.benchmark_extract import sample_pdf
+
+INVOICE_TYPE = "sales_invoice"
+# Seconds between event loop lag probes
+LAG_INTERVAL = 0.01
+
+class _StubBot:
+    """Records when each chat receives its final reply."""
+
+    def __init__(self, expected: int):
+        self.finished: dict[str, float] = {}
+        self.failed = 0
+        self._expected = expected
+        self.all_done = asyncio.Event()
+
+    async def send_message(self, chat_id, text: str, **kwargs):
+        if not text.startswith("Record Saved"):
+            self.failed += 1
+        self.finished[str(chat_id)] = time.perf_counter()
+        if len(self.finished) >= self._expected:
+            self.all_done.set()
+
+def _fake_update(chat_id: int, pdf_data: bytes):
+    async def reply_text(text: str, **kwargs):
+        pass
+
+    async def download_as_bytearray():
+        return bytearray(pdf_data)
+
+    async def get_file():
+        return SimpleNamespace(download_as_bytearray=download_as_bytearray)
+
+    document = SimpleNamespace(mime_type="application/pdf", file_name=f"upload-{chat_id}", get_file=get_file)
+    message = SimpleNamespace(document=document, chat_id=chat_id, reply_text=reply_text)
+    return SimpleNamespace(message=message), SimpleNamespace(user_data={"invoice_type": INVOICE_TYPE})
+
+async def _stub_gemini(gemini_ms: int, extracted_text: str, invoice_type: str, filename: str) -> dict:
+    await asyncio.sleep(gemini_ms / 1000)
+    return {"invoice_number": filename, "amount": len(extracted_text), "invoice_type": invoice_type}
+
+async def _watch_loop_lag(lags: list[float]):
+    loop = asyncio.get_running_loop()
+    while True:
+        due = loop.time() + LAG_INTERVAL
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append(loop.time() - due)
+
+def _summary(start: float, finished: list[float], lags: list[float], failed: int = 0) -> dict:
+    latencies = sorted(end - start for end in finished)
+    return {
+        "seconds": max(latencies),
+        "per_second": len(latencies) / max(latencies),
+        "p50_s": statistics.median(latencies),
+        "p99_s": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "max_lag_ms": max(lags, default=0.0) * 1000,
+        "failed": failed,
+    }
+
+def _bench_inline(documents: list[bytes], gemini_ms: int) -> dict:
+    # The original handler: everything on the loop, one update at a time
+    from app.utils.pdf_extract import extract_text
+
+    async def run() -> dict:
+        lags: list[float] = []
+        watcher = asyncio.create_task(_watch_loop_lag(lags))
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        finished = []
+        for no, pdf_data in enumerate(documents):
+            extracted_text = extract_text(pdf_data)
+            await _stub_gemini(gemini_ms, extracted_text, INVOICE_TYPE, f"upload-{no}")
+            finished.append(time.perf_counter())
+        watcher.cancel()
+        return _summary(start, finished, lags)
+
+    return asyncio.run(run())
+
+def _bench_pipeline(workers: int, documents: list[bytes], gemini_ms: int, workdir: str) -> dict:
+    # Runs in its own process; settings are read from the environment on import
+    os.chdir(workdir)
+    os.environ.update({
+        "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'invoices.db')}",
+        "CPU_POOL_SIZE": str(workers),
+        "EXTRACT_WORKERS": str(workers),
+        "QUEUE_MAX_DEPTH": str(len(documents) * 2),
+        "BOT_SEND_RATE": "100000",
+        "BOT_CHAT_SEND_RATE": "100000",
+        "LOG_DIR": "",
+        "LOG_LEVEL": "WARNING",
+    })
+    from app.core.db_config import dispose_async_engine, init_db
+    from app.core.db_writer import db_writer
+    from app.core.executors import get_process_pool, shutdown_executors
+    from app.core.logging import setup_logging, shutdown_logging
+    from app.services.gemini_batcher import gemini_batcher
+    from app.services.job_queue import ingestion_queue
+    from app.services.telegram_handler import handle_pdf_upload
+
+    setup_logging()
+    init_db()
+    gemini_batcher.submit = lambda *args: _stub_gemini(gemini_ms, *args)
+    # Start every pool worker before the clock starts
+    for future in [get_process_pool().submit(time.sleep, 0.1) for _ in range(workers)]:
+        future.result()
+
+    async def run() -> dict:
+        bot = _StubBot(len(documents))
+        await ingestion_queue.start(bot)
+        lags: list[float] = []
+        watcher = asyncio.create_task(_watch_loop_lag(lags))
+        try:
+            await asyncio.sleep(0)
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                handle_pdf_upload(*_fake_update(no, pdf_data)) for no, pdf_data in enumerate(documents)
+            ))
+            await bot.all_done.wait()
+            return _summary(start, list(bot.finished.values()), lags, bot.failed)
+        finally:
+            watcher.cancel()
+            await ingestion_queue.stop()
+            await db_writer.aclose()
+            await dispose_async_engine()
+
+    try:
+        return asyncio.run(run())
+    finally:
+        shutdown_executors()
+        shutdown_logging()
+
+def _print_row(name: str, row: dict):
+    print(
+        f"{name:<9} {row['seconds']:>8.2f} {row['per_second']:>8.2f} {row['p50_s']:>7.2f} {row['p99_s']:>7.2f} "
+        f"{row['max_lag_ms']:>12.1f} {row['failed']:>7}"
+    )
+
+def main(argv: list[str] | None = None) -> int:
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Load test the upload pipeline with concurrent uploads.")
+    parser.add_argument("--uploads", type=int, default=32, help="Concurrent uploads, one chat each")
+    parser.add_argument("--pages", type=int, default=20, help="Pages per uploaded invoice")
+    parser.add_argument("--workers", nargs="+", type=int, default=sorted({1, max(1, cores // 2), cores}),
+                        help="Extraction worker counts to compare")
+    parser.add_argument("--gemini-ms", type=int, default=500, help="Latency of the stubbed Gemini call")
+    parser.add_argument("--no-inline", action="store_true", help="Skip the one-at-a-time baseline")
+    args = parser.parse_args(argv)
+
+    documents = [sample_pdf(args.pages, number=no) for no in range(args.uploads)]
+    print(f"{args.uploads} uploads of {args.pages} pages, Gemini stub {args.gemini_ms} ms, {cores} cores")
+    print(f"{'workers':<9} {'seconds':>8} {'PDFs/s':>8} {'p50 s':>7} {'p99 s':>7} {'max lag ms':>12} {'failed':>7}")
+    context = multiprocessing.get_context("spawn")
+    ok = True
+    runs = ([] if args.no_inline else [("inline", None)]) + [(str(workers), workers) for workers in args.workers]
+    for name, workers in runs:
+        workdir = tempfile.mkdtemp(prefix="benchmark-ingestion-")
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                if workers is None:
+                    row = pool.submit(_bench_inline, documents, args.gemini_ms).result()
+                else:
+                    row = pool.submit(_bench_pipeline, workers, documents, args.gemini_ms, workdir).result()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        ok = ok and not row["failed"]
+        _print_row(name, row)
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
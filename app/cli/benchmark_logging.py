@@ -0,0 +1,124 @@
+"""
+Measure what logging costs the code that logs.
+
+Usage:
+    python -m app.cli.benchmark_logging [--rate 2000] [--duration 5] [--records 5] [--payload 200]
+
+Simulated requests run on an event loop at a fixed rate, each logging
+--records INFO records, through three setups: logging disabled, a
+synchronous RotatingFileHandler on the calling thread (the previous
+setup), and the QueueHandler feeding a listener thread that setup_logging
+installs, both writing JSON lines with sampling off. For each setup the
+report shows the cost of one log call on the caller (p50, p99, max),
+request latency including event loop delays, and how many records
+reached the file. Files are written to a temporary directory and rotated
+at 1 MiB to include rotation stalls. On a single core the listener
+competes with the loop for the CPU; compare on the deployment hardware.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+from app.core.logging import JsonFormatter, create_queue_logging
+
+ROTATE_BYTES = 1024 * 1024
+
+def _file_handler(directory: str, formatter: logging.Formatter) -> RotatingFileHandler:
+    # Enough backups to keep every record, so they can be counted
+    handler = RotatingFileHandler(os.path.join(directory, "app.log"), maxBytes=ROTATE_BYTES, backupCount=1000)
+    handler.setFormatter(formatter)
+    return handler
+
+def _count_records(directory: str) -> int:
+    total = 0
+    for name in os.listdir(directory):
+        with open(os.path.join(directory, name), "rb") as f:
+            total += sum(1 for _ in f)
+    return total
+
+async def _run(setup: str, rate: int, duration: float, records: int, payload: str) -> dict:
+    logger = logging.getLogger(f"bench.{setup}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    listener = None
+    with tempfile.TemporaryDirectory() as directory:
+        if setup == "disabled":
+            logger.setLevel(logging.WARNING)
+        elif setup == "sync":
+            logger.addHandler(_file_handler(directory, JsonFormatter()))
+        else:
+            queue_handler, listener = create_queue_logging(
+                [_file_handler(directory, JsonFormatter())], queue_size=100000, sample_burst=0
+            )
+            logger.addHandler(queue_handler)
+            listener.start()
+
+        call_ns = []
+        latencies = []
+
+        async def request(i: int, scheduled: float):
+            for n in range(records):
+                start = time.perf_counter_ns()
+                logger.info("Request %d step %d: %s", i, n, payload)
+                call_ns.append(time.perf_counter_ns() - start)
+            await asyncio.sleep(0)
+            latencies.append(time.perf_counter() - scheduled)
+
+        total = int(rate * duration)
+        interval = 1.0 / rate
+        tasks = []
+        start = time.perf_counter()
+        for i in range(total):
+            scheduled = start + i * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(request(i, scheduled)))
+        await asyncio.gather(*tasks)
+
+        if listener is not None:
+            listener.stop()  # Drains the queue
+        for handler in list(logger.handlers):
+            handler.close()
+            logger.removeHandler(handler)
+        written = _count_records(directory)
+
+    call_ns.sort()
+    latencies.sort()
+    return {
+        "setup": setup,
+        "call_p50_us": call_ns[len(call_ns) // 2] / 1000,
+        "call_p99_us": call_ns[int(len(call_ns) * 0.99)] / 1000,
+        "call_max_us": call_ns[-1] / 1000,
+        "req_p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "written": written,
+        "logged": len(call_ns),
+    }
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark logging overhead on the event loop.")
+    parser.add_argument("--rate", type=int, default=2000, help="Requests per second")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per setup")
+    parser.add_argument("--records", type=int, default=5, help="Records logged per request")
+    parser.add_argument("--payload", type=int, default=200, help="Characters of payload per record")
+    args = parser.parse_args(argv)
+
+    payload = "x" * args.payload
+    results = [
+        asyncio.run(_run(setup, args.rate, args.duration, args.records, payload))
+        for setup in ("disabled", "sync", "queue")
+    ]
+    print(f"{'setup':>9} {'call p50 us':>12} {'call p99 us':>12} {'call max us':>12} {'req p99 ms':>11} {'written':>9}")
+    for row in results:
+        print(
+            f"{row['setup']:>9} {row['call_p50_us']:>12.1f} {row['call_p99_us']:>12.1f} "
+            f"{row['call_max_us']:>12.1f} {row['req_p99_ms']:>11.2f} {row['written']:>9}"
+        )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Measure the per-request cost of the logging and rate-limit middleware.
+
+Usage:
+    python -m app.cli.benchmark_middleware [--rate 5000] [--duration 5] [--log]
+
+Requests are sent straight into the ASGI app (no sockets) at a fixed rate,
+through three stacks: no middleware, the previous BaseHTTPMiddleware
+versions, and the current pure ASGI ones. For each stack the report shows
+the achieved rate, latency percentiles and CPU time per request, and the
+overhead over the bare app. --log enables the access log (to a null
+stream), which is off at the default WARNING level.
+"""
+import argparse
+import asyncio
+import io
+import logging
+import statistics
+import sys
+import time
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+from app.core.rate_limit import MemoryRateLimitBackend, RateLimit, RateLimiter
+from app.middleware.logging import LoggingMiddleware, access_logger
+from app.middleware.rate_limiter import RateLimitMiddleware
+
+class _BaseHTTPLogging(BaseHTTPMiddleware):
+    # The previous implementation, kept as the baseline
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        access_logger.info(f"Incoming request: {request.method} {request.url}")
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        access_logger.info(
+            f"Completed request: {request.method} {request.url} in {process_time:.2f}s with status {response.status_code}"
+        )
+        return response
+
+class _BaseHTTPRateLimit(BaseHTTPMiddleware):
+    def __init__(self, app, limiter: RateLimiter):
+        super().__init__(app)
+        self.limiter = limiter
+
+    async def dispatch(self, request: Request, call_next):
+        result = await self.limiter.hit(request.client.host if request.client else "unknown")
+        if not result.allowed:
+            return JSONResponse(status_code=429, content={"detail": "Rate limit exceeded"})
+        return await call_next(request)
+
+def _build_app(stack: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    # Never denies, so every request goes through
+    limiter = RateLimiter(MemoryRateLimitBackend(), RateLimit(10**9, 1.0, 10**9), prefix="bench")
+    if stack == "basehttp":
+        app.add_middleware(_BaseHTTPRateLimit, limiter=limiter)
+        app.add_middleware(_BaseHTTPLogging)
+    elif stack == "asgi":
+        app.add_middleware(RateLimitMiddleware, limiter=limiter)
+        app.add_middleware(LoggingMiddleware)
+    return app
+
+def _scope(i: int) -> dict:
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/ping", "raw_path": b"/ping", "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"bench")], "client": (f"10.0.{i % 256}.{i % 100}", 50000), "server": ("bench", 80),
+    }
+
+async def _request(app, i: int):
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(_scope(i), receive, send)
+
+async def _run(stack: str, rate: int, duration: float) -> dict:
+    app = _build_app(stack)
+    for i in range(200):  # Warm up
+        await _request(app, i)
+
+    latencies = []
+
+    async def timed(i: int, scheduled: float):
+        await _request(app, i)
+        latencies.append(time.perf_counter() - scheduled)
+
+    total = int(rate * duration)
+    interval = 1.0 / rate
+    tasks = []
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    for i in range(total):
+        scheduled = start + i * interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(timed(i, scheduled)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    latencies.sort()
+    return {
+        "stack": stack,
+        "rate": total / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "cpu_us": cpu / total * 1_000_000,
+    }
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the HTTP middleware.")
+    parser.add_argument("--rate", type=int, default=5000, help="Requests per second to send")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per stack")
+    parser.add_argument("--log", action="store_true", help="Enable the access log")
+    args = parser.parse_args(argv)
+
+    access_logger.propagate = False
+    access_logger.addHandler(logging.StreamHandler(io.StringIO()) if args.log else logging.NullHandler())
+    access_logger.setLevel(logging.INFO if args.log else logging.WARNING)
+
+    results = [asyncio.run(_run(stack, args.rate, args.duration)) for stack in ("none", "basehttp", "asgi")]
+    baseline = results[0]["cpu_us"]
+    print(f"{'stack':>9} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'CPU us/req':>11} {'overhead us':>12}")
+    for row in results:
+        print(
+            f"{row['stack']:>9} {row['rate']:>8.0f} {row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+            f"{row['mean_ms']:>8.2f} {row['cpu_us']:>11.1f} {row['cpu_us'] - baseline:>12.1f}"
+        )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Benchmark the PDF backends on a fixed set of invoices.
+
+Usage:
+    python -m app.cli.benchmark_pdf [--backends reportlab xhtml2pdf weasyprint] [--sizes 1 10 100 500] [--repeat 5]
+
+Each backend runs in a fresh process, so its first render includes importing
+the library (reported as cold). For every invoice size the report shows the
+mean and worst latency of the warm renders, single-process throughput and
+the peak Python heap allocated by one more render, traced separately.
+"""
+import argparse
+import multiprocessing
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_SIZES = [1, 10, 100, 500]
+
+def sample_invoice(items: int) -> dict:
+    """Deterministic invoice details with the given number of line items."""
+    rows = []
+    total = 0.0
+    for no in range(1, items + 1):
+        quantity = no % 7 + 1
+        price = round(10 + (no * 37 % 1000) / 7, 2)
+        subtotal = quantity * price
+        total += subtotal
+        rows.append({
+            "no": no,
+            "description": f"Item {no}: consulting services & materials for project phase {no % 12 + 1}",
+            "quantity": quantity,
+            "price": price,
+            "subtotal": subtotal,
+            "running_total": total,
+        })
+    return {
+        "draft_id": "benchmark",
+        "date_issued": "01 January 2025",
+        "invoice_number": f"INV-{items:06d}",
+        "issued_to": {"name": "Raghavendra", "address": "Dhanban Jharkhand, 826001"},
+        "bank_details": {"bank_name": "Rimberio", "account_no": "012345678901"},
+        "table_data": rows,
+        "grand_total": total,
+    }
+
+def _bench_backend(backend: str, sizes: list[int], repeat: int) -> dict:
+    # Runs in its own process; the cold render includes importing the backend
+    invoices = {items: sample_invoice(items) for items in sizes}
+    start = time.perf_counter()
+    from app.utils.invoice_pdf import render_invoice
+    render_invoice(invoices[sizes[0]], backend)
+    results = {"backend": backend, "cold_ms": (time.perf_counter() - start) * 1000, "sizes": []}
+
+    for items, details in invoices.items():
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            pdf_bytes = render_invoice(details, backend)
+            latencies.append(time.perf_counter() - start)
+        # Tracing slows rendering down, so memory is measured on a separate render
+        tracemalloc.start()
+        render_invoice(details, backend)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results["sizes"].append({
+            "items": items,
+            "mean_ms": statistics.mean(latencies) * 1000,
+            "max_ms": max(latencies) * 1000,
+            "per_second": repeat / sum(latencies),
+            "peak_mb": peak / (1024 * 1024),
+            "pdf_kb": len(pdf_bytes) / 1024,
+        })
+    return results
+
+def _print_results(results: dict):
+    print(f"{results['backend']} (cold first render {results['cold_ms']:.0f} ms)")
+    print(f"  {'items':>6} {'mean ms':>9} {'max ms':>9} {'PDFs/s':>8} {'peak MB':>8} {'PDF KB':>8}")
+    for row in results["sizes"]:
+        print(
+            f"  {row['items']:>6} {row['mean_ms']:>9.1f} {row['max_ms']:>9.1f} {row['per_second']:>8.1f} "
+            f"{row['peak_mb']:>8.1f} {row['pdf_kb']:>8.1f}"
+        )
+
+def main(argv: list[str] | None = None) -> int:
+    from app.utils.invoice_pdf import INVOICE_BACKENDS
+
+    parser = argparse.ArgumentParser(description="Benchmark the PDF backends.")
+    parser.add_argument("--backends", nargs="+", choices=INVOICE_BACKENDS, default=list(INVOICE_BACKENDS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES, help="Line items per invoice")
+    parser.add_argument("--repeat", type=int, default=5, help="Warm renders per invoice size")
+    args = parser.parse_args(argv)
+
+    ok = True
+    context = multiprocessing.get_context("spawn")
+    for backend in args.backends:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            try:
+                results = pool.submit(_bench_backend, backend, args.sizes, args.repeat).result()
+            except (ImportError, OSError) as e:
+                # WeasyPrint needs system libraries that may be missing
+                print(f"{backend}: unavailable ({e})")
+                ok = False
+                continue
+        _print_results(results)
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
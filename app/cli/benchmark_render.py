@@ -0,0 +1,132 @@
+"""
+Measure invoice download latency with and without the rendered PDF cache.
+
+Usage:
+    python -m app.cli.benchmark_render [--backends reportlab xhtml2pdf] [--sizes 1 10 100] [--drafts 20] [--concurrency 8]
+
+Each backend runs in a fresh process with its own warm render pool and an
+empty cache directory, rendering drafts the way GET /invoice/pdf does:
+
+    uncached   every download rendered again, as before the cache
+    cold       first download of each draft: render, then store in the cache
+    warm       the same drafts downloaded again, served from the cache
+    reopened   as warm, from a new cache instance on the same directory, as another worker would
+    shared     --concurrency simultaneous downloads of one new draft, which share a render
+
+For every invoice size --drafts distinct drafts are used, so the report
+shows per-download p50/p99 latency over that many renders or cache reads.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from app.cli.benchmark_pdf import sample_invoice
+
+DEFAULT_SIZES = [1, 10, 100]
+MODES = ["uncached", "cold", "warm", "reopened", "shared"]
+
+def _percentiles(latencies: list[float]) -> tuple[float, float]:
+    latencies = sorted(latencies)
+    return statistics.median(latencies) * 1000, latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+
+def _bench_backend(backend: str, sizes: list[int], drafts: int, concurrency: int, workdir: str) -> dict:
+    # Runs in its own process; settings are read from the environment on import
+    os.chdir(workdir)
+    os.environ.update({"LOG_DIR": "", "LOG_LEVEL": "WARNING", "RENDER_QUEUE_SIZE": str(concurrency * 2)})
+    from app.services.pdf_cache import PDFCache
+    from app.services.pdf_renderer import PDFRenderer
+
+    cache_dir = os.path.join(workdir, "pdf_cache")
+    max_bytes = 1024 * 1024 * 1024
+
+    def make_renderer(cache: PDFCache | None) -> PDFRenderer:
+        return PDFRenderer(workers=1, queue_size=concurrency * 2, timeout=300, invoice_backend=backend, cache=cache)
+
+    async def timed(renderer: PDFRenderer, invoices: list[dict]) -> list[float]:
+        latencies = []
+        for details in invoices:
+            start = time.perf_counter()
+            await renderer.render_invoice(details)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    async def run() -> dict:
+        uncached, cached = make_renderer(None), make_renderer(PDFCache(cache_dir, max_bytes))
+        await asyncio.gather(uncached.start(), cached.start())
+        results = {mode: [] for mode in MODES}
+        try:
+            for items in sizes:
+                invoices = []
+                for no in range(drafts):
+                    details = sample_invoice(items)
+                    details["invoice_number"] = f"INV-{items:04d}{no:04d}"
+                    invoices.append(details)
+                row = {"items": items}
+                row["uncached"] = _percentiles(await timed(uncached, invoices))
+                row["cold"] = _percentiles(await timed(cached, invoices))
+                row["warm"] = _percentiles(await timed(cached, invoices))
+                reopened = make_renderer(PDFCache(cache_dir, max_bytes))
+                reopened._pool = cached._pool  # Same workers; only the cache index is new
+                row["reopened"] = _percentiles(await timed(reopened, invoices))
+
+                shared = sample_invoice(items)
+                shared["invoice_number"] = f"INV-{items:04d}SHRD"
+                start = time.perf_counter()
+
+                async def download() -> float:
+                    await cached.render_invoice(shared)
+                    return time.perf_counter() - start
+
+                row["shared"] = _percentiles(list(await asyncio.gather(*(download() for _ in range(concurrency)))))
+                for mode in MODES:
+                    results[mode].append(row[mode])
+                results.setdefault("items", []).append(items)
+            results["cache"] = cached.cache.stats()
+        finally:
+            uncached.shutdown()
+            cached.shutdown()
+        return results
+
+    return asyncio.run(run())
+
+def main(argv: list[str] | None = None) -> int:
+    from app.utils.invoice_pdf import INVOICE_BACKENDS
+
+    parser = argparse.ArgumentParser(description="Measure invoice download latency with and without the PDF cache.")
+    parser.add_argument("--backends", nargs="+", choices=INVOICE_BACKENDS, default=["reportlab", "xhtml2pdf"])
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES, help="Line items per invoice")
+    parser.add_argument("--drafts", type=int, default=20, help="Distinct drafts per invoice size")
+    parser.add_argument("--concurrency", type=int, default=8, help="Simultaneous downloads in the shared mode")
+    args = parser.parse_args(argv)
+
+    ok = True
+    context = multiprocessing.get_context("spawn")
+    for backend in args.backends:
+        workdir = tempfile.mkdtemp(prefix="benchmark-render-")
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                results = pool.submit(
+                    _bench_backend, backend, args.sizes, args.drafts, args.concurrency, workdir
+                ).result()
+        except (ImportError, OSError) as e:
+            # WeasyPrint needs system libraries that may be missing
+            print(f"{backend}: unavailable ({e})")
+            ok = False
+            continue
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        cache = results["cache"]
+        print(f"{backend} ({cache['hits']} hits, {cache['misses']} misses, {cache['bytes'] / 1024:.0f} KB cached)")
+        print(f"  {'mode':<9}" + "".join(f" {f'{items} items p50/p99 ms':>22}" for items in results["items"]))
+        for mode in MODES:
+            print(f"  {mode:<9}" + "".join(f" {f'{p50:.2f}/{p99:.2f}':>22}" for p50, p99 in results[mode]))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+Measure full-text search latency and index size over a generated invoice corpus.
+
+Usage:
+    python -m app.cli.benchmark_search [--invoices 500000] [--repeat 50]
+
+A fresh SQLite database is filled with --invoices generated invoices through
+the regular insert path, so the FTS5 index is maintained by its triggers as
+in production; the load rate includes that cost. Invoice texts draw
+customers, cities and line items from fixed vocabularies with skewed
+frequencies, so queries range from terms in most invoices to terms in a
+handful. Each query is run --repeat times through search_invoices (ranking
+and snippets included). The report shows p50/p99 latency and the result
+count per query, then the size of the table and of the index.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+INVOICE_TYPES = ["proforma_invoice", "sales_invoice", "purchase_invoice", "credit_note", "debit_note"]
+CUSTOMERS = [f"{first} {last}" for first in ("Acme", "Globex", "Initech", "Umbrella", "Stark", "Wayne", "Wonka",
+                                              "Hooli", "Vandelay", "Soylent") for last in ("Corp", "Industries",
+                                              "Traders", "Logistics", "Holdings", "Exports", "Foods", "Labs")]
+CITIES = ["Mumbai", "Delhi", "Bengaluru", "Dhanbad", "Pune", "Chennai", "Kolkata", "Jaipur", "Lucknow", "Surat"]
+ITEMS = ["consulting services", "steel rods", "cement bags", "software licence", "annual maintenance",
+         "printer cartridges", "office chairs", "transport charges", "installation", "copper wire",
+         "packaging material", "security audit", "cloud hosting", "training workshop", "spare parts"]
+LOAD_BATCH = 5000
+# Query text, invoice_type filter, offset
+QUERIES = [
+    ("consulting", None, 0),
+    ("consult*", None, 0),
+    ("steel rods", None, 0),
+    ("Acme Traders Delhi", None, 0),
+    ("Vandel*", None, 0),
+    ("installation", "sales_invoice", 0),
+    ("INV-0000042", None, 0),
+    ("transport", None, 500),
+    ("nonexistentterm", None, 0),
+]
+
+def _skewed(rng: random.Random, values: list[str]) -> str:
+    # Earlier values are much more frequent, roughly Zipf-like
+    return values[min(int(rng.paretovariate(1.2)) - 1, len(values) - 1)]
+
+def _invoice_text(rng: random.Random, no: int) -> str:
+    lines = [
+        f"TAX INVOICE INV-{no:07d}",
+        f"Billed to: {_skewed(rng, CUSTOMERS)}, {_skewed(rng, CITIES)}",
+        f"Date issued: {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2025",
+    ]
+    total = 0.0
+    for item_no in range(1, rng.randint(2, 12)):
+        quantity, price = rng.randint(1, 20), round(rng.uniform(10, 5000), 2)
+        total += quantity * price
+        lines.append(f"{item_no}. {_skewed(rng, ITEMS)} x{quantity} @ {price:.2f} = {quantity * price:.2f}")
+    lines.append(f"Grand total: {total:.2f} INR. Payment due in 30 days to Rimberio Bank account 012345678901.")
+    return "\n".join(lines)
+
+def _bench_search(invoices: int, repeat: int, workdir: str) -> dict:
+    # Runs in its own process; settings are read from the environment on import
+    path = os.path.join(workdir, "invoices.db")
+    os.environ.update({"DATABASE_URL": f"sqlite+aiosqlite:///{path}", "LOG_DIR": "", "LOG_LEVEL": "WARNING"})
+    from sqlalchemy import text
+    from app.core.db_config import SEARCH_TABLE, SessionLocal, engine, init_db
+    from app.models.invoice_pdf import InvoicePDF
+    from app.services.search import build_match_query, search_invoices
+
+    init_db()
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    start = time.perf_counter()
+    for batch_start in range(0, invoices, LOAD_BATCH):
+        rows = []
+        for no in range(batch_start, min(batch_start + LOAD_BATCH, invoices)):
+            created_at = now - timedelta(seconds=no)
+            rows.append({
+                "id": str(uuid.uuid4()), "created_at": created_at, "updated_at": created_at,
+                "filename": f"invoice-{no}.pdf", "invoice_type": INVOICE_TYPES[no % len(INVOICE_TYPES)],
+                "extracted_text": _invoice_text(rng, no),
+            })
+        with engine.begin() as conn:
+            conn.execute(InvoicePDF.__table__.insert(), rows)
+    load_seconds = time.perf_counter() - start
+
+    results = []
+    with SessionLocal() as db:
+        for query, invoice_type, offset in QUERIES:
+            latencies = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                page = search_invoices(db, query, invoice_type, limit=10, offset=offset)
+                latencies.append(time.perf_counter() - start)
+            total = db.execute(
+                text(f"SELECT count(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match"),
+                {"match": build_match_query(query)},
+            ).scalar()
+            latencies.sort()
+            results.append({
+                "query": query + (f" [{invoice_type}]" if invoice_type else "") + (f" @{offset}" if offset else ""),
+                "p50_ms": statistics.median(latencies) * 1000,
+                "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+                "matches": total,
+                "returned": len(page["items"]),
+            })
+    with engine.connect() as conn:
+        sizes = dict(conn.exec_driver_sql(
+            "SELECT CASE WHEN name LIKE ? THEN 'index' ELSE 'table' END, SUM(pgsize) FROM dbstat "
+            "WHERE name LIKE ? OR name = 'invoice_pdfs' GROUP BY 1",
+            (f"{SEARCH_TABLE}%", f"{SEARCH_TABLE}%"),
+        ).all())
+    engine.dispose()
+    return {
+        "load_per_second": invoices / load_seconds,
+        "queries": results,
+        "table_mb": (sizes.get("table") or 0) / (1024 * 1024),
+        "index_mb": (sizes.get("index") or 0) / (1024 * 1024),
+    }
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure full-text search latency and index size.")
+    parser.add_argument("--invoices", type=int, default=500000, help="Generated invoices to index")
+    parser.add_argument("--repeat", type=int, default=50, help="Runs of each query")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="benchmark-search-")
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = pool.submit(_bench_search, args.invoices, args.repeat, workdir).result()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{args.invoices} invoices indexed at {results['load_per_second']:.0f} inserts/s")
+    print(f"{'query':<36} {'p50 ms':>8} {'p99 ms':>8} {'matches':>9} {'returned':>9}")
+    for row in results["queries"]:
+        print(f"{row['query'][:36]:<36} {row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['matches']:>9} {row['returned']:>9}")
+    print(f"invoice_pdfs table {results['table_mb']:.1f} MB, search index {results['index_mb']:.1f} MB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
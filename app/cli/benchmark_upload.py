@@ -0,0 +1,141 @@
+"""
+Measure the peak memory of the /pdf/process endpoint on concurrent large uploads.
+
+Usage:
+    python -m app.cli.benchmark_upload [--sizes 1 50 200] [--concurrency 4] [--modes buffered streamed]
+
+For every PDF size (in MB) the endpoint receives --concurrency distinct PDFs
+of that size at once, sent straight into the ASGI app (no sockets) with the request body
+streamed from disk. The streamed mode is the real endpoint: chunked hashing
+and spooling to files/, extraction from the saved file in the process pool.
+The buffered mode is the original shape: the whole upload read into bytes
+and handed to the pool. Each run happens in a fresh process with its own
+database and working directory, so the report shows that process's peak RSS
+against its RSS after start-up, and the peak RSS of its busiest pool
+worker. PDFs are padded to size with an embedded random attachment. Peak
+RSS is read from /proc, so this runs on Linux only.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_SIZES = [1, 50, 200]
+MODES = ["buffered", "streamed"]
+
+def sample_large_pdf(path: str, megabytes: int):
+    """Write a one-page invoice PDF padded to about `megabytes` MB with an incompressible attachment."""
+    import fitz
+
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((50, 50), f"INVOICE INV-{megabytes:06d}", fontsize=14)
+    doc.embfile_add("scan.bin", os.urandom(megabytes * 1024 * 1024))
+    doc.save(path)
+    doc.close()
+
+def _status_mb(field: str, pid: int | str = "self") -> float:
+    # VmHWM rather than ru_maxrss, which keeps the peak of the forking parent across exec
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def _bench_mode(mode: str, pdf_paths: list[str], workdir: str) -> dict:
+    # Runs in its own process, so its peak RSS is the peak of this run only
+    os.chdir(workdir)
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(workdir, 'invoices.db')}"
+    os.environ["MAX_UPLOAD_BYTES"] = str(os.path.getsize(pdf_paths[0]) * 2)
+    os.environ["LOG_DIR"] = ""
+    os.environ["LOG_LEVEL"] = "WARNING"
+    import httpx
+    from fastapi import FastAPI, File, UploadFile
+    from app.core.config import settings
+    from app.core.db_config import init_db
+    from app.core.executors import get_process_pool, shutdown_executors
+    from app.core.logging import setup_logging, shutdown_logging
+    from app.middleware.upload_limit import add_upload_limit_middleware
+    from app.routes.pdf import router as pdf_router
+    from app.services.pdf_service import extract_pdf_text
+
+    setup_logging()
+    init_db()
+    app = FastAPI()
+    add_upload_limit_middleware(app, settings.MAX_UPLOAD_BYTES)
+    app.include_router(pdf_router)
+
+    @app.post("/buffered/{invoice_type}")
+    async def buffered_endpoint(invoice_type: str, filename: str, file: bytes = File(...)):
+        # The original endpoint: the whole upload in memory, pickled to the pool
+        return {"filename": filename, "extracted_text": await extract_pdf_text(file)}
+
+    async def upload(client: httpx.AsyncClient, no: int, pdf_path: str) -> float:
+        path = "/pdf/process/benchmark" if mode == "streamed" else "/buffered/benchmark"
+        start = time.perf_counter()
+        with open(pdf_path, "rb") as pdf_file:
+            response = await client.post(
+                path, params={"filename": f"upload-{no}.pdf"},
+                files={"file": (f"upload-{no}.pdf", pdf_file, "application/pdf")},
+            )
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    async def run() -> float:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(upload(client, no, path) for no, path in enumerate(pdf_paths)))
+            return time.perf_counter() - start
+
+    pool = get_process_pool()
+    pool.submit(os.getpid).result()  # Start the pool workers before the baseline is taken
+    base_mb = _status_mb("VmRSS")
+    seconds = asyncio.run(run())
+    results = {
+        "base_mb": base_mb,
+        "peak_mb": _status_mb("VmHWM"),
+        "worker_peak_mb": max(_status_mb("VmHWM", pid) for pid in pool._processes),
+        "seconds": seconds,
+    }
+    shutdown_executors()
+    shutdown_logging()
+    return results
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure upload endpoint memory on concurrent large PDFs.")
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES, help="PDF sizes in MB")
+    parser.add_argument("--concurrency", type=int, default=4, help="PDFs of each size uploaded at once")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    args = parser.parse_args(argv)
+
+    context = multiprocessing.get_context("spawn")
+    scratch = tempfile.mkdtemp(prefix="benchmark-upload-")
+    try:
+        print(f"{'MB':>5} {'mode':<9} {'base MB':>8} {'peak MB':>8} {'growth MB':>10} {'worker MB':>10} {'seconds':>8}")
+        for megabytes in args.sizes:
+            pdf_paths = [os.path.join(scratch, f"sample-{megabytes}-{no}.pdf") for no in range(args.concurrency)]
+            for path in pdf_paths:
+                sample_large_pdf(path, megabytes)
+            for mode in args.modes:
+                workdir = tempfile.mkdtemp(dir=scratch)
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    row = pool.submit(_bench_mode, mode, pdf_paths, workdir).result()
+                shutil.rmtree(workdir)
+                print(
+                    f"{megabytes:>5} {mode:<9} {row['base_mb']:>8.0f} {row['peak_mb']:>8.0f} "
+                    f"{row['peak_mb'] - row['base_mb']:>10.0f} {row['worker_peak_mb']:>10.0f} {row['seconds']:>8.2f}"
+                )
+            for path in pdf_paths:
+                os.remove(path)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
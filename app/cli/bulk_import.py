@@ -0,0 +1,55 @@
+"""
+Backfill invoices from ZIP archives or directories of PDFs.
+
+Usage:
+    python -m app.cli.bulk_import invoices.zip [more.zip | pdf_dir ...] --invoice-type sales_invoice
+
+Progress is committed after every batch, so rerunning the same command after
+an interruption resumes where it stopped.
+"""
+import argparse
+import asyncio
+import sys
+from app.core.db_config import init_db
+from app.core.executors import shutdown_executors
+from app.services.bulk_import import ImportStatus, run_import
+from app.utils.keyboard_utils import INVOICE_OPTIONS
+
+def _print_progress(state: dict, rate: float):
+    print(
+        f"{state['source_name']}: {state['processed']}/{state['total']} PDFs, {state['imported']} imported, "
+        f"{state['duplicates']} duplicates, {state['failed']} failed ({rate:.1f} PDFs/s)",
+        flush=True,
+    )
+
+async def _import_all(paths: list[str], invoice_type: str) -> bool:
+    ok = True
+    for path in paths:
+        state = await run_import(path, invoice_type, progress=_print_progress)
+        print(f"{state['source_name']}: {state['status']}, {state['imported']} imported, "
+              f"{state['duplicates']} duplicates, {state['failed']} failed")
+        if state["error"]:
+            print(f"  last error: {state['error']}")
+        ok = ok and state["status"] == ImportStatus.DONE
+    return ok
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Import PDFs from ZIP archives or directories.")
+    parser.add_argument("paths", nargs="+", help="ZIP archives or directories of PDFs")
+    parser.add_argument(
+        "--invoice-type", required=True, choices=[option["callback_data"] for option in INVOICE_OPTIONS],
+        help="Invoice type stored for every PDF"
+    )
+    args = parser.parse_args(argv)
+
+    init_db()
+    try:
+        return 0 if asyncio.run(_import_all(args.paths, args.invoice_type)) else 1
+    except KeyboardInterrupt:
+        print("Interrupted; rerun the same command to resume.", file=sys.stderr)
+        return 130
+    finally:
+        shutdown_executors()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,12 @@
+from fastapi import Header, HTTPException
+from app.core.config import settings
+import logging
+import secrets
+
+logger = logging.getLogger(__name__)
+
+async def require_admin_token(admin_token: str | None = Header(None, alias="X-Admin-Token")):
+    """Dependency rejecting requests without the ADMIN_TOKEN in the X-Admin-Token header."""
+    if not settings.ADMIN_TOKEN or admin_token is None or not secrets.compare_digest(admin_token, settings.ADMIN_TOKEN):
+        logger.warning("Rejected admin call with a bad token")
+        raise HTTPException(status_code=403, detail="Invalid admin token")
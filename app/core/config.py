@@ -10,5 +10,157 @@ class Settings(BaseSettings):
     TELEGRAM_BOT_TOKEN: str
     CHAT_ID: str
     GEMINI_API_KEY: str
+    GEMINI_MODEL: str = "gemini-1.5-flash"
+    GEMINI_BASE_URL: str = "https://generativelanguage.googleapis.com"
+    GEMINI_MAX_CONCURRENCY: int = 8
+    GEMINI_MAX_RETRIES: int = 4
+    GEMINI_BACKOFF_BASE: float = 0.5
+    GEMINI_BACKOFF_MAX: float = 8.0
 
-settings = Settings()
\ No newline at end of file
+    # Gemini micro-batching (GEMINI_BATCH_MAX_DOCS=1 disables batching)
+    GEMINI_BATCH_MAX_DOCS: int = 8
+    GEMINI_BATCH_MAX_WAIT_MS: int = 200
+    GEMINI_BATCH_MAX_CHARS: int = 200000
+
+    # Database: async SQLAlchemy URL (defaults to sqlite+aiosqlite:///invoices.db)
+    DATABASE_URL: str | None = None
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+
+    # SQLite storage profile: performance (WAL, synchronous=NORMAL, mmap, larger page cache) or default
+    SQLITE_PROFILE: str = "performance"
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024
+
+    # Group commit: concurrent pipeline writes share one transaction (DB_GROUP_COMMIT_MAX_BATCH=1 disables it)
+    DB_GROUP_COMMIT_MAX_BATCH: int = 64
+    DB_GROUP_COMMIT_MAX_WAIT_MS: int = 5
+
+    # Number of Telegram updates handled concurrently
+    BOT_CONCURRENT_UPDATES: int = 32
+
+    # How the bot receives updates: polling (a background thread) or webhook (Telegram posts to
+    # WEBHOOK_URL + WEBHOOK_PATH, checked against WEBHOOK_SECRET)
+    BOT_MODE: str = "polling"
+    WEBHOOK_URL: str | None = None
+    WEBHOOK_PATH: str = "/telegram/webhook"
+    WEBHOOK_SECRET: str | None = None
+    WEBHOOK_MAX_CONNECTIONS: int = 40
+
+    # Conversation and user data store: database (bot_state table, shared by all workers and replicas),
+    # pickle (BOT_PERSISTENCE_PATH, one process only) or none; written every BOT_PERSISTENCE_INTERVAL seconds
+    BOT_PERSISTENCE: str = "database"
+    BOT_PERSISTENCE_PATH: str = "bot_persistence.pickle"
+    BOT_PERSISTENCE_INTERVAL: float = 1.0
+
+    # Polling mode with several uvicorn workers: only the worker holding BOT_LOCK_PATH polls, the others
+    # serve the API and retry the lock every BOT_LOCK_RETRY_SECONDS to take over. At shutdown the lock
+    # is released once polling has stopped, waiting up to BOT_STOP_TIMEOUT seconds.
+    BOT_SINGLE_POLLER: bool = True
+    BOT_LOCK_PATH: str = "bot.lock"
+    BOT_LOCK_RETRY_SECONDS: float = 5.0
+    BOT_STOP_TIMEOUT: float = 30.0
+
+    # Offload pools
+    CPU_POOL_SIZE: int = os.cpu_count() or 1
+    IO_POOL_SIZE: int = 16
+
+    # PDF text extraction backend: auto, pymupdf or pdfplumber
+    PDF_EXTRACT_BACKEND: str = "auto"
+    # PDFs with at least this many pages are split into page ranges across the process pool
+    PAGE_SHARD_THRESHOLD: int = 24
+
+    # REST uploads
+    MAX_UPLOAD_BYTES: int = 200 * 1024 * 1024
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+
+    # Bulk ZIP imports: upload limit for archives, and PDFs and their total bytes per transaction (a batch is
+    # read ahead while the previous one is extracted, so about twice BULK_BATCH_MAX_BYTES is held in memory)
+    BULK_MAX_UPLOAD_BYTES: int = 5 * 1024 * 1024 * 1024
+    BULK_BATCH_SIZE: int = 64
+    BULK_BATCH_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # Ingestion job queue
+    QUEUE_MAX_DEPTH: int = 100
+    QUEUE_MAX_PER_CHAT: int = 20
+    EXTRACT_WORKERS: int = os.cpu_count() or 1
+    PARSE_WORKERS: int = 32
+    JOB_MAX_ATTEMPTS: int = 3
+    # Seconds a worker process holds a running job or bulk import without renewing it; after that another
+    # process resumes it
+    JOB_LEASE_SECONDS: float = 60.0
+
+    # Outgoing bot messages: per second overall, per second (and burst) to one chat, per minute to a group.
+    # Every rate and burst must be at least 1; startup fails otherwise
+    BOT_SEND_RATE: int = 25
+    BOT_CHAT_SEND_RATE: int = 1
+    BOT_CHAT_SEND_BURST: int = 3
+    BOT_GROUP_SEND_PER_MINUTE: int = 20
+
+    # Dedup cache for extraction and Gemini results; an entry's access time and hit
+    # count are written at most once per DEDUP_CACHE_TOUCH_SECONDS
+    DEDUP_CACHE_TTL_SECONDS: int = 30 * 24 * 3600
+    DEDUP_CACHE_MAX_ENTRIES: int = 10000
+    DEDUP_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    DEDUP_CACHE_TOUCH_SECONDS: int = 300
+
+    # Rate limits (GCRA): HTTP requests per client and PDF uploads per Telegram chat, as requests
+    # per window in seconds plus a burst, each at least 1 (startup fails otherwise). The sqlite backend
+    # shares limits across worker processes.
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_DB_PATH: str = "rate_limits.db"
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    RATE_LIMIT_REQUESTS: int = 120
+    RATE_LIMIT_WINDOW: float = 60.0
+    RATE_LIMIT_BURST: int = 30
+    UPLOAD_RATE_LIMIT: int = 10
+    UPLOAD_RATE_WINDOW: float = 60.0
+    UPLOAD_RATE_BURST: int = 5
+
+    # HTML-to-PDF render pool: worker processes, renders allowed to wait for one, seconds per render
+    RENDER_WORKERS: int = min(4, os.cpu_count() or 1)
+    RENDER_QUEUE_SIZE: int = 32
+    RENDER_TIMEOUT: float = 30.0
+    # HTML-to-PDF backend (xhtml2pdf or weasyprint), and the one for invoice drafts (also reportlab)
+    PDF_BACKEND: str = "xhtml2pdf"
+    INVOICE_PDF_BACKEND: str = "reportlab"
+    # Rendered PDFs cached on disk, least recently used evicted beyond the cap
+    PDF_CACHE_DIR: str = "files/pdf_cache"
+    PDF_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # Invoice builder drafts: idle lifetime and row limit
+    INVOICE_DRAFT_TTL_SECONDS: int = 24 * 3600
+    INVOICE_DRAFT_MAX_ROWS: int = 500
+
+    # Per-stage timeouts (seconds)
+    EXTRACT_TIMEOUT: float = 120.0
+    DB_TIMEOUT: float = 30.0
+    GEMINI_TIMEOUT: float = 60.0
+
+    # Logging: level, json or text lines, directory for app.log/access.log (empty for stderr only).
+    # Records go through a bounded queue to a writer thread; INFO and below are sampled to
+    # LOG_SAMPLE_BURST per message per second (0 disables sampling), and logged payloads are capped.
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+    LOG_DIR: str = "logs"
+    LOG_FILE_MAX_BYTES: int = 5 * 1024 * 1024
+    LOG_FILE_BACKUPS: int = 3
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_SAMPLE_BURST: int = 50
+    LOG_MAX_PAYLOAD_CHARS: int = 2000
+
+    # Profiling, written to PROFILE_DIR. The /admin/profiling endpoints (mounted when ADMIN_TOKEN is set,
+    # sent as X-Admin-Token) run a sampling profiler and take tracemalloc snapshots of extraction and
+    # rendering. Bot updates, HTTP requests and jobs slower than SLOW_REQUEST_SECONDS (0 disables) get a
+    # report of their stage timings and await stacks, sampled every SLOW_REQUEST_SAMPLE_SECONDS.
+    ADMIN_TOKEN: str | None = None
+    PROFILE_DIR: str = "profiles"
+    PROFILE_SAMPLE_INTERVAL_MS: int = 10
+    PROFILE_MAX_SECONDS: float = 300.0
+    SLOW_REQUEST_SECONDS: float = 0.0
+    SLOW_REQUEST_SAMPLE_SECONDS: float = 0.25
+    TRACEMALLOC_FRAMES: int = 10
+
+settings = Settings()
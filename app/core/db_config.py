@@ -1,27 +1,221 @@
-from sqlalchemy import create_engine
+from contextlib import asynccontextmanager
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+import asyncio
+import json
 import os
+import threading
+import weakref
+from app.core.config import settings
 from app.models.base_model import Base
 from app.models.invoice_pdf import InvoicePDF
 from app.models.invoice_json import InvoiceJSON
+from app.models.ingestion_job import IngestionJob
+from app.models.dedup_cache import DedupCacheEntry
+from app.models.bulk_import import BulkImport
+from app.models.invoice_draft import InvoiceDraft, InvoiceDraftRow
+from app.models.counter import Counter
+from app.models.bot_state import BotState
+from app.utils.invoice_fields import compact_json, extract_invoice_fields
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
-# SQLite database file in project root
+# SQLite database file in project root, unless DATABASE_URL points elsewhere
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "invoices.db")
-DB_URL = f"sqlite:///{DB_PATH}"
+ASYNC_DB_URL = settings.DATABASE_URL or f"sqlite+aiosqlite:///{DB_PATH}"
 
-# Create engine
-engine = create_engine(DB_URL, connect_args={"check_same_thread": False})
+# Blocking driver for each async driver, used by the sync engine. psycopg (v3) is both.
+SYNC_DRIVERS = {
+    "sqlite+aiosqlite": "sqlite",
+    "postgresql+psycopg": "postgresql+psycopg",
+    "postgresql+asyncpg": "postgresql+psycopg",
+}
+
+_async_url = make_url(ASYNC_DB_URL)
+IS_SQLITE = _async_url.get_backend_name() == "sqlite"
+DB_URL = _async_url.set(drivername=SYNC_DRIVERS.get(_async_url.drivername, _async_url.drivername))
+
+# PRAGMAs applied to every new SQLite connection, per SQLITE_PROFILE
+SQLITE_PROFILES = {
+    "default": {},
+    "performance": {
+        "journal_mode": "WAL",  # Readers no longer block the writer
+        "synchronous": "NORMAL",  # Safe with WAL; fsync on checkpoint instead of every commit
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": -settings.SQLITE_CACHE_SIZE_KB,  # Negative values are KiB
+        "temp_store": "MEMORY",
+    },
+}
+if settings.SQLITE_PROFILE not in SQLITE_PROFILES:
+    raise ValueError(f"Unknown SQLITE_PROFILE {settings.SQLITE_PROFILE!r}, expected one of {sorted(SQLITE_PROFILES)}")
+
+_pool_options = {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+    "pool_pre_ping": not IS_SQLITE,
+}
+
+# Create engines: the sync one serves the REST routes and schema setup, the
+# async ones (see get_async_engine) the bot pipeline
+engine = create_engine(
+    DB_URL,
+    connect_args={"check_same_thread": False, "timeout": settings.DB_TIMEOUT} if IS_SQLITE else {},
+    **_pool_options,
+)
+
+def _apply_sqlite_profile(dbapi_connection, connection_record):
+    """Set the SQLITE_PROFILE pragmas on a new connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PROFILES[settings.SQLITE_PROFILE].items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _apply_sqlite_profile)
+
+# One async engine per event loop: pooled aiosqlite/psycopg connections belong
+# to the loop that opened them, and the bot may run on its own polling loop
+_async_engines: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_async_engines_lock = threading.Lock()
+
+def get_async_engine() -> AsyncEngine:
+    """Return the running loop's async engine, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    with _async_engines_lock:
+        async_engine = _async_engines.get(loop)
+        if async_engine is None:
+            async_engine = create_async_engine(
+                ASYNC_DB_URL,
+                connect_args={"timeout": settings.DB_TIMEOUT} if IS_SQLITE else {},
+                **_pool_options,
+            )
+            if IS_SQLITE:
+                event.listen(async_engine.sync_engine, "connect", _apply_sqlite_profile)
+            _async_engines[loop] = async_engine
+    return async_engine
+
+async def dispose_async_engine():
+    """Close the running loop's async engine and its pooled connections; other loops keep theirs."""
+    with _async_engines_lock:
+        async_engine = _async_engines.pop(asyncio.get_running_loop(), None)
+    if async_engine is not None:
+        await async_engine.dispose()
+
+def _add_missing_columns() -> set[tuple[str, str]]:
+    """
+    Add nullable columns introduced after a table was first created (create_all skips existing tables).
+
+    Returns:
+        set: (table, column) pairs that were added.
+    """
+    added = set()
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+                logger.info("Added column %s.%s", table.name, column.name)
+                added.add((table.name, column.name))
+    return added
+
+def _backfill_invoice_fields(batch_size: int = 500):
+    """Populate the promoted invoice_jsons columns of rows stored before they existed, compacting their JSON."""
+    updated = 0
+    with SessionLocal() as db:
+        last_id = ""
+        while True:
+            rows = (
+                db.query(InvoiceJSON).filter(InvoiceJSON.id > last_id)
+                .order_by(InvoiceJSON.id).limit(batch_size).all()
+            )
+            if not rows:
+                break
+            for row in rows:
+                try:
+                    data = json.loads(row.json_data)
+                except ValueError:
+                    continue
+                if isinstance(data, dict):
+                    row.json_data = compact_json(data)
+                    for name, value in extract_invoice_fields(data).items():
+                        setattr(row, name, value)
+                    updated += 1
+            last_id = rows[-1].id
+            db.commit()
+    logger.info("Backfilled invoice fields for %d rows", updated)
+
+def _create_missing_indexes():
+    """Create indexes declared after a table was first created."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+# Full-text index over invoice_pdfs (SQLite FTS5), kept in sync by triggers.
+# It indexes the table's implicit rowid, so rebuild it after a VACUUM.
+SEARCH_TABLE = "invoice_pdfs_fts"
+_SEARCH_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ai AFTER INSERT ON invoice_pdfs BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, filename, extracted_text)
+        VALUES (new.rowid, new.filename, new.extracted_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ad AFTER DELETE ON invoice_pdfs BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, filename, extracted_text)
+        VALUES ('delete', old.rowid, old.filename, old.extracted_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_au AFTER UPDATE OF filename, extracted_text ON invoice_pdfs BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, filename, extracted_text)
+        VALUES ('delete', old.rowid, old.filename, old.extracted_text);
+        INSERT INTO {SEARCH_TABLE}(rowid, filename, extracted_text)
+        VALUES (new.rowid, new.filename, new.extracted_text);
+    END""",
+)
+
+def _create_search_index():
+    """Create the FTS5 table and its triggers, indexing existing rows the first time."""
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": SEARCH_TABLE}
+        ).first()
+        if not exists:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(filename, extracted_text, "
+                "content='invoice_pdfs', tokenize='porter unicode61 remove_diacritics 2')"
+            ))
+            conn.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+            logger.info("Created full-text index %s", SEARCH_TABLE)
+        for trigger in _SEARCH_TRIGGERS:
+            conn.execute(text(trigger))
+
+def rebuild_search_index():
+    """Re-index every invoice_pdfs row, e.g. after a VACUUM renumbered rowids."""
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+    logger.info("Rebuilt full-text index %s", SEARCH_TABLE)
 
 # Create tables
 def init_db():
-    logger.info("Checking and creating tables for SQLite database: %s", DB_PATH)
+    logger.info("Checking and creating tables for database: %s", DB_URL.render_as_string(hide_password=True))
     Base.metadata.create_all(engine)
-    logger.info("Database tables initialized: %s", DB_PATH)
+    added = _add_missing_columns()
+    if ("invoice_jsons", "invoice_number") in added:
+        _backfill_invoice_fields()
+    _create_missing_indexes()
+    if IS_SQLITE:
+        _create_search_index()
+    logger.info("Database tables initialized: %s", DB_URL.render_as_string(hide_password=True))
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -32,4 +226,20 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+@asynccontextmanager
+async def async_session_scope():
+    """
+    Provide an async session wrapped in one transaction.
+
+    Commits when the block exits normally, rolls back on error and always
+    returns the connection to the pool.
+    """
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.db_config import async_session_scope
+
+logger = logging.getLogger(__name__)
+
+# A write operation: an async function taking the shared session first
+WriteOp = Callable[..., Awaitable[Any]]
+
+class GroupCommitWriter:
+    """
+    Single writer task that commits concurrent writes together.
+
+    Writes submitted while a commit is in flight, or within
+    DB_GROUP_COMMIT_MAX_WAIT_MS of the first one, run one after another on a
+    shared session and are committed in one transaction, up to
+    DB_GROUP_COMMIT_MAX_BATCH writes. On SQLite this replaces one fsync per
+    upload with one per batch and keeps writers from contending for the
+    database lock. If a batch fails it is rolled back and each write is
+    retried in its own transaction, so one bad write does not fail the rest.
+    """
+
+    def __init__(self, max_batch: int, max_wait_ms: int):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._loop = None
+        self._batches = 0
+        self._writes = 0
+
+    def _ensure_started(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._loop is not loop or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run(), name="group-commit-writer")
+            self._loop = loop
+        return self._queue
+
+    async def submit(self, op: WriteOp, *args) -> Any:
+        """
+        Run a write in the next group commit and wait until it is committed.
+
+        Args:
+            op (WriteOp): Async function called as op(session, *args). It may
+                run again in a fresh session if its batch fails.
+            *args: Extra arguments for op.
+
+        Returns:
+            Any: The value returned by op.
+        """
+        if self.max_batch <= 1:
+            async with async_session_scope() as db:
+                return await op(db, *args)
+        future = asyncio.get_running_loop().create_future()
+        self._ensure_started().put_nowait((op, args, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            if self.max_wait and self._queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.max_wait)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            batch = [write for write in batch if not write[2].done()]  # Skip callers that timed out
+            if batch:
+                await self._commit(batch)
+
+    async def _commit(self, batch: list[tuple]):
+        try:
+            results = []
+            async with async_session_scope() as db:
+                for op, args, _ in batch:
+                    results.append(await op(db, *args))
+        except Exception as e:
+            if len(batch) == 1:
+                _resolve(batch[0][2], error=e)
+                return
+            logger.warning("Group commit of %d writes failed, retrying individually: %s", len(batch), str(e))
+            for op, args, future in batch:
+                try:
+                    async with async_session_scope() as db:
+                        result = await op(db, *args)
+                except Exception as single_error:
+                    _resolve(future, error=single_error)
+                else:
+                    _resolve(future, result)
+            return
+
+        self._batches += 1
+        self._writes += len(batch)
+        for (_, _, future), result in zip(batch, results):
+            _resolve(future, result)
+
+    async def aclose(self):
+        """Stop the writer task and fail writes that were never committed."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        while not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            _resolve(future, error=RuntimeError("Database writer stopped"))
+        self._task = None
+
+    def stats(self) -> dict:
+        """Return the number of group commits and the writes they carried."""
+        return {
+            "batches": self._batches,
+            "writes": self._writes,
+            "mean_batch_size": self._writes / self._batches if self._batches else 0.0,
+        }
+
+def _resolve(future: asyncio.Future, result: Any = None, error: Exception | None = None):
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+db_writer = GroupCommitWriter(
+    max_batch=settings.DB_GROUP_COMMIT_MAX_BATCH,
+    max_wait_ms=settings.DB_GROUP_COMMIT_MAX_WAIT_MS,
+)
@@ -0,0 +1,155 @@
+import asyncio
+import contextvars
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Pools are created lazily so that importing this module (including from
+# spawned worker processes) never forks or starts threads.
+_process_pool: ProcessPoolExecutor | None = None
+_thread_pool: ThreadPoolExecutor | None = None
+_lock = threading.Lock()
+# Pools terminated because a worker ignored its deadline; their other tasks are retried
+_recycled_pools: "weakref.WeakSet[ProcessPoolExecutor]" = weakref.WeakSet()
+
+# Seconds a pool worker is given past its deadline before the pool is replaced
+WORKER_KILL_GRACE = 5.0
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the shared process pool used for CPU-bound work."""
+    global _process_pool
+    with _lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=settings.CPU_POOL_SIZE,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            logger.info("Started process pool with %d workers", settings.CPU_POOL_SIZE)
+        return _process_pool
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    """Return the shared thread pool used for blocking I/O."""
+    global _thread_pool
+    with _lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(
+                max_workers=settings.IO_POOL_SIZE,
+                thread_name_prefix="io-worker",
+            )
+            logger.info("Started I/O thread pool with %d workers", settings.IO_POOL_SIZE)
+        return _thread_pool
+
+def run_with_deadline(deadline: float | None, func, *args, **kwargs):
+    """
+    Call func in a pool worker, raising TimeoutError inside it at `deadline` (a time.time() value).
+
+    The worker interrupts itself with SIGALRM, so a timed-out task frees its
+    process instead of running on after the caller gave up. The deadline is
+    absolute, so time spent waiting for a free worker counts against it.
+    Where SIGALRM is not available (Windows) func runs without a deadline.
+    """
+    if deadline is None or not hasattr(signal, "setitimer"):
+        return func(*args, **kwargs)
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise TimeoutError("Worker task expired before it started")
+
+    def expired(signum, frame):
+        raise TimeoutError("Worker task exceeded its deadline")
+
+    previous = signal.signal(signal.SIGALRM, expired)
+    signal.setitimer(signal.ITIMER_REAL, remaining)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def terminate_pool(pool: ProcessPoolExecutor):
+    """Kill the worker processes of a pool and shut it down, failing the tasks it still holds."""
+    # ProcessPoolExecutor has no public way to stop a busy worker before Python 3.14
+    for process in list((pool._processes or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _recycle_process_pool(pool: ProcessPoolExecutor):
+    global _process_pool
+    with _lock:
+        if _process_pool is not pool:
+            return  # Already replaced
+        _process_pool = None
+        _recycled_pools.add(pool)
+    logger.warning("A process pool worker ignored its deadline; replacing the pool")
+    terminate_pool(pool)
+
+async def run_cpu_bound(func, *args, timeout: float | None = None, **kwargs):
+    """
+    Run a CPU-bound function in the process pool without blocking the event loop.
+
+    With a timeout the worker stops the task itself (see run_with_deadline).
+    A worker still busy WORKER_KILL_GRACE seconds later, stuck in native
+    code, is killed by replacing the pool. Other tasks that were running or
+    waiting in that pool are retried once on the new pool, within their
+    own deadlines, so one stuck task does not fail unrelated ones.
+
+    Args:
+        func: Picklable, module-level callable.
+        timeout (float | None): Seconds to wait before raising asyncio.TimeoutError.
+
+    Returns:
+        The function's return value.
+    """
+    deadline = time.time() + timeout if timeout else None
+    for attempt in range(2):
+        pool = get_process_pool()
+        try:
+            task = pool.submit(run_with_deadline, deadline, func, *args, **kwargs)
+            wait = deadline - time.time() + WORKER_KILL_GRACE if deadline else None
+            return await asyncio.wait_for(asyncio.wrap_future(task), wait)
+        except asyncio.TimeoutError:
+            if task.running():
+                _recycle_process_pool(pool)
+            raise
+        except (BrokenProcessPool, RuntimeError):
+            # RuntimeError: submitted just after another thread shut the pool down
+            if attempt or pool not in _recycled_pools:
+                raise
+            logger.warning("Retrying %s lost when the process pool was replaced", getattr(func, "__name__", func))
+
+async def run_io_bound(func, *args, timeout: float | None = None, **kwargs):
+    """
+    Run a blocking I/O function in the thread pool without blocking the event loop.
+
+    Args:
+        func: Callable performing blocking I/O (DB, HTTP, filesystem).
+        timeout (float | None): Seconds to wait before raising asyncio.TimeoutError.
+
+    Returns:
+        The function's return value.
+    """
+    loop = asyncio.get_running_loop()
+    # Run in a copy of the caller's context, so log records keep its correlation ids
+    context = contextvars.copy_context()
+    future = loop.run_in_executor(get_thread_pool(), partial(context.run, func, *args, **kwargs))
+    return await asyncio.wait_for(future, timeout)
+
+def shutdown_executors():
+    """Shut down both pools, cancelling work that has not started yet."""
+    global _process_pool, _thread_pool
+    with _lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+        if _thread_pool is not None:
+            _thread_pool.shutdown(wait=False, cancel_futures=True)
+            _thread_pool = None
+    logger.info("Offload executors shut down")
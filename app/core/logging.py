@@ -1,42 +1,233 @@
+import contextvars
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import sys
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from app.core.config import settings
+
+# Correlation ids (request_id, update_id, chat_id, job_id) attached to every record logged in this context
+log_context: contextvars.ContextVar[dict] = contextvars.ContextVar("log_context", default={})
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_listener: QueueListener | None = None
+_queue_handler: "NonBlockingQueueHandler | None" = None
+
+def bind_log_context(**fields) -> contextvars.Token:
+    """
+    Add correlation ids to the records logged from the current context.
+
+    Returns:
+        contextvars.Token: Pass to log_context.reset() to restore the previous ids.
+    """
+    return log_context.set({**log_context.get(), **fields})
+
+def truncate_payload(text: str, limit: int | None = None) -> str:
+    """Cap a logged payload (e.g. a model response) at LOG_MAX_PAYLOAD_CHARS characters."""
+    limit = limit or settings.LOG_MAX_PAYLOAD_CHARS
+    if text is None or len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text)} chars]"
+
+class SamplingFilter(logging.Filter):
+    """
+    Let through at most `burst` records per message template and `period`.
+
+    Warnings and errors always pass. The number of records dropped for a
+    template is reported as `sampled_out` on its next record that passes.
+    Counters are updated without a lock; a race can only miscount by one.
+    """
+
+    MAX_TEMPLATES = 10000
+
+    def __init__(self, burst: int, period: float = 1.0):
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        # (logger name, message template) -> [window start, records passed, records dropped]
+        self._windows: dict[tuple, list] = {}
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.burst <= 0:
+            return True
+        key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg))
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.period:
+            if window is not None and window[2]:
+                record.sampled_out = window[2]
+            elif window is None and len(self._windows) >= self.MAX_TEMPLATES:
+                self._windows.clear()  # Messages formatted before logging make unbounded templates
+            self._windows[key] = [now, 1, 0]
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        self.dropped += 1
+        return False
+
+class _ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.context = log_context.get()
+        return True
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Queue records for the listener thread without ever blocking the caller.
+
+    Only the message itself is rendered on the calling thread; timestamps,
+    JSON encoding and file I/O happen on the listener. The queue is an
+    unbounded SimpleQueue (a lock-free put) capped at max_size by checking
+    its length: when full, the record is dropped and counted.
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue, max_size: int):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+        self.sampler: SamplingFilter | None = None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Updated in place rather than copied: this handler sits on the root logger,
+        # which is the last to see a record
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks reference frames, so they are rendered before leaving this thread
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the correlation ids as top-level fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "context", {}),
+        }
+        if getattr(record, "sampled_out", 0):
+            entry["sampled_out"] = record.sampled_out
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    """The classic text format, followed by the correlation ids as key=value pairs."""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = dict(getattr(record, "context", {}))
+        if getattr(record, "sampled_out", 0):
+            fields["sampled_out"] = record.sampled_out
+        if fields:
+            text += " [" + " ".join(f"{key}={value}" for key, value in fields.items()) + "]"
+        return text
+
+def create_queue_logging(handlers: list[logging.Handler], queue_size: int,
+                         sample_burst: int) -> tuple[NonBlockingQueueHandler, QueueListener]:
+    """
+    Build a queue handler for the calling threads and the listener that feeds `handlers`.
+
+    Args:
+        handlers (list[logging.Handler]): Where the listener thread writes records.
+        queue_size (int): Records allowed to wait; beyond that new ones are dropped.
+        sample_burst (int): Records per message template per second below WARNING (0 keeps all).
+
+    Returns:
+        tuple: (queue handler, listener); the listener is not started.
+    """
+    queue_handler = NonBlockingQueueHandler(queue.SimpleQueue(), queue_size)
+    queue_handler.sampler = SamplingFilter(sample_burst)
+    queue_handler.addFilter(queue_handler.sampler)
+    queue_handler.addFilter(_ContextFilter())
+    return queue_handler, QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+
+def _build_handlers() -> list[logging.Handler]:
+    formatter = JsonFormatter() if settings.LOG_FORMAT == "json" else TextFormatter()
+    console = logging.StreamHandler(sys.stderr)
+    handlers = [console]
+    if settings.LOG_DIR:
+        os.makedirs(settings.LOG_DIR, exist_ok=True)
+        # General file handler (app.log)
+        handlers.append(RotatingFileHandler(
+            os.path.join(settings.LOG_DIR, "app.log"),
+            maxBytes=settings.LOG_FILE_MAX_BYTES, backupCount=settings.LOG_FILE_BACKUPS
+        ))
+        # Access log file handler (access.log), for the access logger only
+        access_handler = RotatingFileHandler(
+            os.path.join(settings.LOG_DIR, "access.log"),
+            maxBytes=settings.LOG_FILE_MAX_BYTES, backupCount=settings.LOG_FILE_BACKUPS
+        )
+        access_handler.addFilter(logging.Filter("access"))
+        handlers.append(access_handler)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
 
 def setup_logging():
-    # Ensure logs directory exists
-    logs_dir = os.path.join(os.path.dirname(__file__), "..", "..", "logs")
-    os.makedirs(logs_dir, exist_ok=True)
-
-    # Common log format
-    log_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    formatter = logging.Formatter(log_format)
-
-    # General logger configuration
-    logging.basicConfig(level=logging.INFO, format=log_format)
-
-    # General file handler (app.log)
-    app_log_handler = RotatingFileHandler(
-        os.path.join(logs_dir, "app.log"),
-        maxBytes=5*1024*1024,  # 5MB
-        backupCount=3
-    )
-    app_log_handler.setFormatter(formatter)
-    app_log_handler.setLevel(logging.INFO)
-
-    # Access log file handler (access.log)
-    access_log_handler = RotatingFileHandler(
-        os.path.join(logs_dir, "access.log"),
-        maxBytes=5*1024*1024,  # 5MB
-        backupCount=3
+    """
+    Route all logging through a bounded queue to a listener thread.
+
+    The root logger gets a single non-blocking QueueHandler that samples
+    high-volume INFO messages (LOG_SAMPLE_BURST per template per second) and
+    tags records with the current correlation ids. A QueueListener writes
+    them to stderr and, when LOG_DIR is set, to rotating app.log and
+    access.log files, as JSON lines or text per LOG_FORMAT. Safe to call
+    more than once.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    _queue_handler, _listener = create_queue_logging(
+        _build_handlers(), settings.LOG_QUEUE_SIZE, settings.LOG_SAMPLE_BURST
     )
-    access_log_handler.setFormatter(formatter)
-    access_log_handler.setLevel(logging.INFO)
 
-    # Configure root logger
     root_logger = logging.getLogger()
-    root_logger.addHandler(app_log_handler)
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(_queue_handler)
+    root_logger.setLevel(settings.LOG_LEVEL.upper())
+    # httpx logs every request URL at INFO, and Telegram's URLs contain the bot token
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    _listener.start()
+
+def shutdown_logging():
+    """Write out the queued records, then log synchronously through the same handlers."""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    _listener.stop()
+    root_logger = logging.getLogger()
+    root_logger.removeHandler(_queue_handler)
+    for handler in _listener.handlers:
+        root_logger.addHandler(handler)
+    _listener = None
+    _queue_handler = None
 
-    # Configure access logger
-    access_logger = logging.getLogger("access")
-    access_logger.addHandler(access_log_handler)
-    access_logger.setLevel(logging.INFO)
\ No newline at end of file
+def logging_stats() -> dict:
+    """Return the records dropped because the queue was full or by sampling."""
+    if _queue_handler is None:
+        return {"queue_full": 0, "sampled": 0}
+    return {"queue_full": _queue_handler.dropped, "sampled": _queue_handler.sampler.dropped}
@@ -0,0 +1,179 @@
+import bisect
+import math
+import threading
+import time
+from typing import Callable
+from app.core.profiling import record_span
+
+# Histogram buckets: latencies in seconds, PDF sizes in bytes and page counts
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+BYTE_BUCKETS = tuple(16 * 1024 * 4**i for i in range(9))  # 16 KiB .. 1 GiB
+PAGE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    return "+Inf" if value == math.inf else repr(float(value))
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (),
+                 func: Callable[[], dict | float] | None = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.func = func
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def _collect(self) -> dict[tuple, float]:
+        if self.func is None:
+            with self._lock:
+                return dict(self._values)
+        values = self.func()
+        return values if isinstance(values, dict) else {(): values}
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(self._collect().items()):
+            if value is None:
+                continue
+            labels = labels if isinstance(labels, tuple) else (labels,)
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+class Counter(_Metric):
+    """
+    Monotonic counter, optionally labelled.
+
+    With func, the values are read from func() at scrape time instead (a
+    number, or a dict of label value tuples to numbers), which exports
+    counters kept elsewhere at no cost to the code that updates them.
+    """
+
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+class Gauge(_Metric):
+    """Current value, set directly or read from func() at scrape time."""
+
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: "Histogram", labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        self.histogram.observe(elapsed, *self.labels)
+        # Also a stage of the slow request report, when the current work is tracked
+        record_span("/".join(map(str, self.labels)), elapsed)
+
+class Histogram(_Metric):
+    """
+    Cumulative histogram with fixed buckets.
+
+    An observation is one bisect and three additions under a lock; bucket
+    counts are made cumulative only when rendered.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: [count per bucket..., +Inf count, sum]
+        self._series: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *labels) -> _Timer:
+        """Context manager observing the seconds spent in its block, also recorded with record_span()."""
+        return _Timer(self, labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """Metrics of this process, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+# Pipeline metrics, updated on the hot path
+stage_seconds = registry.register(Histogram(
+    "invoice_stage_seconds", "Time spent in each stage of invoice ingestion.", ("pipeline", "stage")
+))
+pdf_bytes = registry.register(Histogram(
+    "invoice_pdf_bytes", "Size of uploaded PDFs.", ("source",), buckets=BYTE_BUCKETS
+))
+pdf_pages = registry.register(Histogram(
+    "invoice_pdf_pages", "Page count of extracted PDFs.", buckets=PAGE_BUCKETS
+))
+jobs_total = registry.register(Counter(
+    "invoice_jobs_total", "Finished ingestion jobs by outcome.", ("outcome",)
+))
+rate_limit_rejections = registry.register(Counter(
+    "rate_limit_rejections_total", "Requests denied by a rate limiter.", ("limiter",)
+))
+http_request_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ("method", "route", "status")
+))
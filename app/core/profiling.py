@@ -0,0 +1,295 @@
+import asyncio
+import collections
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from app.core.config import settings
+from app.core.executors import get_thread_pool
+from app.core.logging import log_context
+from app.utils.profiling import profile_path, traced_call
+
+logger = logging.getLogger(__name__)
+
+# Frames (file name, function) where a thread waits rather than runs; left out of the profiler's top list
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("thread.py", "_worker"),
+    ("queue.py", "get"),
+    ("handlers.py", "dequeue"),
+    ("connection.py", "_poll"),
+    ("connection.py", "_recv"),
+}
+
+# Frames listed in a profiler summary
+PROFILE_TOP = 20
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+def _is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES
+
+def _await_stack(task: asyncio.Task) -> tuple[str, ...]:
+    """The chain of coroutines a task is suspended in, outermost first."""
+    frames = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(_frame_label(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return tuple(frames)
+
+class RequestTrace:
+    """Stage timings and await stacks collected for one bot update, HTTP request or job."""
+
+    __slots__ = ("kind", "name", "started_at", "spans", "stacks", "samples", "max_loop_lag", "done")
+
+    def __init__(self, kind: str, name: str):
+        self.kind = kind
+        self.name = name
+        self.started_at = time.time()
+        self.spans: list[tuple[str, float, float]] = []
+        self.stacks: collections.Counter = collections.Counter()
+        self.samples = 0
+        self.max_loop_lag = 0.0
+        self.done = False
+
+# The trace of the update, request or job being handled in this context, if it is tracked
+current_trace: contextvars.ContextVar[RequestTrace | None] = contextvars.ContextVar("current_trace", default=None)
+
+def record_span(name: str, seconds: float):
+    """Add a timed stage to the current trace, if there is one."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.spans.append((name, round(time.time() - seconds - trace.started_at, 6), round(seconds, 6)))
+
+@contextlib.contextmanager
+def span(name: str):
+    """Time a block as a stage of the current trace; free when nothing is traced."""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start_time)
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for every thread of this process.
+
+    A daemon thread records the Python stack of each thread every interval
+    (sys._current_frames, so the profiled code is not instrumented) and
+    aggregates identical stacks. On stop, or after max_seconds, the stacks
+    are written in the folded format read by flamegraph.pl and speedscope,
+    rooted at the thread name. Worker processes of the extraction and
+    render pools are not sampled.
+    """
+
+    def __init__(self, directory: str, max_seconds: float):
+        self.directory = directory
+        self.max_seconds = max_seconds
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.last_result: dict | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float, duration: float | None = None) -> bool:
+        """
+        Start sampling every `interval` seconds, for at most `duration` (capped at max_seconds).
+
+        Returns:
+            bool: False if the profiler is already running.
+        """
+        with self._lock:
+            if self.running:
+                return False
+            duration = min(duration or self.max_seconds, self.max_seconds)
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(interval, duration), name="sampling-profiler", daemon=True
+            )
+            self._thread.start()
+        logger.info("Sampling profiler started: every %.1f ms for up to %.0f s", interval * 1000, duration)
+        return True
+
+    def stop(self) -> dict | None:
+        """Stop sampling and return the summary of the run (None if it was never started)."""
+        with self._lock:
+            thread = self._thread
+            self._stop.set()
+        if thread is not None:
+            thread.join()
+        return self.last_result
+
+    def _run(self, interval: float, duration: float):
+        stacks: collections.Counter = collections.Counter()
+        leaves: collections.Counter = collections.Counter()
+        own_id = threading.get_ident()
+        start_time = time.perf_counter()
+        samples = idle = 0
+        while not self._stop.wait(interval) and time.perf_counter() - start_time < duration:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                samples += 1
+                if _is_idle(frame):
+                    idle += 1
+                else:
+                    leaves[_frame_label(frame)] += 1
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(thread_id, str(thread_id)))
+                stacks[";".join(reversed(labels))] += 1
+        elapsed = time.perf_counter() - start_time
+        try:
+            path = profile_path(self.directory, "cpu", ".folded")
+            with open(path, "w", encoding="utf-8") as output:
+                output.writelines(f"{stack} {count}\n" for stack, count in stacks.items())
+        except OSError as e:
+            logger.error("Failed to write the profile: %s", str(e))
+            path = None
+        self.last_result = {
+            "path": path,
+            "seconds": round(elapsed, 3),
+            "samples": samples,
+            "idle_samples": idle,
+            "top": [{"frame": label, "samples": count} for label, count in leaves.most_common(PROFILE_TOP)],
+        }
+        logger.info("Sampling profiler stopped after %.1f s, %d samples written to %s", elapsed, samples, path)
+
+class SlowRequestTracker:
+    """
+    Report bot updates, HTTP requests and jobs that take longer than `threshold` seconds.
+
+    Tracked work gets a RequestTrace in its context, which collects the
+    stages timed with span() or a stage_seconds timer. Once the threshold is
+    passed, the chain of coroutines the task is suspended in is sampled every
+    `sample_interval` seconds. Work that finishes over the threshold is
+    written to `slow-<kind>-...json` in `directory`: its duration, stage
+    timings, await stacks by sample count, how late the event loop ran the
+    sampler (time it was blocked) and its log correlation ids. A threshold
+    of 0 disables tracking.
+    """
+
+    def __init__(self, directory: str, threshold: float, sample_interval: float):
+        self.directory = directory
+        self.threshold = threshold
+        self.sample_interval = sample_interval
+        self.reports = 0
+
+    @contextlib.asynccontextmanager
+    async def track(self, kind: str, name: str):
+        threshold = self.threshold
+        if threshold <= 0:
+            yield
+            return
+        trace = RequestTrace(kind, name)
+        token = current_trace.set(trace)
+        loop = asyncio.get_running_loop()
+        loop.call_later(threshold, self._sample, trace, asyncio.current_task(), loop, loop.time() + threshold)
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start_time
+            trace.done = True
+            current_trace.reset(token)
+            if duration >= threshold:
+                # Written on the I/O pool so the slow response is not delayed further
+                get_thread_pool().submit(self._write, trace, duration, log_context.get())
+
+    def _sample(self, trace: RequestTrace, task: asyncio.Task, loop: asyncio.AbstractEventLoop, due: float):
+        if trace.done or task.done():
+            return
+        trace.max_loop_lag = max(trace.max_loop_lag, loop.time() - due)
+        trace.stacks[_await_stack(task)] += 1
+        trace.samples += 1
+        loop.call_later(self.sample_interval, self._sample, trace, task, loop, loop.time() + self.sample_interval)
+
+    def _write(self, trace: RequestTrace, duration: float, context: dict):
+        report = {
+            "kind": trace.kind,
+            "name": trace.name,
+            "started_at": trace.started_at,
+            "seconds": round(duration, 6),
+            "threshold": self.threshold,
+            "context": context,
+            "spans": [{"stage": name, "offset": offset, "seconds": seconds} for name, offset, seconds in trace.spans],
+            "sample_interval": self.sample_interval,
+            "max_loop_lag": round(trace.max_loop_lag, 6),
+            "stacks": [{"samples": count, "stack": list(stack)} for stack, count in trace.stacks.most_common()],
+        }
+        try:
+            path = profile_path(self.directory, f"slow-{trace.kind}", ".json")
+            with open(path, "w", encoding="utf-8") as output:
+                json.dump(report, output, indent=2, default=str)
+        except OSError as e:
+            logger.error("Failed to write the slow %s report: %s", trace.kind, str(e))
+            return
+        self.reports += 1
+        logger.warning("Slow %s %s took %.2f s, report written to %s", trace.kind, trace.name, duration, path)
+
+class MemoryTracer:
+    """
+    tracemalloc snapshots of the next few calls on the extraction and render paths.
+
+    arm(n) marks the next n calls passed through wrap(); those run in their
+    pool worker under traced_call, which writes a snapshot and summary to
+    `directory`. Other calls are not traced and cost one integer check.
+    """
+
+    def __init__(self, directory: str, frames: int):
+        self.directory = directory
+        self.frames = frames
+        self.remaining = 0
+        self._lock = threading.Lock()
+
+    def arm(self, calls: int):
+        with self._lock:
+            self.remaining = max(calls, 0)
+
+    def wrap(self, tag: str, func):
+        """Return func, or a picklable wrapper tracing it if a traced call is pending."""
+        if self.remaining <= 0:
+            return func
+        with self._lock:
+            if self.remaining <= 0:
+                return func
+            self.remaining -= 1
+        return functools.partial(traced_call, tag, self.directory, self.frames, func)
+
+sampling_profiler = SamplingProfiler(settings.PROFILE_DIR, settings.PROFILE_MAX_SECONDS)
+slow_request_tracker = SlowRequestTracker(
+    settings.PROFILE_DIR, settings.SLOW_REQUEST_SECONDS, settings.SLOW_REQUEST_SAMPLE_SECONDS
+)
+memory_tracer = MemoryTracer(settings.PROFILE_DIR, settings.TRACEMALLOC_FRAMES)
+
+def profiling_status() -> dict:
+    """State of the profiling hooks, for the admin endpoint."""
+    return {
+        "directory": os.path.abspath(settings.PROFILE_DIR),
+        "pid": os.getpid(),
+        "sampler": {"running": sampling_profiler.running, "last": sampling_profiler.last_result},
+        "slow_requests": {
+            "threshold": slow_request_tracker.threshold,
+            "sample_interval": slow_request_tracker.sample_interval,
+            "reports": slow_request_tracker.reports,
+        },
+        "tracemalloc": {"pending_calls": memory_tracer.remaining, "frames": memory_tracer.frames},
+    }
@@ -0,0 +1,195 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from app.core.config import settings
+from app.core.executors import run_io_bound
+
+logger = logging.getLogger(__name__)
+
+class RateLimit(NamedTuple):
+    """`rate` requests per `period` seconds, with bursts of up to `burst` requests."""
+    rate: int
+    period: float
+    burst: int
+
+    @property
+    def interval(self) -> float:
+        return self.period / self.rate
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    retry_after: float  # Seconds until the next request would be allowed; 0 when allowed
+
+def _gcra(tat: float | None, now: float, limit: RateLimit) -> tuple[RateLimitResult, float]:
+    """
+    Generic cell rate algorithm: one token bucket kept as a single timestamp.
+
+    `tat` is the theoretical arrival time, the moment the bucket would be full
+    again. A request is allowed when it does not push `tat` more than `burst`
+    intervals ahead of now. Returns the result and the new `tat`.
+    """
+    tat = max(tat or now, now)
+    new_tat = tat + limit.interval
+    allow_at = new_tat - limit.burst * limit.interval
+    if now < allow_at:
+        return RateLimitResult(False, allow_at - now), tat
+    return RateLimitResult(True, 0.0), new_tat
+
+class RateLimitBackend:
+    """Storage for the per-key GCRA timestamps."""
+
+    # Whether hit() does I/O and must run off the event loop
+    blocking = False
+
+    def hit(self, key: str, limit: RateLimit) -> RateLimitResult:
+        raise NotImplementedError
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Per-process backend: one float per key, in least recently used order.
+
+    A key whose bucket has refilled behaves exactly like a new key, so idle
+    keys are dropped as they reach the old end of the order. Beyond max_keys
+    the least recently used key is dropped regardless.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._tats: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: RateLimit) -> RateLimitResult:
+        now = time.monotonic()
+        with self._lock:
+            result, self._tats[key] = _gcra(self._tats.get(key), now, limit)
+            self._tats.move_to_end(key)
+            # Amortized eviction: a couple of idle keys per hit
+            for _ in range(2):
+                oldest, tat = next(iter(self._tats.items()))
+                if tat > now:
+                    break
+                del self._tats[oldest]
+            while len(self._tats) > self.max_keys:
+                self._tats.popitem(last=False)
+        return result
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """
+    Backend shared by every worker process on the host, in its own SQLite file.
+
+    Each hit is one short write transaction; BEGIN IMMEDIATE serializes
+    concurrent hits on the same file. Refilled keys are deleted every
+    `purge_every` hits.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, purge_every: int = 1000):
+        self.path = path
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._hits = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tat REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key: str, limit: RateLimit) -> RateLimitResult:
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            result, tat = _gcra(row[0] if row else None, now, limit)
+            if result.allowed:
+                conn.execute(
+                    "INSERT INTO rate_limits (key, tat) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tat = excluded.tat",
+                    (key, tat),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        with self._lock:
+            self._hits += 1
+            purge_now = self._hits % self.purge_every == 0
+        if purge_now:
+            purged = conn.execute("DELETE FROM rate_limits WHERE tat <= ?", (now,)).rowcount
+            logger.debug("Purged %d idle rate limit keys", purged)
+        return result
+
+def create_rate_limit_backend(name: str, path: str, max_keys: int) -> RateLimitBackend:
+    """
+    Build the backend named by RATE_LIMIT_BACKEND.
+
+    Raises:
+        ValueError: If the name is not "memory" or "sqlite".
+    """
+    if name == "memory":
+        return MemoryRateLimitBackend(max_keys)
+    if name == "sqlite":
+        return SQLiteRateLimitBackend(path)
+    raise ValueError(f"Unknown rate limit backend: {name}")
+
+class RateLimiter:
+    """
+    GCRA rate limiter: O(1) time and one timestamp of memory per key.
+
+    Args:
+        backend (RateLimitBackend): Where the per-key state lives.
+        limit (RateLimit): Allowed rate and burst.
+        prefix (str): Namespace for keys, so limiters can share a backend.
+
+    Raises:
+        ValueError: If the rate, period or burst is not positive; a zero rate
+            or burst would fail every request.
+    """
+
+    def __init__(self, backend: RateLimitBackend, limit: RateLimit, prefix: str):
+        if limit.rate <= 0 or limit.period <= 0 or limit.burst <= 0:
+            raise ValueError(f"Rate limit {prefix!r} needs a rate, period and burst above 0, got {limit}")
+        self.backend = backend
+        self.limit = limit
+        self.prefix = prefix
+
+    async def hit(self, key: str) -> RateLimitResult:
+        """Count a request for the key and return whether it is allowed."""
+        key = f"{self.prefix}:{key}"
+        if self.backend.blocking:
+            return await run_io_bound(self.backend.hit, key, self.limit)
+        return self.backend.hit(key, self.limit)
+
+# Configured limiters: HTTP requests per client address and PDF uploads per Telegram chat
+rate_limit_backend = create_rate_limit_backend(
+    settings.RATE_LIMIT_BACKEND, settings.RATE_LIMIT_DB_PATH, settings.RATE_LIMIT_MAX_KEYS
+)
+api_rate_limiter = RateLimiter(
+    rate_limit_backend,
+    RateLimit(settings.RATE_LIMIT_REQUESTS, settings.RATE_LIMIT_WINDOW, settings.RATE_LIMIT_BURST),
+    prefix="api",
+)
+upload_rate_limiter = RateLimiter(
+    rate_limit_backend,
+    RateLimit(settings.UPLOAD_RATE_LIMIT, settings.UPLOAD_RATE_WINDOW, settings.UPLOAD_RATE_BURST),
+    prefix="upload",
+)
@@ -1,20 +1,33 @@
 from fastapi import FastAPI
 from app.middleware.cors import add_cors_middleware
+from app.middleware.upload_limit import add_upload_limit_middleware
+from app.middleware.rate_limiter import add_rate_limit_middleware
+from app.middleware.logging import add_logging_middleware
+from app.middleware.metrics import add_metrics_middleware
+from app.middleware.profiling import add_slow_request_middleware
 from app.routes.invoice import router as invoice_router
 from app.routes.pdf import router as pdf_router
-from app.services.bot_commands import register_bot_commands
-from app.services.telegram_handler import setup_telegram_handlers
+from app.routes.records import router as records_router
+from app.routes.bulk import router as bulk_router
+from app.routes.telegram import router as telegram_router
+from app.routes.metrics import router as metrics_router
+from app.routes.admin import router as admin_router
+from app.services.telegram_bot import BotMode, run_polling, start_webhook, stop_polling, stop_webhook
+from app.services.bulk_import import bulk_importer
+from app.services.pdf_renderer import pdf_renderer
 from app.core.db_config import init_db
-from telegram.ext import Application
 from app.core.config import settings
-import asyncio
+from app.core.executors import shutdown_executors
+from app.core.logging import setup_logging, shutdown_logging
+from app.core.profiling import sampling_profiler
+from app.core.process_lock import ProcessLock
 from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import logging
 import time
 
-# Configure logging
-logging.basicConfig(level=logging.WARNING)
-logging.getLogger("httpx").setLevel(logging.WARNING)
+# Queue-based logging, set up once for the whole process
+setup_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI()
@@ -22,12 +35,33 @@ app = FastAPI()
 # Add CORS middleware
 add_cors_middleware(app)
 
+# Reject oversized PDF uploads before they are parsed
+add_upload_limit_middleware(app, settings.MAX_UPLOAD_BYTES)
+add_upload_limit_middleware(app, settings.BULK_MAX_UPLOAD_BYTES, path_prefix="/bulk")
+
+# Throttle clients before any other work is done for them; Telegram's webhook calls and metric scrapes are exempt
+add_rate_limit_middleware(app, exempt_paths=(settings.WEBHOOK_PATH, "/metrics"))
+
+# Request latency histogram, throttled requests included
+add_metrics_middleware(app)
+
+# Report requests slower than SLOW_REQUEST_SECONDS, inside the access log so reports carry the request_id
+add_slow_request_middleware(app)
+
+# Access log, outermost so it also records throttled requests
+add_logging_middleware(app)
+
 # Include routes
 app.include_router(invoice_router)
 app.include_router(pdf_router)
-
-# Initialize Telegram bot application
-telegram_app = Application.builder().token(settings.TELEGRAM_BOT_TOKEN).build()
+app.include_router(records_router)
+app.include_router(bulk_router)
+app.include_router(metrics_router)
+if settings.BOT_MODE == BotMode.WEBHOOK:
+    app.include_router(telegram_router)
+# Profiling endpoints only exist when an admin token is configured
+if settings.ADMIN_TOKEN:
+    app.include_router(admin_router)
 
 # Store the polling task to prevent garbage collection
 polling_task = None
@@ -35,45 +69,87 @@ polling_task = None
 # Executor for running polling in a separate thread
 executor = ThreadPoolExecutor(max_workers=1)
 
-def run_polling():
-    """Run Telegram bot polling in a separate event loop."""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        # Initialize and set up handlers
-        loop.run_until_complete(telegram_app.initialize())
-        setup_telegram_handlers(telegram_app)
-        loop.run_until_complete(register_bot_commands())
-        # Start polling
-        loop.run_until_complete(telegram_app.run_polling())
-    except Exception as e:
-        logger.error("Polling error: %s", str(e))
-    finally:
-        # Ensure clean shutdown
-        loop.run_until_complete(telegram_app.stop())
-        loop.run_until_complete(telegram_app.updater.shutdown())
-        loop.close()
+# Telegram allows one getUpdates consumer per token, so with several workers only the lock holder polls
+poller_lock = ProcessLock(settings.BOT_LOCK_PATH)
+standby_task = None
+
+def start_polling():
+    global polling_task
+    polling_task = executor.submit(run_polling)
+
+async def wait_for_poller_lock():
+    # Take over polling once the current poller exits; its conversations are restored from persistence
+    while not poller_lock.acquire():
+        await asyncio.sleep(settings.BOT_LOCK_RETRY_SECONDS)
+    logger.info("Bot poller lock acquired, starting polling")
+    start_polling()
 
 # Register bot commands and handlers on startup
 @app.on_event("startup")
 async def startup_event():
-    global polling_task
+    global standby_task
     # Initialize database
     init_db()
-    # Start polling in a separate thread
-    polling_task = executor.submit(run_polling)
+    # Resume bulk imports interrupted by the last shutdown
+    await bulk_importer.resume_pending()
+    # Spawn the render workers so the first PDF download is not cold
+    await pdf_renderer.start()
+    if settings.BOT_MODE == BotMode.WEBHOOK:
+        # Updates are posted to the webhook route and handled on this loop
+        await start_webhook()
+    elif not settings.BOT_SINGLE_POLLER or poller_lock.acquire():
+        # Start polling in a separate thread
+        start_polling()
+    else:
+        logger.info("Another worker is polling the bot; serving the API only")
+        standby_task = asyncio.create_task(wait_for_poller_lock())
     logger.info("Application startup complete")
 
 # Stop executor on shutdown
 @app.on_event("shutdown")
 async def shutdown_event():
     start_time = time.time()
+    if settings.BOT_MODE == BotMode.WEBHOOK:
+        await stop_webhook()
+    if standby_task is not None:
+        standby_task.cancel()
+
+    # Stop polling and wait for the thread to finish: a standby worker polling while this one
+    # still does would make Telegram answer 409 Conflict and handle updates twice
+    if polling_task is not None:
+        stop_polling()
+        try:
+            await asyncio.wait_for(asyncio.wrap_future(polling_task), settings.BOT_STOP_TIMEOUT)
+            logger.info("Polling thread stopped")
+        except asyncio.TimeoutError:
+            logger.warning("Polling thread still running after %.0f seconds", settings.BOT_STOP_TIMEOUT)
+        except Exception as e:
+            logger.error("Polling thread failed: %s", str(e))
+
     # Shut down the executor
     logger.info("Shutting down executor")
     executor_shutdown_start = time.time()
     executor.shutdown(wait=False, cancel_futures=True)
     executor_shutdown_duration = time.time() - executor_shutdown_start
     logger.info("Executor shutdown completed in %.2f seconds", executor_shutdown_duration)
+    # Let a standby worker take over polling, unless the poller is still running; the lock is
+    # then released when this process exits
+    if polling_task is None or polling_task.done():
+        poller_lock.release()
+
+    # Stop bulk imports before the pools they run on
+    await bulk_importer.stop()
+
+    # Shut down the extraction, I/O and render pools
+    shutdown_executors()
+    pdf_renderer.shutdown()
+
+    # Write out a profile that is still being sampled
+    if sampling_profiler.running:
+        sampling_profiler.stop()
     
     total_shutdown_duration = time.time() - start_time
-    logger.info("Total application shutdown completed in %.2f seconds", total_shutdown_duration)
\ No newline at end of file
+    logger.info("Total application shutdown completed in %.2f seconds", total_shutdown_duration)
+
+    # Write out the queued log records
+    shutdown_logging()
\ No newline at end of file
@@ -1,18 +1,61 @@
-from fastapi import FastAPI, Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import FastAPI
+from app.core.logging import bind_log_context, log_context
 import logging
 import time
+import uuid
 
 access_logger = logging.getLogger("access")
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        access_logger.info(f"Incoming request: {request.method} {request.url}")
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        access_logger.info(f"Completed request: {request.method} {request.url} in {process_time:.2f}s with status {response.status_code}")
-        return response
+class LoggingMiddleware:
+    """
+    Log each HTTP request and its status and duration.
+
+    Every record logged while handling the request carries its request_id,
+    taken from the X-Request-ID header or generated. Pure ASGI: the response
+    is passed through untouched, so streaming works, and nothing is
+    formatted unless the access logger is enabled for INFO.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = bind_log_context(request_id=_request_id(scope))
+        try:
+            if access_logger.isEnabledFor(logging.INFO):
+                await self._logged(scope, receive, send)
+            else:
+                await self.app(scope, receive, send)
+        finally:
+            log_context.reset(token)
+
+    async def _logged(self, scope, receive, send):
+        start_time = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        access_logger.info("Incoming request: %s %s", scope["method"], scope["path"])
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            access_logger.info(
+                "Completed request: %s %s in %.3fs with status %d",
+                scope["method"], scope["path"], time.perf_counter() - start_time, status_code
+            )
+
+def _request_id(scope) -> str:
+    for name, value in scope["headers"]:
+        if name == b"x-request-id":
+            return value.decode("latin-1")[:64]
+    return uuid.uuid4().hex[:16]
 
 def add_logging_middleware(app: FastAPI):
-    app.add_middleware(LoggingMiddleware)
\ No newline at end of file
+    app.add_middleware(LoggingMiddleware)
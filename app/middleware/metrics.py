@@ -0,0 +1,41 @@
+from fastapi import FastAPI
+from app.core.metrics import http_request_seconds
+import time
+
+class MetricsMiddleware:
+    """
+    Record each HTTP request in the http_request_duration_seconds histogram (pure ASGI).
+
+    Requests are labelled with the matched route's path template rather than
+    the raw path, so path parameters do not create a series each.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the shared scope
+            route = scope.get("route")
+            http_request_seconds.observe(
+                time.perf_counter() - start_time,
+                scope["method"], getattr(route, "path", "unmatched"), status_code
+            )
+
+def add_metrics_middleware(app: FastAPI):
+    app.add_middleware(MetricsMiddleware)
@@ -0,0 +1,19 @@
+from fastapi import FastAPI
+from app.core.profiling import SlowRequestTracker, slow_request_tracker
+
+class SlowRequestMiddleware:
+    """Track each HTTP request with the slow request tracker (pure ASGI)."""
+
+    def __init__(self, app, tracker: SlowRequestTracker):
+        self.app = app
+        self.tracker = tracker
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.tracker.threshold <= 0:
+            await self.app(scope, receive, send)
+            return
+        async with self.tracker.track("http", f"{scope['method']} {scope['path']}"):
+            await self.app(scope, receive, send)
+
+def add_slow_request_middleware(app: FastAPI, tracker: SlowRequestTracker = slow_request_tracker):
+    app.add_middleware(SlowRequestMiddleware, tracker=tracker)
@@ -1,35 +1,39 @@
-from fastapi import FastAPI, Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
-from app.utils.session_tracker import SessionTracker
-from app.core.config import get_settings
-from app.core.auth import verify_token
+from fastapi import FastAPI
+from starlette.responses import JSONResponse
+from app.core.metrics import rate_limit_rejections
+from app.core.rate_limit import RateLimiter, api_rate_limiter
 import logging
+import math
 
 logger = logging.getLogger(__name__)
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app):
-        super().__init__(app)
-        self.tracker = SessionTracker()
+class RateLimitMiddleware:
+    """Answer 429 with Retry-After once a client address exceeds its rate limit (pure ASGI)."""
 
-    async def dispatch(self, request: Request, call_next):
-        settings = get_settings()
-        # Extract user ID from JWT token (if present)
-        user_id = "anonymous"
-        auth_header = request.headers.get("Authorization")
-        if auth_header and auth_header.startswith("Bearer "):
-            token = auth_header.split(" ")[1]
-            payload = verify_token(token)
-            if payload and "sub" in payload:
-                user_id = payload["sub"]
+    def __init__(self, app, limiter: RateLimiter, exempt_paths: tuple[str, ...] = ()):
+        self.app = app
+        self.limiter = limiter
+        self.exempt_paths = exempt_paths
 
-        # Check rate limit
-        if not self.tracker.add_request(user_id, settings.RATE_LIMIT_REQUESTS, settings.RATE_LIMIT_WINDOW):
-            logger.warning(f"Rate limit exceeded for user: {user_id} on {request.method} {request.url}")
-            raise HTTPException(status_code=429, detail="Rate limit exceeded")
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
 
-        response = await call_next(request)
-        return response
+        client = scope["client"][0] if scope.get("client") else "unknown"
+        result = await self.limiter.hit(client)
+        if not result.allowed:
+            rate_limit_rejections.inc(self.limiter.prefix)
+            logger.warning("Rate limit exceeded for %s on %s %s", client, scope["method"], scope["path"])
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Rate limit exceeded"},
+                headers={"Retry-After": str(math.ceil(result.retry_after))},
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
 
-def add_rate_limit_middleware(app: FastAPI):
-    app.add_middleware(RateLimitMiddleware)
\ No newline at end of file
+def add_rate_limit_middleware(app: FastAPI, limiter: RateLimiter = api_rate_limiter,
+                              exempt_paths: tuple[str, ...] = ()):
+    app.add_middleware(RateLimitMiddleware, limiter=limiter, exempt_paths=exempt_paths)
@@ -0,0 +1,82 @@
+from fastapi import FastAPI, HTTPException
+from starlette.responses import JSONResponse
+import logging
+
+logger = logging.getLogger(__name__)
+
+class _BodyTooLarge(HTTPException):
+    """
+    Raised from receive() once a streamed body passes the limit.
+
+    An HTTPException, so FastAPI answers it with a 413 instead of wrapping it
+    as a body parsing error.
+    """
+
+    def __init__(self, max_bytes: int):
+        super().__init__(
+            status_code=413,
+            detail=f"Upload exceeds the {max_bytes} byte limit",
+            headers={"Connection": "close"},
+        )
+
+class UploadLimitMiddleware:
+    """
+    Reject request bodies larger than max_bytes before they are parsed.
+
+    Requests with a larger Content-Length are refused immediately; bodies sent
+    without one are counted as they stream in and cut off once over the limit,
+    so an oversized upload is never spooled in full.
+    """
+
+    def __init__(self, app, max_bytes: int, path_prefix: str = "/"):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            logger.warning("Rejected %s upload of %s bytes", scope["path"], content_length.decode())
+            await self._reject(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    logger.warning("Rejected %s upload streamed past %d bytes", scope["path"], self.max_bytes)
+                    raise _BodyTooLarge(self.max_bytes)
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except _BodyTooLarge:
+            # Raised outside FastAPI's exception handling
+            if not response_started:
+                await self._reject(scope, receive, send)
+
+    async def _reject(self, scope, receive, send):
+        response = JSONResponse(
+            status_code=413,
+            content={"detail": f"Upload exceeds the {self.max_bytes} byte limit"},
+            headers={"Connection": "close"},
+        )
+        await response(scope, receive, send)
+
+def add_upload_limit_middleware(app: FastAPI, max_bytes: int, path_prefix: str = "/pdf"):
+    app.add_middleware(UploadLimitMiddleware, max_bytes=max_bytes, path_prefix=path_prefix)
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, String, Text, Integer
+from app.models.base_model import Base
+
+class BotState(Base):
+    __tablename__ = "bot_state"
+
+    kind = Column(String, primary_key=True)  # user_data, chat_data, bot_data or conversation:<name>
+    key = Column(String, primary_key=True)  # User or chat id, JSON conversation key, or "" for bot_data
+    data = Column(Text, nullable=False)  # JSON
+    version = Column(Integer, nullable=False, default=1)  # Bumped whenever the data changes
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, DateTime, String, Text, Integer, UniqueConstraint
+from app.models.base_model import BaseModel, Base
+
+class BulkImport(BaseModel):
+    __tablename__ = "bulk_imports"
+    __table_args__ = (UniqueConstraint("source_key", "invoice_type"),)
+
+    source_key = Column(String, nullable=False)  # SHA-256 of the archive, or dir:<path> for directories
+    source_name = Column(String, nullable=False)  # Archive or directory name as given
+    archive_path = Column(String, nullable=True)  # Saved upload, kept until the import is done
+    invoice_type = Column(String, nullable=False)  # e.g., proforma_invoice, sales_invoice
+    status = Column(String, nullable=False, default="running", index=True)  # running, done or failed
+    total = Column(Integer, nullable=False, default=0)  # PDF members in the archive
+    next_index = Column(Integer, nullable=False, default=0)  # Members before this one are committed
+    imported = Column(Integer, nullable=False, default=0)
+    duplicates = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)  # Last member or import error
+    owner = Column(String, nullable=True)  # Process running the import, see bulk_import.OWNER_ID
+    lease_expires_at = Column(DateTime, nullable=True)  # Renewed by the owner while the import runs
@@ -0,0 +1,8 @@
+from sqlalchemy import Column, String, Integer
+from app.models.base_model import Base
+
+class Counter(Base):
+    __tablename__ = "counters"
+
+    name = Column(String, primary_key=True)  # e.g., invoice_number
+    value = Column(Integer, nullable=False, default=0)  # Last value handed out
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, Text, Integer, DateTime
+from app.models.base_model import BaseModel, Base
+from datetime import datetime
+
+class DedupCacheEntry(BaseModel):
+    __tablename__ = "dedup_cache"
+
+    cache_key = Column(String, nullable=False, unique=True, index=True)  # e.g., pdf:<sha256>, text:<sha256>
+    kind = Column(String, nullable=False)  # pdf (extracted text) or text (Gemini result)
+    extracted_text = Column(Text, nullable=True)  # Cached extraction, for pdf entries
+    invoice_json_id = Column(String, nullable=True)  # Cached Gemini result, for text entries
+    size_bytes = Column(Integer, nullable=False, default=0)
+    hits = Column(Integer, nullable=False, default=0)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, index=True)
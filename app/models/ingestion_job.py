@@ -0,0 +1,17 @@
+from sqlalchemy import Column, DateTime, String, Text, Integer, LargeBinary
+from app.models.base_model import BaseModel, Base
+
+class IngestionJob(BaseModel):
+    __tablename__ = "ingestion_jobs"
+
+    chat_id = Column(String, nullable=False, index=True)  # Telegram chat that submitted the PDF
+    filename = Column(String, nullable=False)
+    invoice_type = Column(String, nullable=False)  # e.g., proforma_invoice, sales_invoice
+    pdf_data = Column(LargeBinary, nullable=True)  # Uploaded PDF bytes, cleared after extraction
+    content_hash = Column(String, nullable=True)  # SHA-256 of the PDF bytes
+    extracted_text = Column(Text, nullable=True)  # Output of the extraction stage
+    status = Column(String, nullable=False, default="queued", index=True)  # see job_queue.JobStatus
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    owner = Column(String, nullable=True)  # Worker process running the current stage, see job_queue.WORKER_ID
+    lease_expires_at = Column(DateTime, nullable=True, index=True)  # Renewed by the owner while the stage runs
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, UniqueConstraint
+from app.models.base_model import BaseModel, Base
+
+class InvoiceDraft(BaseModel):
+    __tablename__ = "invoice_drafts"
+
+    invoice_number = Column(String, nullable=False, unique=True)  # Sequential, e.g. INV-000042
+    row_count = Column(Integer, nullable=False, default=0)  # Also the number of the last row
+    grand_total = Column(Float, nullable=False, default=0.0)  # Sum of row subtotals, kept on append
+    expires_at = Column(DateTime, nullable=False, index=True)  # Set on creation and pushed back whenever a row is added; reads do not extend it
+
+class InvoiceDraftRow(BaseModel):
+    __tablename__ = "invoice_draft_rows"
+    __table_args__ = (UniqueConstraint("draft_id", "no"),)
+
+    draft_id = Column(String, ForeignKey("invoice_drafts.id"), nullable=False)
+    no = Column(Integer, nullable=False)  # 1-based position in the draft
+    description = Column(String, nullable=False)
+    quantity = Column(Integer, nullable=False)
+    price = Column(Float, nullable=False)
+    subtotal = Column(Float, nullable=False)
+    running_total = Column(Float, nullable=False)  # Grand total up to and including this row
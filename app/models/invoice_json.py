@@ -1,8 +1,16 @@
-from sqlalchemy import Column, String, Text
+from sqlalchemy import Column, String, Text, Float, Date, Index
 from app.models.base_model import BaseModel, Base
 
 class InvoiceJSON(BaseModel):
     __tablename__ = "invoice_jsons"
+    __table_args__ = (
+        Index("ix_invoice_jsons_type_created_id", "invoice_type", "created_at", "id"),  # Keyset pages per type
+    )
     
-    invoice_type = Column(String, nullable=False)  # e.g., proforma_invoice, sales_invoice
-    json_data = Column(Text, nullable=False)  # Gemini-generated JSON data as text
\ No newline at end of file
+    invoice_type = Column(String, nullable=False, index=True)  # e.g., proforma_invoice, sales_invoice
+    json_data = Column(Text, nullable=False)  # Gemini-generated JSON data as compact text
+    # Key fields promoted from json_data for indexed lookups
+    invoice_number = Column(String, nullable=True, index=True)
+    issued_date = Column(Date, nullable=True, index=True)
+    amount = Column(Float, nullable=True, index=True)
+    billed_to = Column(String, nullable=True, index=True)
@@ -1,9 +1,12 @@
-from sqlalchemy import Column, String, Text
+from sqlalchemy import Column, String, Text, ForeignKey
 from app.models.base_model import BaseModel, Base
 
 class InvoicePDF(BaseModel):
     __tablename__ = "invoice_pdfs"
     
     filename = Column(String, nullable=False)
-    invoice_type = Column(String, nullable=False)  # e.g., proforma_invoice, sales_invoice
-    extracted_text = Column(Text, nullable=True)  # Parsed text from PDF
\ No newline at end of file
+    invoice_type = Column(String, nullable=False, index=True)  # e.g., proforma_invoice, sales_invoice
+    extracted_text = Column(Text, nullable=True)  # Parsed text from PDF
+    content_hash = Column(String, nullable=True, index=True)  # SHA-256 of the PDF bytes
+    invoice_json_id = Column(String, ForeignKey("invoice_jsons.id"), nullable=True, index=True)  # Parsed result, once available
+    chat_id = Column(String, nullable=True, index=True)  # Telegram chat that uploaded the PDF; None for API and bulk imports
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.core.auth import require_admin_token
+from app.core.config import settings
+from app.core.executors import run_io_bound
+from app.core.profiling import memory_tracer, profiling_status, sampling_profiler, slow_request_tracker
+import logging
+
+# Each uvicorn worker has its own profiler; the response's pid tells which one answered
+router = APIRouter(prefix="/admin/profiling", tags=["admin"], dependencies=[Depends(require_admin_token)])
+
+logger = logging.getLogger(__name__)
+
+@router.get("")
+async def get_profiling_status():
+    return profiling_status()
+
+@router.post("/sampler/start")
+async def start_sampler(
+    interval_ms: float = Query(settings.PROFILE_SAMPLE_INTERVAL_MS, gt=0, le=1000),
+    seconds: float | None = Query(None, gt=0),
+):
+    if not sampling_profiler.start(interval_ms / 1000, seconds):
+        raise HTTPException(status_code=409, detail="The sampling profiler is already running")
+    return profiling_status()
+
+@router.post("/sampler/stop")
+async def stop_sampler():
+    # Joins the sampler thread, which writes the profile before it exits
+    result = await run_io_bound(sampling_profiler.stop)
+    if result is None:
+        raise HTTPException(status_code=409, detail="The sampling profiler has not been started")
+    return result
+
+@router.post("/slow-requests")
+async def set_slow_request_threshold(threshold: float = Query(..., ge=0)):
+    slow_request_tracker.threshold = threshold
+    logger.info("Slow request threshold set to %.2f s", threshold)
+    return profiling_status()
+
+@router.post("/tracemalloc")
+async def arm_tracemalloc(calls: int = Query(10, ge=0, le=1000)):
+    memory_tracer.arm(calls)
+    logger.info("tracemalloc armed for the next %d extraction and render calls", calls)
+    return profiling_status()
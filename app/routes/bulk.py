@@ -0,0 +1,57 @@
+from fastapi import APIRouter, HTTPException, File, UploadFile
+from app.core.config import settings
+from app.core.executors import run_io_bound
+from app.services.bulk_import import BULK_DIR, bulk_importer, get_import, stored_archive_path
+from app.services.pdf_service import save_upload, UploadTooLargeError
+from app.schemas.bulk import BulkImportStatus
+from app.utils.keyboard_utils import INVOICE_OPTIONS
+import logging
+import os
+import uuid
+import zipfile
+
+router = APIRouter(prefix="/bulk", tags=["bulk"])
+
+logger = logging.getLogger(__name__)
+
+INVOICE_TYPES = {option["callback_data"] for option in INVOICE_OPTIONS}
+
+@router.post("/{invoice_type}", response_model=BulkImportStatus, status_code=202)
+async def bulk_import_endpoint(invoice_type: str, file: UploadFile = File(...)):
+    """Upload a ZIP of PDFs and import it in the background; poll GET /bulk/{id} for progress."""
+    if invoice_type not in INVOICE_TYPES:
+        await file.close()
+        raise HTTPException(status_code=400, detail=f"Unknown invoice type: {invoice_type}")
+    upload_path = None
+    try:
+        upload_path, content_hash, size = await save_upload(
+            file, f"{uuid.uuid4().hex}.zip", BULK_DIR, settings.BULK_MAX_UPLOAD_BYTES
+        )
+        if not await run_io_bound(zipfile.is_zipfile, upload_path):
+            raise HTTPException(status_code=400, detail="File must be a ZIP archive")
+
+        # Archives are stored by content and invoice type, so uploading the same ZIP again resumes its import
+        archive_path = stored_archive_path(content_hash, invoice_type)
+        os.replace(upload_path, archive_path)
+        upload_path = None
+        logger.info("Received archive %s for bulk import (%d bytes)", file.filename, size)
+        return await bulk_importer.start(archive_path, invoice_type, file.filename or archive_path, content_hash)
+    except HTTPException:
+        raise
+    except UploadTooLargeError as e:
+        logger.error("Rejected archive %s: %s", file.filename, str(e))
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        logger.error("Error starting bulk import: %s", str(e))
+        raise HTTPException(status_code=500, detail=f"Failed to start bulk import: {str(e)}")
+    finally:
+        if upload_path and os.path.exists(upload_path):
+            os.remove(upload_path)
+        await file.close()
+
+@router.get("/{import_id}", response_model=BulkImportStatus)
+async def bulk_import_status_endpoint(import_id: str):
+    state = await get_import(import_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return state
@@ -1,19 +1,71 @@
-from fastapi import APIRouter
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+from app.core.db_config import get_db
 from app.schemas.invoice import TableRow, HtmlContent
-from app.services.invoice import get_invoice_details, add_table_row, generate_and_save_pdf
+from app.core.config import settings
+from app.core.executors import run_io_bound
+from app.services.invoice import (
+    get_invoice_details, get_draft_details, create_draft, add_table_row, DraftNotFoundError, DraftFullError
+)
+from app.services.pdf_renderer import pdf_renderer, RenderQueueFullError
+from app.utils.pdf import PDFRenderError
+import asyncio
+from collections.abc import Awaitable
+import logging
+import secrets
 
 router = APIRouter(prefix="/invoice", tags=["invoice"])
 
+logger = logging.getLogger(__name__)
+
 @router.get("/")
-def get_invoice():
-    return get_invoice_details()
+def get_invoice(draft_id: str | None = None, db: Session = Depends(get_db)):
+    try:
+        return get_invoice_details(db, draft_id)
+    except DraftNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.post("/", status_code=201)
+def create_invoice(db: Session = Depends(get_db)):
+    return create_draft(db)
 
 @router.post("/add_row")
-def add_row(row: TableRow):
-    return add_table_row(row)
+def add_row(row: TableRow, draft_id: str | None = None, db: Session = Depends(get_db)):
+    draft_id = row.draft_id or draft_id
+    if not draft_id:
+        raise HTTPException(status_code=422, detail="draft_id is required")
+    try:
+        return add_table_row(db, draft_id, row)
+    except DraftNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except DraftFullError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+async def _pdf_response(render: Awaitable[bytes], filename: str) -> Response:
+    try:
+        pdf_bytes = await render
+    except RenderQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        logger.error("PDF render timed out")
+        raise HTTPException(status_code=504, detail="PDF generation timed out")
+    except PDFRenderError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return Response(
+        content=pdf_bytes,
+        media_type='application/pdf',
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.get("/pdf")
+async def draft_pdf_endpoint(draft_id: str, db: Session = Depends(get_db)):
+    try:
+        details = await run_io_bound(get_draft_details, db, draft_id, timeout=settings.DB_TIMEOUT)
+    except DraftNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return await _pdf_response(pdf_renderer.render_invoice(details), f"{details['invoice_number']}.pdf")
 
 @router.post("/generate_pdf")
 async def generate_pdf_endpoint(content: HtmlContent):
-    filename, filepath = await generate_and_save_pdf(content.html)
-    return FileResponse(filepath, media_type='application/pdf', filename=filename)
\ No newline at end of file
+    return await _pdf_response(pdf_renderer.render(content.html), f"{secrets.token_hex(4).upper()}.pdf")
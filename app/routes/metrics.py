@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from app.core.metrics import CONTENT_TYPE
+from app.services.metrics import render_metrics
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
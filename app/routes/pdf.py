@@ -1,22 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, File
+from fastapi import APIRouter, Depends, HTTPException, File, Query, UploadFile
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.core.db_config import get_db
-from app.services.pdf_service import process_pdf
-from app.schemas.pdf import PDFResponse
+from app.core.executors import run_io_bound
+from app.core.metrics import pdf_bytes, stage_seconds
+from app.services.pdf_service import process_pdf, save_upload, UploadTooLargeError
+from app.services.search import (
+    search_invoices, InvalidSearchQueryError, SearchUnavailableError, MAX_OFFSET, MAX_PAGE_SIZE
+)
+from app.schemas.pdf import PDFResponse, SearchResponse
 import logging
 import time
 
 router = APIRouter(prefix="/pdf", tags=["pdf"])
 
-# Configure logging
-logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
 @router.post("/process/{invoice_type}", response_model=PDFResponse)
 async def process_pdf_endpoint(
     invoice_type: str,
     filename: str,
-    file: bytes = File(...),
+    file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
     try:
@@ -25,9 +29,34 @@ async def process_pdf_endpoint(
             raise HTTPException(status_code=400, detail="File must be a PDF")
         
         logger.info("Received PDF file for processing: %s, type: %s", filename, invoice_type)
-        result = process_pdf(file, filename, invoice_type, db)
-        logger.info("PDF processing completed: %s", filename)
+        with stage_seconds.time("api", "upload"):
+            pdf_path, content_hash, size = await save_upload(file, filename)
+        pdf_bytes.observe(size, "api")
+        result = await process_pdf(pdf_path, content_hash, filename, invoice_type, db)
+        logger.info("PDF processing completed: %s (%d bytes)", filename, size)
         return result
+    except HTTPException:
+        raise
+    except UploadTooLargeError as e:
+        logger.error("Rejected PDF %s: %s", filename, str(e))
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logger.error("Error processing PDF: %s", str(e))
-        raise HTTPException(status_code=500, detail=f"Failed to process PDF: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to process PDF: {str(e)}")
+    finally:
+        await file.close()
+
+@router.get("/search", response_model=SearchResponse)
+async def search_pdfs_endpoint(
+    q: str = Query(..., min_length=1, description="Words to search for; word* matches a prefix"),
+    invoice_type: str | None = None,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=MAX_OFFSET),
+    db: Session = Depends(get_db)
+):
+    try:
+        return await run_io_bound(search_invoices, db, q, invoice_type, limit, offset, timeout=settings.DB_TIMEOUT)
+    except InvalidSearchQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SearchUnavailableError as e:
+        raise HTTPException(status_code=501, detail=str(e))
@@ -0,0 +1,38 @@
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.core.db_config import get_db
+from app.core.executors import run_io_bound
+from app.core.config import settings
+from app.schemas.records import InvoicePage, InvoiceDetail
+from app.services.records import list_invoices, get_invoice, InvalidCursorError, MAX_PAGE_SIZE
+
+router = APIRouter(prefix="/records", tags=["records"])
+
+@router.get("/invoices", response_model=InvoicePage)
+async def list_invoices_endpoint(
+    invoice_type: str | None = None,
+    invoice_number: str | None = None,
+    billed_to: str | None = Query(None, description="Prefix of the billed party"),
+    amount_min: float | None = None,
+    amount_max: float | None = None,
+    issued_from: date | None = None,
+    issued_to: date | None = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None, description="next_cursor of the previous page"),
+    db: Session = Depends(get_db)
+):
+    try:
+        return await run_io_bound(
+            list_invoices, db, invoice_type, invoice_number, billed_to, amount_min, amount_max,
+            issued_from, issued_to, limit, cursor, timeout=settings.DB_TIMEOUT
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/invoices/{invoice_id}", response_model=InvoiceDetail)
+async def get_invoice_endpoint(invoice_id: str, db: Session = Depends(get_db)):
+    record = await run_io_bound(get_invoice, db, invoice_id, timeout=settings.DB_TIMEOUT)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    return record
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Header, HTTPException, Request
+from app.core.config import settings
+from app.services.telegram_bot import enqueue_update
+import logging
+import secrets
+
+router = APIRouter(tags=["telegram"])
+
+logger = logging.getLogger(__name__)
+
+@router.post(settings.WEBHOOK_PATH, include_in_schema=False)
+async def telegram_webhook(
+    request: Request,
+    secret_token: str | None = Header(None, alias="X-Telegram-Bot-Api-Secret-Token"),
+):
+    if secret_token is None or not secrets.compare_digest(secret_token, settings.WEBHOOK_SECRET):
+        logger.warning("Rejected webhook call with a bad secret token")
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid update")
+    if not isinstance(data, dict) or not isinstance(data.get("update_id"), int):
+        logger.warning("Rejected webhook call without an update object")
+        raise HTTPException(status_code=400, detail="Invalid update")
+    # Acknowledge at once; handlers run from the update queue
+    try:
+        await enqueue_update(data)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        logger.warning("Rejected malformed update %s: %s", data["update_id"], str(e))
+        raise HTTPException(status_code=400, detail="Invalid update")
+    return {"ok": True}
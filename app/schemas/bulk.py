@@ -0,0 +1,16 @@
+from datetime import datetime
+from pydantic import BaseModel
+
+class BulkImportStatus(BaseModel):
+    id: str
+    source_name: str
+    invoice_type: str
+    status: str
+    total: int
+    processed: int
+    imported: int
+    duplicates: int
+    failed: int
+    error: str | None
+    created_at: datetime
+    updated_at: datetime
@@ -1,6 +1,8 @@
 from pydantic import BaseModel
 
 class TableRow(BaseModel):
+    # Also accepted as a query parameter, as earlier clients send it
+    draft_id: str | None = None
     description: str
     quantity: int
     price: float
@@ -1,7 +1,20 @@
+from datetime import datetime
 from pydantic import BaseModel
 
 class PDFResponse(BaseModel):
     filename: str
     invoice_type: str
     extracted_text: str | None
-    message: str
\ No newline at end of file
+    message: str
+
+class SearchResult(BaseModel):
+    id: str
+    filename: str
+    invoice_type: str
+    invoice_json_id: str | None
+    created_at: datetime
+    snippet: str
+
+class SearchResponse(BaseModel):
+    items: list[SearchResult]
+    next_offset: int | None
@@ -0,0 +1,24 @@
+from datetime import date, datetime
+from pydantic import BaseModel
+
+class InvoiceRecord(BaseModel):
+    id: str
+    invoice_type: str
+    invoice_number: str | None
+    issued_date: date | None
+    amount: float | None
+    billed_to: str | None
+    created_at: datetime
+
+class InvoicePage(BaseModel):
+    items: list[InvoiceRecord]
+    next_cursor: str | None
+
+class InvoicePDFRef(BaseModel):
+    id: str
+    filename: str
+    created_at: datetime
+
+class InvoiceDetail(InvoiceRecord):
+    data: dict
+    pdfs: list[InvoicePDFRef]
@@ -2,8 +2,6 @@ import logging
 from telegram import Bot, BotCommand
 from app.core.config import settings
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 async def register_bot_commands():
@@ -15,6 +13,7 @@ async def register_bot_commands():
         BotCommand(command="invoices", description="Start the invoice process"),
         BotCommand(command="help", description="Get help with the bot"),
         BotCommand(command="status", description="Check processing status"),
+        BotCommand(command="search", description="Search stored invoices"),
     ]
 
     try:
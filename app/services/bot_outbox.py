@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from app.core.config import settings
+from app.core.logging import log_context
+from app.core.metrics import stage_seconds
+from app.core.rate_limit import MemoryRateLimitBackend, RateLimit, RateLimiter
+
+logger = logging.getLogger(__name__)
+
+class BotOutbox:
+    """
+    Throttled, non-blocking sender for bot messages.
+
+    send() queues the message and returns at once. Each chat with pending
+    messages gets a short-lived sender task that delivers them in order,
+    waiting as needed for Telegram's limits: BOT_SEND_RATE messages per
+    second overall, BOT_CHAT_SEND_RATE per second to one chat and
+    BOT_GROUP_SEND_PER_MINUTE per minute to a group. Messages are
+    best-effort: failures are logged and not retried.
+    """
+
+    def __init__(self, global_limit: RateLimit, chat_limit: RateLimit, group_limit: RateLimit,
+                 max_pending_per_chat: int = 50):
+        backend = MemoryRateLimitBackend()
+        self._global = RateLimiter(backend, global_limit, prefix="send")
+        self._chat = RateLimiter(backend, chat_limit, prefix="send-chat")
+        self._group = RateLimiter(backend, group_limit, prefix="send-group")
+        self.max_pending_per_chat = max_pending_per_chat
+        self._bot = None
+        self._pending: dict[str, deque] = {}
+        self._senders: dict[str, asyncio.Task] = {}
+        self.counters = {"sent": 0, "failed": 0, "dropped": 0, "throttled": 0}
+
+    def start(self, bot):
+        self._bot = bot
+
+    def send(self, chat_id, text: str):
+        """Queue a message for a chat; never waits."""
+        chat_id = str(chat_id)
+        pending = self._pending.setdefault(chat_id, deque())
+        if len(pending) >= self.max_pending_per_chat:
+            self.counters["dropped"] += 1
+            logger.warning("Dropped message to chat %s: %d messages already pending", chat_id, len(pending))
+            return
+        pending.append((text, time.perf_counter()))
+        if chat_id not in self._senders:
+            self._senders[chat_id] = asyncio.create_task(self._drain(chat_id), name=f"outbox-{chat_id}")
+
+    async def _wait_for(self, limiter: RateLimiter, key: str):
+        while True:
+            result = await limiter.hit(key)
+            if result.allowed:
+                return
+            self.counters["throttled"] += 1
+            await asyncio.sleep(result.retry_after)
+
+    async def _drain(self, chat_id: str):
+        # The task outlives the job that started it; log under the chat alone
+        log_context.set({"chat_id": chat_id})
+        pending = self._pending[chat_id]
+        try:
+            while pending:
+                # Group chats have negative ids and a per-minute limit
+                if chat_id.startswith("-"):
+                    await self._wait_for(self._group, chat_id)
+                await self._wait_for(self._chat, chat_id)
+                await self._wait_for(self._global, "all")
+                text, queued_at = pending.popleft()
+                try:
+                    await self._bot.send_message(chat_id=chat_id, text=text)
+                    self.counters["sent"] += 1
+                    # Throttling waits included: this is when the user sees the reply
+                    stage_seconds.observe(time.perf_counter() - queued_at, "queue", "reply")
+                except Exception as e:
+                    self.counters["failed"] += 1
+                    logger.warning("Failed to notify chat %s: %s", chat_id, str(e))
+        finally:
+            del self._senders[chat_id]
+            if pending:
+                self.counters["dropped"] += len(pending)
+            del self._pending[chat_id]
+
+    async def stop(self, timeout: float = 5.0):
+        """Give pending messages up to `timeout` seconds to go out, then cancel the rest."""
+        senders = list(self._senders.values())
+        if not senders:
+            return
+        _, unfinished = await asyncio.wait(senders, timeout=timeout)
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+        logger.info("Bot outbox stopped with %d chats still pending", len(unfinished))
+
+    def stats(self) -> dict:
+        """Return the send counters and the number of queued messages."""
+        # Copy the values first: the metrics endpoint calls this from another thread
+        return {**self.counters, "pending": sum(map(len, list(self._pending.values())))}
+
+bot_outbox = BotOutbox(
+    global_limit=RateLimit(settings.BOT_SEND_RATE, 1.0, settings.BOT_SEND_RATE),
+    chat_limit=RateLimit(settings.BOT_CHAT_SEND_RATE, 1.0, settings.BOT_CHAT_SEND_BURST),
+    group_limit=RateLimit(settings.BOT_GROUP_SEND_PER_MINUTE, 60.0, settings.BOT_GROUP_SEND_PER_MINUTE),
+)
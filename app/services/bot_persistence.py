@@ -0,0 +1,137 @@
+import json
+import logging
+from sqlalchemy import delete, select
+from telegram.ext import BasePersistence, PersistenceInput, PicklePersistence
+from app.core.db_config import async_session_scope
+from app.models.bot_state import BotState
+
+logger = logging.getLogger(__name__)
+
+USER_DATA = "user_data"
+CHAT_DATA = "chat_data"
+BOT_DATA = "bot_data"
+CONVERSATION_PREFIX = "conversation:"
+
+class DatabasePersistence(BasePersistence[dict, dict, dict]):
+    """
+    Bot persistence in the bot_state table of the application database.
+
+    Conversations, user_data, chat_data and bot_data are stored as JSON rows,
+    so they survive restarts and a standby process that takes over polling
+    resumes every conversation where it stopped. Each row carries a version:
+    before every update the user and chat data of this process are replaced
+    by the stored rows when another process has written newer ones. Values
+    must be JSON serializable. Arbitrary callback data is not stored.
+    """
+
+    def __init__(self, update_interval: float = 1.0):
+        super().__init__(store_data=PersistenceInput(callback_data=False), update_interval=update_interval)
+        # Versions last read or written by this process, per (kind, key)
+        self._versions: dict[tuple[str, str], int] = {}
+
+    async def _load_kind(self, kind: str) -> dict[str, object]:
+        async with async_session_scope() as db:
+            rows = (await db.scalars(select(BotState).where(BotState.kind == kind))).all()
+        for row in rows:
+            self._versions[(kind, row.key)] = row.version
+        return {row.key: json.loads(row.data) for row in rows}
+
+    async def _store(self, kind: str, key: str, data):
+        encoded = json.dumps(data)
+        async with async_session_scope() as db:
+            row = await db.get(BotState, (kind, key))
+            if row is None:
+                row = BotState(kind=kind, key=key, data=encoded, version=1)
+                db.add(row)
+            elif row.data != encoded:
+                # Unchanged data keeps its version, so other processes do not reload it
+                row.data = encoded
+                row.version += 1
+            self._versions[(kind, key)] = row.version
+
+    async def _drop(self, kind: str, key: str):
+        async with async_session_scope() as db:
+            await db.execute(delete(BotState).where(BotState.kind == kind, BotState.key == key))
+        self._versions.pop((kind, key), None)
+
+    async def _refresh(self, kind: str, key: str, data: dict):
+        async with async_session_scope() as db:
+            row = await db.get(BotState, (kind, key))
+        if row is None or self._versions.get((kind, key)) == row.version:
+            return
+        data.clear()
+        data.update(json.loads(row.data))
+        self._versions[(kind, key)] = row.version
+
+    async def get_user_data(self) -> dict[int, dict]:
+        return {int(key): data for key, data in (await self._load_kind(USER_DATA)).items()}
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        return {int(key): data for key, data in (await self._load_kind(CHAT_DATA)).items()}
+
+    async def get_bot_data(self) -> dict:
+        return (await self._load_kind(BOT_DATA)).get("", {})
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        stored = await self._load_kind(CONVERSATION_PREFIX + name)
+        return {tuple(json.loads(key)): state for key, state in stored.items()}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None):
+        kind, stored_key = CONVERSATION_PREFIX + name, json.dumps(list(key))
+        if new_state is None:
+            await self._drop(kind, stored_key)
+        else:
+            await self._store(kind, stored_key, new_state)
+
+    async def update_user_data(self, user_id: int, data: dict):
+        await self._store(USER_DATA, str(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        await self._store(CHAT_DATA, str(chat_id), data)
+
+    async def update_bot_data(self, data: dict):
+        await self._store(BOT_DATA, "", data)
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        await self._drop(CHAT_DATA, str(chat_id))
+
+    async def drop_user_data(self, user_id: int):
+        await self._drop(USER_DATA, str(user_id))
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        await self._refresh(USER_DATA, str(user_id), user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        await self._refresh(CHAT_DATA, str(chat_id), chat_data)
+
+    async def refresh_bot_data(self, bot_data: dict):
+        pass  # Unused by the handlers; read once at startup
+
+    async def flush(self):
+        pass  # Every write is committed immediately
+
+def create_bot_persistence(name: str, path: str, update_interval: float) -> BasePersistence | None:
+    """
+    Build the persistence named by BOT_PERSISTENCE.
+
+    Args:
+        name (str): "database" (shared bot_state table), "pickle" (a local file, one process only) or "none".
+        path (str): File for the pickle backend.
+        update_interval (float): Seconds between writes of changed data.
+
+    Raises:
+        ValueError: If the name is unknown.
+    """
+    if name == "database":
+        return DatabasePersistence(update_interval=update_interval)
+    if name == "pickle":
+        return PicklePersistence(filepath=path, update_interval=update_interval)
+    if name == "none":
+        return None
+    raise ValueError(f"Unknown bot persistence: {name}")
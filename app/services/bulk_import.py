@@ -0,0 +1,506 @@
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+import time
+import uuid
+import zipfile
+from datetime import datetime, timedelta
+from typing import Callable
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.db_config import SessionLocal
+from app.core.executors import run_io_bound
+from app.models.bulk_import import BulkImport
+from app.models.invoice_pdf import InvoicePDF
+from app.services.dedup_cache import dedup_cache
+from app.services.pdf_service import extract_pdf_text
+
+logger = logging.getLogger(__name__)
+
+# Uploaded archives, named by their SHA-256 and invoice type so a re-upload resumes the same import
+BULK_DIR = os.path.join("files", "bulk")
+
+def stored_archive_path(content_hash: str, invoice_type: str) -> str:
+    """
+    Where an uploaded archive is kept until its import is done.
+
+    One file per (archive, invoice type), like the imports themselves, so
+    finishing the import for one type never deletes the file an import of
+    the same ZIP for another type is still reading. The invoice type is
+    hashed to keep it out of the file name.
+    """
+    type_key = hashlib.sha256(invoice_type.encode()).hexdigest()[:16]
+    return os.path.join(BULK_DIR, f"{content_hash}-{type_key}.zip")
+
+# Identifies this process as the owner of the imports it is running
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class ImportLeaseLostError(Exception):
+    """Raised when an import's lease expired and another process took it over."""
+
+class ImportStatus:
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+# Called after every committed batch with the import snapshot and the PDFs/s rate
+ProgressCallback = Callable[[dict, float], None]
+
+def source_key(path: str) -> str:
+    """Identify an import source: the SHA-256 of an archive, or the absolute path of a directory."""
+    if os.path.isdir(path):
+        return f"dir:{os.path.abspath(path)}"
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(settings.UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _is_pdf_member(name: str) -> bool:
+    basename = os.path.basename(name)
+    return basename.lower().endswith(".pdf") and not basename.startswith("._") and not name.startswith("__MACOSX/")
+
+def list_members(path: str) -> list[str]:
+    """List the PDFs in a ZIP archive, or under a directory, in a stable order."""
+    if os.path.isdir(path):
+        names = []
+        for root, _, files in os.walk(path):
+            for file in files:
+                name = os.path.relpath(os.path.join(root, file), path)
+                if _is_pdf_member(name):
+                    names.append(name)
+        return sorted(names)
+    with zipfile.ZipFile(path) as archive:
+        return [info.filename for info in archive.infolist() if not info.is_dir() and _is_pdf_member(info.filename)]
+
+def member_sizes(path: str, names: list[str]) -> list[int]:
+    """Return the uncompressed size of each member, in the order of names."""
+    if os.path.isdir(path):
+        return [os.path.getsize(os.path.join(path, name)) for name in names]
+    with zipfile.ZipFile(path) as archive:
+        return [archive.getinfo(name).file_size for name in names]
+
+def plan_batches(names: list[str], sizes: list[int], first: int, max_count: int, max_bytes: int) -> list[tuple]:
+    """
+    Split members from index `first` on into batches of at most max_count members and max_bytes bytes.
+
+    A member larger than max_bytes gets a batch of its own. Members over
+    MAX_UPLOAD_BYTES are never read, so they count as empty.
+
+    Returns:
+        list: (index of the first member, member names) per batch.
+    """
+    batches, start, batch_bytes = [], first, 0
+    for index in range(first, len(names)):
+        size = sizes[index] if sizes[index] <= settings.MAX_UPLOAD_BYTES else 0
+        if index > start and (index - start >= max_count or batch_bytes + size > max_bytes):
+            batches.append((start, names[start:index]))
+            start, batch_bytes = index, 0
+        batch_bytes += size
+    if start < len(names):
+        batches.append((start, names[start:]))
+    return batches
+
+def read_members(path: str, names: list[str], max_bytes: int) -> list[tuple]:
+    """
+    Read and hash a batch of PDFs from an archive or directory.
+
+    Args:
+        path (str): ZIP archive or directory.
+        names (list[str]): Members to read, as returned by list_members.
+        max_bytes (int): Largest member accepted.
+
+    Returns:
+        list: (name, data, SHA-256, error) per member; data and hash are None when reading failed.
+    """
+    results = []
+    archive = None if os.path.isdir(path) else zipfile.ZipFile(path)
+    try:
+        for name in names:
+            try:
+                if archive is None:
+                    member_path = os.path.join(path, name)
+                    if os.path.getsize(member_path) > max_bytes:
+                        raise ValueError(f"PDF exceeds the {max_bytes} byte limit")
+                    with open(member_path, "rb") as f:
+                        data = f.read()
+                else:
+                    info = archive.getinfo(name)
+                    if info.file_size > max_bytes:
+                        raise ValueError(f"PDF exceeds the {max_bytes} byte limit")
+                    data = archive.read(info)
+                results.append((name, data, hashlib.sha256(data).hexdigest(), None))
+            except Exception as e:
+                results.append((name, None, None, str(e)))
+    finally:
+        if archive is not None:
+            archive.close()
+    return results
+
+def _snapshot(record: BulkImport) -> dict:
+    return {
+        "id": record.id,
+        "source_name": record.source_name,
+        "invoice_type": record.invoice_type,
+        "status": record.status,
+        "total": record.total,
+        "processed": record.next_index,
+        "imported": record.imported,
+        "duplicates": record.duplicates,
+        "failed": record.failed,
+        "error": record.error,
+        "archive_path": record.archive_path,
+        "created_at": record.created_at,
+        "updated_at": record.updated_at,
+    }
+
+# Blocking persistence helpers; each runs in its own session in the I/O pool
+
+def _open_import(db: Session, key: str, source_name: str, archive_path: str | None,
+                 invoice_type: str, total: int) -> dict:
+    record = db.scalars(
+        select(BulkImport).where(BulkImport.source_key == key, BulkImport.invoice_type == invoice_type)
+    ).first()
+    if record is None:
+        record = BulkImport(
+            source_key=key, source_name=source_name, archive_path=archive_path, invoice_type=invoice_type,
+            status=ImportStatus.RUNNING, total=total, next_index=0, imported=0, duplicates=0, failed=0
+        )
+        db.add(record)
+    elif record.status != ImportStatus.DONE:
+        record.status = ImportStatus.RUNNING
+        record.archive_path = archive_path or record.archive_path
+        record.total = total
+    if record.next_index >= total:
+        record.status = ImportStatus.DONE
+    db.commit()
+    return _snapshot(record)
+
+def _lease_deadline() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+
+def _lease_free():
+    return BulkImport.owner.is_(None) | (BulkImport.lease_expires_at < datetime.utcnow())
+
+def _claim_import(db: Session, import_id: str) -> dict | None:
+    """Make this process the owner of a running import, or return None if a live process owns it."""
+    # A single conditional UPDATE, so two processes can never both claim the import
+    claimed = db.execute(
+        update(BulkImport)
+        .where(
+            BulkImport.id == import_id,
+            BulkImport.status == ImportStatus.RUNNING,
+            _lease_free() | (BulkImport.owner == OWNER_ID),
+        )
+        .values(owner=OWNER_ID, lease_expires_at=_lease_deadline())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    if claimed.rowcount != 1:
+        return None
+    return _snapshot(db.get(BulkImport, import_id))
+
+def _renew_lease(db: Session, import_id: str) -> bool:
+    renewed = db.execute(
+        update(BulkImport)
+        .where(BulkImport.id == import_id, BulkImport.owner == OWNER_ID, BulkImport.status == ImportStatus.RUNNING)
+        .values(lease_expires_at=_lease_deadline())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return renewed.rowcount == 1
+
+def _known_hashes(db: Session, hashes: list[str], invoice_type: str) -> set[str]:
+    if not hashes:
+        return set()
+    return set(db.scalars(
+        select(InvoicePDF.content_hash)
+        .where(InvoicePDF.invoice_type == invoice_type, InvoicePDF.content_hash.in_(hashes))
+    ))
+
+def _commit_batch(db: Session, import_id: str, rows: list[tuple], next_index: int,
+                  duplicates: int, failed: int, error: str | None) -> dict:
+    """Write a batch of PDFs and advance the resume point in one transaction, if this process still owns the import."""
+    record = db.get(BulkImport, import_id)
+    if record.owner != OWNER_ID:
+        raise ImportLeaseLostError(f"Import {import_id} is no longer owned by this process")
+    for name, content_hash, extracted_text in rows:
+        db.add(InvoicePDF(
+            filename=name, invoice_type=record.invoice_type, extracted_text=extracted_text, content_hash=content_hash
+        ))
+        if extracted_text:
+            dedup_cache.put_text(db, content_hash, extracted_text)
+    record.next_index = next_index
+    record.imported += len(rows)
+    record.duplicates += duplicates
+    record.failed += failed
+    if error:
+        record.error = error
+    if next_index >= record.total:
+        record.status = ImportStatus.DONE
+        record.owner = record.lease_expires_at = None
+    db.commit()
+    return _snapshot(record)
+
+def _fail_import(db: Session, import_id: str, error: str):
+    record = db.get(BulkImport, import_id)
+    # An import taken over by another process is not this one's to fail
+    if record.owner in (None, OWNER_ID):
+        record.status = ImportStatus.FAILED
+        record.owner = record.lease_expires_at = None
+        record.error = error
+        db.commit()
+
+def _get_import(db: Session, import_id: str) -> dict | None:
+    record = db.get(BulkImport, import_id)
+    return _snapshot(record) if record else None
+
+def _pending_imports(db: Session) -> list[dict]:
+    records = db.scalars(select(BulkImport).where(
+        BulkImport.status == ImportStatus.RUNNING, BulkImport.archive_path.is_not(None), _lease_free()
+    ))
+    return [_snapshot(record) for record in records]
+
+def _in_session(func, *args):
+    with SessionLocal() as db:
+        return func(db, *args)
+
+async def _db_call(func, *args):
+    return await run_io_bound(_in_session, func, *args, timeout=settings.DB_TIMEOUT)
+
+async def get_import(import_id: str) -> dict | None:
+    """Return the progress of a bulk import, or None if it does not exist."""
+    return await _db_call(_get_import, import_id)
+
+async def open_import(path: str, invoice_type: str, source_name: str | None = None,
+                      archive_path: str | None = None, key: str | None = None) -> tuple[dict, list[str]]:
+    """
+    Create the import record for a source, or reopen an interrupted one.
+
+    Args:
+        path (str): ZIP archive or directory of PDFs.
+        invoice_type (str): Invoice type stored for every PDF.
+        source_name (str | None): Display name; defaults to the file or directory name.
+        archive_path (str | None): Saved upload to resume from after a restart.
+        key (str | None): Precomputed source key, e.g. the upload's SHA-256.
+
+    Returns:
+        tuple: (import snapshot, PDF member names).
+    """
+    key = key or await run_io_bound(source_key, path)
+    names = await run_io_bound(list_members, path)
+    state = await _db_call(
+        _open_import, key, source_name or os.path.basename(os.path.normpath(path)), archive_path, invoice_type,
+        len(names)
+    )
+    if 0 < state["processed"] < state["total"]:
+        logger.info("Resuming import %s at PDF %d of %d", state["id"], state["processed"] + 1, state["total"])
+    return state, names
+
+async def _import_batch(import_id: str, invoice_type: str, members: list[tuple], next_index: int) -> dict:
+    failed, error = 0, None
+    for name, _, _, read_error in members:
+        if read_error:
+            failed += 1
+            error = f"{name}: {read_error}"
+            logger.warning("Skipping %s: %s", name, read_error)
+
+    readable = [member for member in members if member[3] is None]
+    known = await _db_call(_known_hashes, [content_hash for _, _, content_hash, _ in readable], invoice_type)
+    unique, duplicates = {}, 0
+    for name, data, content_hash, _ in readable:
+        if content_hash in known or content_hash in unique:
+            duplicates += 1
+            continue
+        unique[content_hash] = (name, data)
+
+    # Extraction fans out across the process pool; one bad PDF does not stop the batch
+    texts = await asyncio.gather(
+        *(extract_pdf_text(data) for _, data in unique.values()), return_exceptions=True
+    )
+    rows = []
+    for (content_hash, (name, _)), extracted_text in zip(unique.items(), texts):
+        if isinstance(extracted_text, Exception):
+            failed += 1
+            error = f"{name}: {extracted_text}"
+            logger.warning("Failed to extract %s: %s", name, str(extracted_text))
+            continue
+        rows.append((name, content_hash, extracted_text or None))
+
+    return await _db_call(_commit_batch, import_id, rows, next_index, duplicates, failed, error)
+
+async def process_import(path: str, state: dict, names: list[str],
+                         progress: ProgressCallback | None = None) -> dict:
+    """
+    Import the remaining PDFs of an opened import, one transaction per batch.
+
+    Members are read in batches of up to BULK_BATCH_SIZE members and
+    BULK_BATCH_MAX_BYTES bytes, the next batch being read while the current
+    one is extracted. Members already stored with the same
+    content hash and invoice type are skipped. The resume point is committed
+    with each batch, so an interrupted import continues where it stopped.
+
+    The import is first claimed with a lease of JOB_LEASE_SECONDS, renewed
+    while it runs, so several processes never run the same import. If a live
+    process already owns it, nothing is imported here.
+
+    Args:
+        path (str): ZIP archive or directory passed to open_import.
+        state (dict): Snapshot returned by open_import.
+        names (list[str]): Member names returned by open_import.
+        progress (ProgressCallback | None): Called after every batch.
+
+    Returns:
+        dict: Final import snapshot.
+    """
+    if state["status"] == ImportStatus.DONE:
+        return state
+    claimed = await _db_call(_claim_import, state["id"])
+    if claimed is None:
+        logger.info("Import %s is being run by another process", state["id"])
+        return state
+    state = claimed
+
+    sizes = await run_io_bound(member_sizes, path, names)
+    batches = plan_batches(
+        names, sizes, state["processed"], max(1, settings.BULK_BATCH_SIZE), settings.BULK_BATCH_MAX_BYTES
+    )
+    started, first_index = time.perf_counter(), state["processed"]
+
+    def read(batch_names):
+        return asyncio.ensure_future(run_io_bound(read_members, path, batch_names, settings.MAX_UPLOAD_BYTES))
+
+    next_read = read(batches[0][1]) if batches else None
+    lease_keeper = asyncio.create_task(_keep_lease(state["id"]), name=f"bulk-import-lease-{state['id']}")
+    try:
+        for number, (start, batch_names) in enumerate(batches):
+            members = await next_read
+            next_read = read(batches[number + 1][1]) if number + 1 < len(batches) else None
+            state = await _import_batch(state["id"], state["invoice_type"], members, start + len(batch_names))
+            rate = (state["processed"] - first_index) / max(time.perf_counter() - started, 1e-6)
+            logger.info(
+                "Import %s: %d/%d PDFs, %d imported, %d duplicates, %d failed (%.1f PDFs/s)",
+                state["id"], state["processed"], state["total"], state["imported"], state["duplicates"],
+                state["failed"], rate
+            )
+            if progress:
+                progress(state, rate)
+    except ImportLeaseLostError as e:
+        logger.warning("Stopping import: %s", str(e))
+    except Exception as e:
+        logger.error("Import %s failed: %s", state["id"], str(e))
+        await _db_call(_fail_import, state["id"], str(e))
+        raise
+    finally:
+        lease_keeper.cancel()
+        if next_read is not None:
+            next_read.cancel()
+    return state
+
+async def _keep_lease(import_id: str):
+    # Renew well before expiry; a lost lease stops the import at its next commit
+    while True:
+        await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+        try:
+            if not await _db_call(_renew_lease, import_id):
+                logger.warning("Lost the lease on import %s", import_id)
+                return
+        except Exception as e:
+            logger.error("Failed to renew the lease on import %s: %s", import_id, str(e))
+
+async def run_import(path: str, invoice_type: str, progress: ProgressCallback | None = None) -> dict:
+    """Open (or resume) and run the import of a ZIP archive or directory of PDFs."""
+    state, names = await open_import(path, invoice_type)
+    return await process_import(path, state, names, progress)
+
+class BulkImporter:
+    """
+    Runs imports of uploaded archives as background tasks on the server loop.
+
+    Imports still running at shutdown keep their archive and resume from
+    their last committed batch, in whichever process next finds their lease
+    expired: each process sweeps for such imports every JOB_LEASE_SECONDS.
+    """
+
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._sweeper: asyncio.Task | None = None
+
+    async def start(self, archive_path: str, invoice_type: str, source_name: str, key: str) -> dict:
+        """
+        Open the import of a saved archive and run it in the background.
+
+        Returns:
+            dict: Import snapshot at the time it was scheduled.
+        """
+        state, names = await open_import(archive_path, invoice_type, source_name, archive_path, key)
+        self._schedule(state, names)
+        return state
+
+    async def resume_pending(self):
+        """Restart imports interrupted by a shutdown, then keep picking up those left by stopped processes."""
+        await self._resume_expired()
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep(), name="bulk-import-sweeper")
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(settings.JOB_LEASE_SECONDS)
+            try:
+                await self._resume_expired()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Failed to resume bulk imports: %s", str(e))
+
+    async def _resume_expired(self):
+        for pending in await _db_call(_pending_imports):
+            if pending["id"] in self._tasks:
+                continue  # Running here
+            if not os.path.exists(pending["archive_path"]):
+                await _db_call(_fail_import, pending["id"], "Archive is missing")
+                continue
+            state, names = await open_import(
+                pending["archive_path"], pending["invoice_type"], pending["source_name"], pending["archive_path"]
+            )
+            self._schedule(state, names)
+
+    def _schedule(self, state: dict, names: list[str]):
+        task = self._tasks.get(state["id"])
+        if state["status"] == ImportStatus.DONE:
+            if task is None or task.done():
+                _remove_archive(state["archive_path"])
+            return
+        if task is not None and not task.done():
+            return  # Already running
+        task = asyncio.create_task(self._run(state, names), name=f"bulk-import-{state['id']}")
+        self._tasks[state["id"]] = task
+        task.add_done_callback(lambda _: self._tasks.pop(state["id"], None))
+
+    async def _run(self, state: dict, names: list[str]):
+        try:
+            state = await process_import(state["archive_path"], state, names)
+        except Exception:
+            return  # Logged and recorded by process_import
+        if state["status"] == ImportStatus.DONE:
+            _remove_archive(state["archive_path"])
+
+    async def stop(self):
+        """Cancel running imports; they resume once their lease expires."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def _remove_archive(archive_path: str | None):
+    if archive_path and os.path.exists(archive_path):
+        os.remove(archive_path)
+        logger.info("Removed imported archive %s", archive_path)
+
+bulk_importer = BulkImporter()
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.db_config import async_session_scope
+from app.models.dedup_cache import DedupCacheEntry
+from app.models.invoice_json import InvoiceJSON
+
+logger = logging.getLogger(__name__)
+
+# Run a full eviction pass after this many inserts
+EVICT_EVERY = 100
+
+# INSERT ... ON CONFLICT constructs per dialect
+_UPSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def pdf_cache_key(content_hash: str) -> str:
+    """Cache key for the extracted text of a PDF, from the SHA-256 of its bytes."""
+    return f"pdf:{content_hash}"
+
+def text_cache_key(extracted_text: str, invoice_type: str) -> str:
+    """Cache key for a Gemini result, from the normalized extracted text and the invoice type."""
+    normalized = _WHITESPACE_RE.sub(" ", extracted_text or "").strip().lower()
+    digest = hashlib.sha256(f"{invoice_type}\x00{normalized}".encode("utf-8")).hexdigest()
+    return f"text:{digest}"
+
+class DedupCache:
+    """
+    Content-addressed cache for PDF extraction and Gemini results, persisted in
+    the dedup_cache table.
+
+    Two layers are kept: the SHA-256 of the PDF bytes maps to the extracted
+    text, and the normalized text plus invoice type maps to the stored
+    InvoiceJSON. Entries expire after DEDUP_CACHE_TTL_SECONDS and the least
+    recently used ones are evicted beyond DEDUP_CACHE_MAX_ENTRIES or
+    DEDUP_CACHE_MAX_BYTES. All methods are blocking and take the caller's
+    session, so they can share a transaction with the surrounding write.
+
+    Lookups stay read-only: an entry's last access time and hit count are
+    written at most once per DEDUP_CACHE_TOUCH_SECONDS, with the hits seen in
+    between counted in memory, and expired entries are left to eviction.
+    Inserts are a single upsert, so they never read before writing.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self._pending_hits: dict[str, int] = {}
+        self.counters = {"pdf_hits": 0, "pdf_misses": 0, "text_hits": 0, "text_misses": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _lookup(self, db: Session, cache_key: str) -> DedupCacheEntry | None:
+        entry = db.query(DedupCacheEntry).filter(DedupCacheEntry.cache_key == cache_key).first()
+        if entry is None:
+            return None
+        now = datetime.utcnow()
+        if entry.created_at < now - timedelta(seconds=settings.DEDUP_CACHE_TTL_SECONDS):
+            return None  # Deleted by the next eviction pass
+        touch_before = now - timedelta(seconds=settings.DEDUP_CACHE_TOUCH_SECONDS)
+        with self._lock:
+            hits = self._pending_hits.pop(cache_key, 0) + 1
+            if entry.last_accessed_at is not None and entry.last_accessed_at > touch_before:
+                self._pending_hits[cache_key] = hits
+                return entry
+        try:
+            with db.begin_nested():
+                entry.hits += hits
+                entry.last_accessed_at = now
+        except OperationalError as e:
+            # Another connection holds the write lock; a later hit records these
+            logger.info("Deferred dedup cache stats for %s: %s", cache_key, str(e))
+            with self._lock:
+                self._pending_hits[cache_key] = self._pending_hits.get(cache_key, 0) + hits
+        return entry
+
+    def get_text(self, db: Session, content_hash: str) -> str | None:
+        """Return the cached extracted text for a PDF hash, or None."""
+        entry = self._lookup(db, pdf_cache_key(content_hash))
+        self._count("pdf_hits" if entry else "pdf_misses")
+        return entry.extracted_text if entry else None
+
+    def get_json(self, db: Session, extracted_text: str, invoice_type: str) -> InvoiceJSON | None:
+        """Return the cached InvoiceJSON for the text and invoice type, or None."""
+        entry = self._lookup(db, text_cache_key(extracted_text, invoice_type))
+        invoice_json = db.get(InvoiceJSON, entry.invoice_json_id) if entry else None
+        if entry is not None and invoice_json is None:
+            db.delete(entry)  # The referenced row is gone
+        self._count("text_hits" if invoice_json else "text_misses")
+        return invoice_json
+
+    def get_upload(self, db: Session, content_hash: str, invoice_type: str) -> dict | None:
+        """Return the stored Gemini JSON for a previously processed PDF, or None."""
+        extracted_text = self.get_text(db, content_hash)
+        if extracted_text is None:
+            return None
+        invoice_json = self.get_json(db, extracted_text, invoice_type)
+        return json.loads(invoice_json.json_data) if invoice_json else None
+
+    def put_text(self, db: Session, content_hash: str, extracted_text: str):
+        """Cache the extracted text of a PDF."""
+        self._put(db, pdf_cache_key(content_hash), "pdf", extracted_text=extracted_text,
+                  size_bytes=len((extracted_text or "").encode("utf-8")))
+
+    def put_json(self, db: Session, extracted_text: str, invoice_type: str, invoice_json_id: str):
+        """Cache the id of the InvoiceJSON produced for the text and invoice type."""
+        self._put(db, text_cache_key(extracted_text, invoice_type), "text", invoice_json_id=invoice_json_id)
+
+    def _put(self, db: Session, cache_key: str, kind: str, **values):
+        now = datetime.utcnow()
+        refreshed = {**values, "created_at": now, "updated_at": now, "last_accessed_at": now}
+        upsert = _UPSERTS[db.get_bind().dialect.name](DedupCacheEntry).values(
+            {"id": str(uuid.uuid4()), "cache_key": cache_key, "kind": kind, "hits": 0, "size_bytes": 0, **refreshed}
+        )
+        # Writing first takes the write lock up front; a concurrent writer of the same key just refreshes it
+        db.execute(upsert.on_conflict_do_update(
+            index_elements=[DedupCacheEntry.cache_key],
+            set_={name: upsert.excluded[name] for name in refreshed},
+        ))
+        with self._lock:
+            self._inserts += 1
+            evict_now = self._inserts % EVICT_EVERY == 0
+        if evict_now:
+            self.evict(db)
+
+    def evict(self, db: Session) -> int:
+        """Delete expired entries, then least recently used ones beyond the size limits."""
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.DEDUP_CACHE_TTL_SECONDS)
+        removed = db.query(DedupCacheEntry).filter(DedupCacheEntry.created_at < cutoff).delete(
+            synchronize_session=False
+        )
+
+        count, total_bytes = db.query(
+            func.count(DedupCacheEntry.id), func.coalesce(func.sum(DedupCacheEntry.size_bytes), 0)
+        ).one()
+        if count > settings.DEDUP_CACHE_MAX_ENTRIES or total_bytes > settings.DEDUP_CACHE_MAX_BYTES:
+            rows = (
+                db.query(DedupCacheEntry.id, DedupCacheEntry.size_bytes)
+                .order_by(DedupCacheEntry.last_accessed_at)
+                .yield_per(500)
+            )
+            stale_ids = []
+            for entry_id, size_bytes in rows:
+                if count <= settings.DEDUP_CACHE_MAX_ENTRIES and total_bytes <= settings.DEDUP_CACHE_MAX_BYTES:
+                    break
+                stale_ids.append(entry_id)
+                count -= 1
+                total_bytes -= size_bytes or 0
+            for start in range(0, len(stale_ids), 500):
+                db.query(DedupCacheEntry).filter(DedupCacheEntry.id.in_(stale_ids[start:start + 500])).delete(
+                    synchronize_session=False
+                )
+            removed += len(stale_ids)
+
+        if removed:
+            logger.info("Evicted %d dedup cache entries", removed)
+        return removed
+
+    def stats(self) -> dict:
+        """Return a copy of the hit/miss counters."""
+        with self._lock:
+            return dict(self.counters)
+
+dedup_cache = DedupCache()
+
+async def find_processed_upload(content_hash: str, invoice_type: str) -> dict | None:
+    """
+    Look up a previously processed upload in its own async session.
+
+    Args:
+        content_hash (str): SHA-256 of the uploaded PDF bytes.
+        invoice_type (str): Selected invoice type.
+
+    Returns:
+        dict | None: The stored Gemini JSON, or None if the upload is new.
+    """
+    # Committing on exit persists hit counters and expirations
+    async with async_session_scope() as db:
+        return await db.run_sync(dedup_cache.get_upload, content_hash, invoice_type)
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import logging
+import secrets
+import threading
+import time
+from collections import Counter, deque
+from app.core.config import settings
+from app.services.gemini_service import (
+    INVOICE_FIELDS_HINT, gemini_client, process_text_with_gemini, strip_code_fence
+)
+
+logger = logging.getLogger(__name__)
+
+# Number of recent per-document latencies kept for percentile reporting
+LATENCY_SAMPLES = 1000
+
+class _PendingDocument:
+    __slots__ = ("doc_id", "extracted_text", "invoice_type", "filename", "future", "enqueued_at")
+
+    def __init__(self, doc_id: str, extracted_text: str, invoice_type: str, filename: str, future: asyncio.Future):
+        self.doc_id = doc_id
+        self.extracted_text = extracted_text
+        self.invoice_type = invoice_type
+        self.filename = filename
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+class GeminiBatcher:
+    """
+    Micro-batches documents into multi-invoice Gemini requests.
+
+    Documents submitted within GEMINI_BATCH_MAX_WAIT_MS of each other are sent
+    together, up to GEMINI_BATCH_MAX_DOCS documents or GEMINI_BATCH_MAX_CHARS
+    characters per request. The model answers with a JSON array keyed by
+    document id.
+
+    A batch can mix documents from different chats, so document ids are
+    random and the answer is only used if it has exactly one valid result
+    per id sent: text in one invoice cannot guess another document's id,
+    and a forged or missing entry sends the whole batch back as
+    single-document calls.
+    """
+
+    def __init__(self, max_docs: int, max_wait_ms: int, max_chars: int):
+        self.max_docs = max_docs
+        self.max_wait = max_wait_ms / 1000
+        self.max_chars = max_chars
+        self._pending: list[_PendingDocument] = []
+        self._pending_chars = 0
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()  # Keep in-flight batches referenced
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._fallbacks = 0
+
+    async def submit(self, extracted_text: str, invoice_type: str, filename: str) -> dict:
+        """
+        Queue a document for the next batch and wait for its parsed JSON.
+
+        Args:
+            extracted_text (str): Text extracted from the PDF.
+            invoice_type (str): Selected invoice type, added to the result.
+            filename (str): Formatted filename for logging purposes.
+
+        Returns:
+            dict: Parsed JSON for this document with invoice_type added.
+        """
+        if self.max_docs <= 1:
+            started = time.perf_counter()
+            result = await process_text_with_gemini(extracted_text, invoice_type, filename)
+            self._record([started], 1)
+            return result
+
+        loop = asyncio.get_running_loop()
+        doc = _PendingDocument(secrets.token_hex(8), extracted_text, invoice_type, filename, loop.create_future())
+
+        # Flush first if this document would push the batch over the character budget
+        if self._pending and self._pending_chars + len(extracted_text) > self.max_chars:
+            self._flush()
+        self._pending.append(doc)
+        self._pending_chars += len(extracted_text)
+        if len(self._pending) >= self.max_docs:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await doc.future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_chars = self._pending, [], 0
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: list[_PendingDocument]):
+        results = {}
+        if len(batch) > 1:
+            try:
+                results = await self._send_batch(batch)
+            except Exception as e:
+                logger.warning("Batch of %d documents failed, falling back to single calls: %s", len(batch), str(e))
+
+        singles = [doc for doc in batch if doc.doc_id not in results]
+        if len(batch) > 1 and singles:
+            with self._lock:
+                self._fallbacks += len(singles)
+        for doc in batch:
+            if doc.doc_id in results and not doc.future.done():
+                doc.future.set_result(results[doc.doc_id])
+        await asyncio.gather(*(self._send_single(doc) for doc in singles))
+        self._record([doc.enqueued_at for doc in batch], len(batch))
+
+    async def _send_single(self, doc: _PendingDocument):
+        try:
+            result = await process_text_with_gemini(doc.extracted_text, doc.invoice_type, doc.filename)
+        except Exception as e:
+            if not doc.future.done():
+                doc.future.set_exception(e)
+            return
+        if not doc.future.done():
+            doc.future.set_result(result)
+
+    async def _send_batch(self, batch: list[_PendingDocument]) -> dict:
+        documents = "\n\n".join(
+            f"### Document id={doc.doc_id}\n{doc.extracted_text}" for doc in batch
+        )
+        prompt = f"""
+        Each document below is the text of one invoice. Convert every document into a JSON object with relevant key-value pairs ({INVOICE_FIELDS_HINT}). Return only a raw JSON array, without markdown code blocks or any other text, with one element per document of the form {{"id": "<document id>", "data": {{...}}}}. Ensure the JSON is valid and includes meaningful fields based on each text.
+        {documents}
+        """
+        response_text = strip_code_fence(await gemini_client.generate(prompt))
+        items = json.loads(response_text)
+        if not isinstance(items, list):
+            raise ValueError("Expected a JSON array")
+
+        by_id = {doc.doc_id: doc for doc in batch}
+        results = {}
+        for item in items:
+            if not isinstance(item, dict) or not isinstance(item.get("data"), dict):
+                raise ValueError("Batch answer has an entry without a data object")
+            doc_id = str(item.get("id"))
+            if doc_id not in by_id or doc_id in results:
+                raise ValueError("Batch answer has an unknown or repeated document id")
+            data = item["data"]
+            data['invoice_type'] = by_id[doc_id].invoice_type  # Add invoice_type to JSON
+            results[doc_id] = data
+        if len(results) != len(batch):
+            raise ValueError(f"Batch answer covers {len(results)} of {len(batch)} documents")
+        logger.info("Batched Gemini request parsed %d documents", len(results))
+        return results
+
+    def _record(self, enqueued_at: list[float], batch_size: int):
+        now = time.perf_counter()
+        with self._lock:
+            self._batch_sizes[batch_size] += 1
+            self._latencies.extend(now - started for started in enqueued_at)
+
+    def stats(self) -> dict:
+        """
+        Return batching metrics for tuning throughput against tail latency.
+
+        Returns:
+            dict: Batch count, batch size distribution, mean batch size,
+            single-call fallbacks and p50/p99 per-document latency in seconds.
+        """
+        with self._lock:
+            sizes = dict(self._batch_sizes)
+            latencies = sorted(self._latencies)
+            fallbacks = self._fallbacks
+        batches = sum(sizes.values())
+        documents = sum(size * count for size, count in sizes.items())
+
+        def percentile(p: float) -> float | None:
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {
+            "batches": batches,
+            "documents": documents,
+            "batch_sizes": sizes,
+            "mean_batch_size": documents / batches if batches else 0.0,
+            "fallbacks": fallbacks,
+            "latency_p50": percentile(0.50),
+            "latency_p99": percentile(0.99),
+        }
+
+gemini_batcher = GeminiBatcher(
+    max_docs=settings.GEMINI_BATCH_MAX_DOCS,
+    max_wait_ms=settings.GEMINI_BATCH_MAX_WAIT_MS,
+    max_chars=settings.GEMINI_BATCH_MAX_CHARS,
+)
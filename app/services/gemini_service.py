@@ -1,47 +1,215 @@
+import asyncio
 import logging
 import json
-import google.generativeai as genai
+import random
+import httpx
 from app.core.config import settings
+from app.core.logging import truncate_payload
 
-# Configure logging
-logging.basicConfig(level=logging.WARNING)
-logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
-# Configure Gemini API
-genai.configure(api_key=settings.GEMINI_API_KEY)
+# Status codes worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class GeminiAPIError(Exception):
+    """Raised when the Gemini API returns an error response."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Gemini API error {status_code}: {message}")
+        self.status_code = status_code
+
+class GeminiClient:
+    """
+    Long-lived async client for the Gemini generateContent REST endpoint.
+
+    A single httpx.AsyncClient keeps connections alive across calls, a
+    semaphore caps in-flight requests, 429/5xx responses and transport errors
+    are retried with full-jitter exponential backoff, and every call is bound
+    by an overall deadline. The HTTP client and semaphore are created lazily on
+    the event loop that first uses them; when another loop takes over, the old
+    client is closed on its own loop.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        base_url: str,
+        max_concurrency: int,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float,
+        timeout: float,
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self._client: httpx.AsyncClient | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._loop = None
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is not None and self._loop is not loop:
+            self._discard_client()
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"x-goog-api-key": self.api_key},
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._client
+
+    def _discard_client(self):
+        # The client's connections belong to the loop that opened them, so it is closed there
+        client, loop = self._client, self._loop
+        self._client = self._semaphore = self._loop = None
+        if loop.is_closed():
+            logger.warning("Gemini HTTP client dropped: its event loop closed before aclose()")
+            return
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+
+    @staticmethod
+    def _response_text(response: httpx.Response) -> str:
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            raise GeminiAPIError(response.status_code, f"Invalid JSON response: {response.text[:500]}")
+        block_reason = (data.get("promptFeedback") or {}).get("blockReason")
+        if block_reason:
+            raise GeminiAPIError(response.status_code, f"Prompt blocked: {block_reason}")
+        candidates = data.get("candidates") or []
+        if not candidates:
+            raise GeminiAPIError(response.status_code, "Response has no candidates")
+        parts = (candidates[0].get("content") or {}).get("parts") or []
+        if not parts:
+            finish_reason = candidates[0].get("finishReason", "unknown")
+            raise GeminiAPIError(response.status_code, f"Candidate has no content (finish reason {finish_reason})")
+        return "".join(part.get("text", "") for part in parts)
+
+    def _backoff(self, attempt: int, retry_after: str | None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _post(self, prompt: str) -> str:
+        client = self._ensure_client()
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                async with self._semaphore:
+                    response = await client.post(f"/v1beta/models/{self.model}:generateContent", json=payload)
+                if response.status_code == 200:
+                    return self._response_text(response)
+                error = GeminiAPIError(response.status_code, response.text[:500])
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    raise error
+                retry_after = response.headers.get("retry-after")
+            except httpx.TransportError as e:
+                error = e
+
+            if attempt >= self.max_retries:
+                raise error
+            delay = self._backoff(attempt, retry_after)
+            attempt += 1
+            logger.warning("Gemini request failed (%s), retry %d in %.2fs", str(error), attempt, delay)
+            await asyncio.sleep(delay)
+
+    async def generate(self, prompt: str, deadline: float | None = None) -> str:
+        """
+        Send a prompt and return the response text.
+
+        Args:
+            prompt (str): Prompt text.
+            deadline (float | None): Overall seconds allowed, retries included. Defaults to the client timeout.
+
+        Returns:
+            str: Concatenated text of the first candidate.
+
+        Raises:
+            GeminiAPIError: On a non-retryable error, once retries are exhausted, or when
+                the response is blocked or carries no candidate text.
+            asyncio.TimeoutError: If the deadline passes.
+        """
+        return await asyncio.wait_for(self._post(prompt), deadline or self.timeout)
+
+    async def aclose(self):
+        """Close pooled connections."""
+        if self._client is None:
+            return
+        if self._loop is not asyncio.get_running_loop():
+            self._discard_client()
+            return
+        client, self._client, self._semaphore, self._loop = self._client, None, None, None
+        await client.aclose()
+
+gemini_client = GeminiClient(
+    api_key=settings.GEMINI_API_KEY,
+    model=settings.GEMINI_MODEL,
+    base_url=settings.GEMINI_BASE_URL,
+    max_concurrency=settings.GEMINI_MAX_CONCURRENCY,
+    max_retries=settings.GEMINI_MAX_RETRIES,
+    backoff_base=settings.GEMINI_BACKOFF_BASE,
+    backoff_max=settings.GEMINI_BACKOFF_MAX,
+    timeout=settings.GEMINI_TIMEOUT,
+)
+
+INVOICE_FIELDS_HINT = "e.g., invoice_number, issued_date, amount, billed_to, items"
+
+def strip_code_fence(response_text: str) -> str:
+    """Strip markdown code blocks or extra whitespace around a JSON response."""
+    response_text = response_text.strip()
+    if response_text.startswith('```json') and response_text.endswith('```'):
+        response_text = response_text[7:-3].strip()
+    elif response_text.startswith('```') and response_text.endswith('```'):
+        response_text = response_text[3:-3].strip()
+    return response_text
 
 async def process_text_with_gemini(extracted_text: str, invoice_type: str, filename: str) -> dict:
     """
     Send extracted text to Gemini API and return the parsed JSON response with invoice_type included.
-    
+
     Args:
         extracted_text (str): Text extracted from the PDF.
         invoice_type (str): Selected invoice type (e.g., proforma_invoice).
         filename (str): Formatted filename for logging purposes.
-    
+
     Returns:
         dict: Parsed JSON response from Gemini with invoice_type added.
-    
+
     Raises:
         Exception: If the Gemini API call or JSON parsing fails.
     """
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
         prompt = f"""
-        Convert the following invoice text into a JSON object with relevant key-value pairs (e.g., invoice_number, issued_date, amount, billed_to, items). Return only the raw JSON string, without markdown code blocks or any other text. Ensure the JSON is valid and includes meaningful fields based on the text.
+        Convert the following invoice text into a JSON object with relevant key-value pairs ({INVOICE_FIELDS_HINT}). Return only the raw JSON string, without markdown code blocks or any other text. Ensure the JSON is valid and includes meaningful fields based on the text.
         Text: {extracted_text}
         """
-        response = model.generate_content(prompt)
-        # Strip markdown code blocks or extra whitespace
-        response_text = response.text.strip()
-        if response_text.startswith('```json') and response_text.endswith('```'):
-            response_text = response_text[7:-3].strip()
-        logger.info("Raw Gemini response for %s: %s", filename, response_text)
+        response_text = strip_code_fence(await gemini_client.generate(prompt))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Raw Gemini response for %s: %s", filename, truncate_payload(response_text))
         gemini_json = json.loads(response_text)  # Parse as JSON
         gemini_json['invoice_type'] = invoice_type  # Add invoice_type to JSON
         logger.info("Received JSON response from Gemini for %s", filename)
         return gemini_json
     except Exception as e:
         logger.error("Failed to process text with Gemini API for %s: %s", filename, str(e))
-        raise
\ No newline at end of file
+        raise
@@ -1,45 +1,233 @@
-from datetime import datetime
-import random
-import string
-import os
-from app.utils.pdf import generate_pdf
+from datetime import datetime, timedelta
+import logging
+import threading
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models.counter import Counter
+from app.models.invoice_draft import InvoiceDraft, InvoiceDraftRow
 from app.core.config import settings
 
-# In-memory table data
-table_data = []
+logger = logging.getLogger(__name__)
 
-def generate_invoice_number():
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
+ISSUED_TO = {
+    "name": "Raghavendra",
+    "address": "Dhanban Jharkhand, 826001"
+}
+BANK_DETAILS = {
+    "bank_name": "Rimberio",
+    "account_no": "012345678901"
+}
 
-def get_invoice_details():
-    current_date = datetime.now().strftime("%d %B %Y")
-    invoice_number = generate_invoice_number()
-    return {
-        "date_issued": current_date,
-        "invoice_number": invoice_number,
-        "issued_to": {
-            "name": "Raghavendra",
-            "address": "Dhanban Jharkhand, 826001"
-        },
-        "bank_details": {
-            "bank_name": "Rimberio",
-            "account_no": "012345678901"
-        },
-        "table_data": table_data
-    }
+INVOICE_NUMBER_COUNTER = "invoice_number"
+
+# Purge expired drafts after this many drafts are created
+PURGE_EVERY = 100
+
+_lock = threading.Lock()
+_drafts_created = 0
+
+class DraftNotFoundError(Exception):
+    """Raised when a draft does not exist or has expired."""
 
-def add_table_row(row):
-    table_data.append({
-        "no": len(table_data) + 1,
+class DraftFullError(Exception):
+    """Raised when a draft already holds INVOICE_DRAFT_MAX_ROWS rows."""
+
+def next_counter_value(db: Session, name: str) -> int:
+    """
+    Atomically increment a named counter and return its new value.
+
+    The increment is a single UPDATE ... RETURNING, so concurrent callers,
+    including other worker processes, never receive the same value.
+    """
+    statement = update(Counter).where(Counter.name == name).values(value=Counter.value + 1).returning(Counter.value)
+    value = db.execute(statement).scalar()
+    if value is not None:
+        return value
+    try:
+        with db.begin_nested():
+            db.add(Counter(name=name, value=1))
+        return 1
+    except IntegrityError:
+        # Another writer created the counter first
+        return db.execute(statement).scalar()
+
+def generate_invoice_number(db: Session) -> str:
+    return f"INV-{next_counter_value(db, INVOICE_NUMBER_COUNTER):06d}"
+
+def _row_dict(row: InvoiceDraftRow) -> dict:
+    return {
+        "no": row.no,
         "description": row.description,
         "quantity": row.quantity,
         "price": row.price,
-        "subtotal": row.quantity * row.price
-    })
-    return {"message": "Row added successfully", "table_data": table_data}
-
-def generate_and_save_pdf(html_content):
-    filename = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8)) + '.pdf'
-    filepath = os.path.join('files', filename)
-    generate_pdf(html_content, filepath)
-    return filename, filepath
\ No newline at end of file
+        "subtotal": row.subtotal,
+        "running_total": row.running_total,
+    }
+
+def _create_draft(db: Session) -> InvoiceDraft:
+    global _drafts_created
+    draft = InvoiceDraft(
+        invoice_number=generate_invoice_number(db),
+        row_count=0,
+        grand_total=0.0,
+        expires_at=datetime.utcnow() + timedelta(seconds=settings.INVOICE_DRAFT_TTL_SECONDS),
+    )
+    db.add(draft)
+    db.commit()
+    logger.info("Created invoice draft %s (%s)", draft.id, draft.invoice_number)
+    with _lock:
+        _drafts_created += 1
+        purge_now = _drafts_created % PURGE_EVERY == 0
+    if purge_now:
+        purge_expired_drafts(db)
+    return draft
+
+def _draft_rows(db: Session, draft_id: str) -> list[InvoiceDraftRow]:
+    return db.scalars(
+        select(InvoiceDraftRow).where(InvoiceDraftRow.draft_id == draft_id).order_by(InvoiceDraftRow.no)
+    ).all()
+
+def _details(draft: InvoiceDraft, rows: list[InvoiceDraftRow]) -> dict:
+    return {
+        "draft_id": draft.id,
+        "date_issued": draft.created_at.strftime("%d %B %Y"),
+        "invoice_number": draft.invoice_number,
+        "issued_to": ISSUED_TO,
+        "bank_details": BANK_DETAILS,
+        "table_data": [_row_dict(row) for row in rows],
+        "grand_total": draft.grand_total,
+    }
+
+def get_invoice_details(db: Session, draft_id: str | None = None) -> dict:
+    """
+    Return an invoice draft, or a blank invoice when no draft_id is given.
+
+    Nothing is written: a blank invoice has no draft_id or invoice number
+    until a draft is created with create_draft.
+
+    Args:
+        db (Session): Database session.
+        draft_id (str | None): Draft kept by the client from an earlier call.
+
+    Returns:
+        dict: Draft id, invoice details, rows in order and the grand total.
+
+    Raises:
+        DraftNotFoundError: If the draft does not exist or has expired.
+    """
+    if draft_id:
+        return get_draft_details(db, draft_id)
+    return {
+        "draft_id": None,
+        "date_issued": datetime.utcnow().strftime("%d %B %Y"),
+        "invoice_number": None,
+        "issued_to": ISSUED_TO,
+        "bank_details": BANK_DETAILS,
+        "table_data": [],
+        "grand_total": 0.0,
+    }
+
+def create_draft(db: Session) -> dict:
+    """
+    Start a new invoice draft and assign it the next invoice number.
+
+    Args:
+        db (Session): Database session.
+
+    Returns:
+        dict: Draft id, invoice details, no rows yet and a zero grand total.
+    """
+    return _details(_create_draft(db), [])
+
+def get_draft_details(db: Session, draft_id: str) -> dict:
+    """
+    Return an existing invoice draft without creating or extending it.
+
+    Args:
+        db (Session): Database session.
+        draft_id (str): Draft to read.
+
+    Returns:
+        dict: Draft id, invoice details, rows in order and the grand total.
+
+    Raises:
+        DraftNotFoundError: If the draft does not exist or has expired.
+    """
+    draft = db.get(InvoiceDraft, draft_id)
+    if draft is None or draft.expires_at <= datetime.utcnow():
+        raise DraftNotFoundError("Invoice draft not found or expired")
+    return _details(draft, _draft_rows(db, draft.id))
+
+def add_table_row(db: Session, draft_id: str, row) -> dict:
+    """
+    Append a row to a draft in constant time.
+
+    The draft's row count and grand total are bumped by one conditional
+    UPDATE ... RETURNING, which numbers the row and gives its running total
+    without reading the existing rows, and serializes concurrent appends.
+
+    Args:
+        db (Session): Database session.
+        draft_id (str): Draft to append to.
+        row (TableRow): Description, quantity and price.
+
+    Returns:
+        dict: The new row, the draft's row count and grand total.
+
+    Raises:
+        DraftNotFoundError: If the draft does not exist or has expired.
+        DraftFullError: If the draft is at INVOICE_DRAFT_MAX_ROWS rows.
+    """
+    now = datetime.utcnow()
+    subtotal = row.quantity * row.price
+    counters = db.execute(
+        update(InvoiceDraft)
+        .where(
+            InvoiceDraft.id == draft_id,
+            InvoiceDraft.expires_at > now,
+            InvoiceDraft.row_count < settings.INVOICE_DRAFT_MAX_ROWS,
+        )
+        .values(
+            row_count=InvoiceDraft.row_count + 1,
+            grand_total=InvoiceDraft.grand_total + subtotal,
+            expires_at=now + timedelta(seconds=settings.INVOICE_DRAFT_TTL_SECONDS),
+            updated_at=now,
+        )
+        .returning(InvoiceDraft.row_count, InvoiceDraft.grand_total)
+    ).first()
+    if counters is None:
+        draft = db.get(InvoiceDraft, draft_id)
+        db.rollback()
+        if draft is None or draft.expires_at <= now:
+            raise DraftNotFoundError("Invoice draft not found or expired")
+        raise DraftFullError(f"Invoice draft already has {settings.INVOICE_DRAFT_MAX_ROWS} rows")
+
+    row_count, grand_total = counters
+    draft_row = InvoiceDraftRow(
+        draft_id=draft_id,
+        no=row_count,
+        description=row.description,
+        quantity=row.quantity,
+        price=row.price,
+        subtotal=subtotal,
+        running_total=grand_total,
+    )
+    db.add(draft_row)
+    db.commit()
+    return {
+        "message": "Row added successfully",
+        "row": _row_dict(draft_row),
+        "row_count": row_count,
+        "grand_total": grand_total,
+    }
+
+def purge_expired_drafts(db: Session) -> int:
+    """Delete drafts past their expiry, with their rows."""
+    expired = select(InvoiceDraft.id).where(InvoiceDraft.expires_at <= datetime.utcnow())
+    db.execute(delete(InvoiceDraftRow).where(InvoiceDraftRow.draft_id.in_(expired)))
+    removed = db.execute(delete(InvoiceDraft).where(InvoiceDraft.id.in_(expired))).rowcount
+    db.commit()
+    if removed:
+        logger.info("Purged %d expired invoice drafts", removed)
+    return removed
@@ -0,0 +1,555 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, literal, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.db_config import IS_SQLITE, async_session_scope
+from app.core.db_writer import db_writer
+from app.core.logging import bind_log_context, log_context
+from app.core.metrics import jobs_total, stage_seconds
+from app.core.profiling import slow_request_tracker
+from app.models.ingestion_job import IngestionJob
+from app.models.invoice_pdf import InvoicePDF
+from app.models.invoice_json import InvoiceJSON
+from app.services.bot_outbox import bot_outbox
+from app.services.dedup_cache import dedup_cache
+from app.services.gemini_batcher import gemini_batcher
+from app.services.pdf_service import extract_pdf_text
+from app.utils.fair_queue import FairQueue
+from app.utils.invoice_fields import compact_json, extract_invoice_fields
+
+logger = logging.getLogger(__name__)
+
+class JobStatus:
+    QUEUED = "queued"
+    EXTRACTING = "extracting"
+    EXTRACTED = "extracted"
+    PARSING = "parsing"
+    DONE = "done"
+    FAILED = "failed"
+
+ACTIVE_STATUSES = (JobStatus.QUEUED, JobStatus.EXTRACTING, JobStatus.EXTRACTED, JobStatus.PARSING)
+RUNNING_STATUSES = (JobStatus.EXTRACTING, JobStatus.PARSING)
+
+# Advisory lock taken by job inserts on Postgres
+INSERT_LOCK_KEY = 0x1A7E5
+
+# Identifies this process as the owner of the jobs it is running
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class QueueFullError(Exception):
+    """Raised when the queue already holds QUEUE_MAX_DEPTH active jobs."""
+
+class ChatQuotaError(QueueFullError):
+    """Raised when a chat already has QUEUE_MAX_PER_CHAT active jobs."""
+
+class LeaseLostError(Exception):
+    """Raised when a job's lease expired and another process took the job over."""
+
+def _fair_position(active_per_chat: dict[str, int], chat_id: str, rank: int) -> int:
+    """
+    1-based position of a chat's rank-th active job under round-robin scheduling.
+
+    Each chat is served one job per turn, so the job goes out after up to
+    rank jobs of every other chat (rank - 1 of its own).
+    """
+    return sum(
+        min(count, rank) for other, count in active_per_chat.items() if other != chat_id
+    ) + rank
+
+# Persistence helpers; each runs in its own session and transaction, except the
+# stage completions, which take the group-commit writer's shared session
+
+def _db_call(coro):
+    """Bound a persistence helper by DB_TIMEOUT."""
+    return asyncio.wait_for(coro, settings.DB_TIMEOUT)
+
+async def _active_per_chat(db: AsyncSession) -> dict[str, int]:
+    rows = await db.execute(
+        select(IngestionJob.chat_id, func.count(IngestionJob.id))
+        .where(IngestionJob.status.in_(ACTIVE_STATUSES))
+        .group_by(IngestionJob.chat_id)
+    )
+    return dict(rows.all())
+
+async def _insert_job(chat_id: str, filename: str, invoice_type: str, pdf_data: bytes, content_hash: str,
+                      max_depth: int, max_per_chat: int) -> tuple[str, int]:
+    now = datetime.utcnow()
+    row = {
+        "id": str(uuid.uuid4()), "chat_id": chat_id, "filename": filename, "invoice_type": invoice_type,
+        "pdf_data": pdf_data, "content_hash": content_hash, "status": JobStatus.QUEUED, "attempts": 0,
+        "created_at": now, "updated_at": now,
+    }
+    columns = IngestionJob.__table__.c
+    active = IngestionJob.status.in_(ACTIVE_STATUSES)
+    depth = select(func.count()).select_from(IngestionJob).where(active).scalar_subquery()
+    chat_depth = select(func.count()).select_from(IngestionJob).where(
+        active, IngestionJob.chat_id == chat_id
+    ).scalar_subquery()
+    async with async_session_scope() as db:
+        if not IS_SQLITE:
+            # Postgres runs concurrent INSERT ... SELECTs on separate snapshots; serialize them
+            await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": INSERT_LOCK_KEY})
+        # The quota checks and the insert are one statement, so concurrent uploads cannot both pass them
+        inserted = await db.execute(insert(IngestionJob).from_select(
+            list(row),
+            select(*(literal(value, columns[name].type) for name, value in row.items()))
+            .where(depth < max_depth, chat_depth < max_per_chat),
+        ))
+        active_per_chat = await _active_per_chat(db)
+    if inserted.rowcount != 1:
+        total = sum(active_per_chat.values())
+        if total >= max_depth:
+            raise QueueFullError(f"Queue is full ({total} active jobs)")
+        raise ChatQuotaError(f"Chat already has {active_per_chat.get(chat_id, 0)} invoices in progress")
+    return row["id"], _fair_position(active_per_chat, chat_id, active_per_chat[chat_id])
+
+def _lease_deadline() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+
+async def _recover_jobs() -> tuple[list[tuple[str, str]], list[tuple[str, str]]]:
+    """
+    Requeue jobs whose owner stopped renewing their lease, and return (to_extract, to_parse)
+    (chat_id, id) pairs of the waiting jobs in submission order.
+
+    Jobs whose lease is still valid belong to a live process and are left alone.
+    """
+    expired = IngestionJob.lease_expires_at.is_(None) | (IngestionJob.lease_expires_at < datetime.utcnow())
+    async with async_session_scope() as db:
+        requeued = 0
+        for running, waiting in ((JobStatus.EXTRACTING, JobStatus.QUEUED), (JobStatus.PARSING, JobStatus.EXTRACTED)):
+            result = await db.execute(
+                update(IngestionJob).where(IngestionJob.status == running, expired)
+                .values(status=waiting, owner=None, lease_expires_at=None)
+            )
+            requeued += result.rowcount
+        if requeued:
+            logger.warning("Requeued %d jobs whose worker stopped renewing its lease", requeued)
+        rows = (await db.execute(
+            select(IngestionJob.id, IngestionJob.chat_id, IngestionJob.status)
+            .where(IngestionJob.status.in_((JobStatus.QUEUED, JobStatus.EXTRACTED)))
+            .order_by(IngestionJob.created_at)
+        )).all()
+        to_extract = [(chat_id, job_id) for job_id, chat_id, status in rows if status == JobStatus.QUEUED]
+        to_parse = [(chat_id, job_id) for job_id, chat_id, status in rows if status == JobStatus.EXTRACTED]
+        return to_extract, to_parse
+
+async def _renew_leases(job_ids: list[str]) -> int:
+    """
+    Extend the leases of the jobs a worker of this process is running.
+
+    Only jobs still in a worker's hands are renewed, so a job whose worker
+    gave up on it without releasing it expires and is recovered.
+    """
+    if not job_ids:
+        return 0
+    async with async_session_scope() as db:
+        result = await db.execute(
+            update(IngestionJob)
+            .where(
+                IngestionJob.id.in_(job_ids),
+                IngestionJob.owner == WORKER_ID,
+                IngestionJob.status.in_(RUNNING_STATUSES),
+            )
+            .values(lease_expires_at=_lease_deadline())
+        )
+        return result.rowcount
+
+async def _release_job(job_id: str) -> bool:
+    """Return a job this process is running to the stage it was waiting for; returns False if it is not ours."""
+    async with async_session_scope() as db:
+        for running, waiting in ((JobStatus.EXTRACTING, JobStatus.QUEUED), (JobStatus.PARSING, JobStatus.EXTRACTED)):
+            result = await db.execute(
+                update(IngestionJob)
+                .where(IngestionJob.id == job_id, IngestionJob.owner == WORKER_ID, IngestionJob.status == running)
+                .values(status=waiting, owner=None, lease_expires_at=None)
+            )
+            if result.rowcount:
+                return True
+        return False
+
+async def _claim_job(job_id: str, from_status: str, to_status: str) -> dict | None:
+    """Move a job into its running state and return a snapshot of it, or None if it is not claimable."""
+    async with async_session_scope() as db:
+        # A single conditional UPDATE, so two processes can never both claim the job
+        claimed = await db.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == job_id, IngestionJob.status == from_status)
+            .values(
+                status=to_status, attempts=IngestionJob.attempts + 1,
+                owner=WORKER_ID, lease_expires_at=_lease_deadline(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if claimed.rowcount != 1:
+            return None
+        job = await db.get(IngestionJob, job_id)
+        return {
+            "id": job.id,
+            "chat_id": job.chat_id,
+            "filename": job.filename,
+            "invoice_type": job.invoice_type,
+            "pdf_data": job.pdf_data,
+            "content_hash": job.content_hash,
+            "extracted_text": job.extracted_text,
+            "attempts": job.attempts,
+        }
+
+async def _owned_job(db: AsyncSession, job_id: str, status: str) -> IngestionJob:
+    """Load a job this process is running, or raise LeaseLostError if another process took it over."""
+    job = await db.get(IngestionJob, job_id)
+    if job is None or job.status != status or job.owner != WORKER_ID:
+        raise LeaseLostError(f"Job {job_id} is no longer owned by this worker")
+    return job
+
+async def _cached_text(content_hash: str | None) -> str | None:
+    if not content_hash:
+        return None
+    async with async_session_scope() as db:
+        return await db.run_sync(dedup_cache.get_text, content_hash)
+
+async def _complete_extraction(db: AsyncSession, job_id: str, extracted_text: str, from_cache: bool):
+    """Store the extracted text on the job; the invoice rows are written once parsing is done."""
+    job = await _owned_job(db, job_id, JobStatus.EXTRACTING)
+    if job.content_hash and not from_cache:
+        await db.run_sync(dedup_cache.put_text, job.content_hash, extracted_text)
+    job.extracted_text = extracted_text
+    job.pdf_data = None  # The text is stored; drop the PDF bytes
+    job.status = JobStatus.EXTRACTED
+    job.owner = job.lease_expires_at = None
+    job.attempts = 0  # Attempts are counted per stage
+
+async def _complete_from_cache(db: AsyncSession, job_id: str) -> bool:
+    """Finish a job whose text already has a stored Gemini result; returns False on a cache miss."""
+    job = await _owned_job(db, job_id, JobStatus.PARSING)
+    cached = await db.run_sync(dedup_cache.get_json, job.extracted_text, job.invoice_type)
+    if cached is None:
+        return False
+    db.add(InvoicePDF(
+        filename=job.filename, invoice_type=job.invoice_type, extracted_text=job.extracted_text,
+        content_hash=job.content_hash, invoice_json_id=cached.id, chat_id=job.chat_id
+    ))
+    job.status = JobStatus.DONE
+    job.owner = job.lease_expires_at = None
+    return True
+
+async def _complete_parsing(db: AsyncSession, job_id: str, gemini_json: dict):
+    """Write the invoice_pdfs and invoice_jsons rows and mark the job done in one transaction."""
+    job = await _owned_job(db, job_id, JobStatus.PARSING)
+    invoice_json = InvoiceJSON(
+        invoice_type=job.invoice_type,
+        json_data=compact_json(gemini_json),
+        **extract_invoice_fields(gemini_json)
+    )
+    db.add(invoice_json)
+    await db.flush()
+    db.add(InvoicePDF(
+        filename=job.filename, invoice_type=job.invoice_type, extracted_text=job.extracted_text,
+        content_hash=job.content_hash, invoice_json_id=invoice_json.id, chat_id=job.chat_id
+    ))
+    await db.run_sync(dedup_cache.put_json, job.extracted_text, job.invoice_type, invoice_json.id)
+    job.status = JobStatus.DONE
+    job.owner = job.lease_expires_at = None
+
+async def _fail_job(job_id: str, error: str):
+    async with async_session_scope() as db:
+        job = await db.get(IngestionJob, job_id)
+        # A job taken over by another process is not this one's to fail
+        if job is not None and job.owner in (None, WORKER_ID):
+            job.status = JobStatus.FAILED
+            job.owner = job.lease_expires_at = None
+            job.error = error
+
+async def _chat_jobs(chat_id: str, limit: int) -> list[dict]:
+    """Return the most recent jobs of a chat, with queue positions for active ones."""
+    async with async_session_scope() as db:
+        jobs = (await db.scalars(
+            select(IngestionJob)
+            .where(IngestionJob.chat_id == chat_id)
+            .order_by(IngestionJob.created_at.desc())
+            .limit(limit)
+        )).all()
+        active_per_chat = await _active_per_chat(db)
+        # Jobs are listed newest first; the chat's newest active job is its last in line
+        rank = active_per_chat.get(chat_id, 0)
+        result = []
+        for job in jobs:
+            position = None
+            if job.status in ACTIVE_STATUSES:
+                position = _fair_position(active_per_chat, chat_id, rank)
+                rank -= 1
+            result.append({
+                "filename": job.filename,
+                "invoice_type": job.invoice_type,
+                "status": job.status,
+                "position": position,
+                "error": job.error,
+            })
+        return result
+
+class IngestionQueue:
+    """
+    Persistent two-stage pipeline for Telegram uploads.
+
+    Jobs are stored in the ingestion_jobs table and flow through an extraction
+    stage (process pool) and an LLM parsing stage (Gemini), each served by its
+    own pool of asyncio workers. Both stages take jobs round-robin across
+    chats, and a chat may have at most QUEUE_MAX_PER_CHAT active jobs, so one
+    chat uploading many PDFs cannot starve the others.
+
+    Every process running a queue (each webhook replica, for instance) shares
+    the table. A job is claimed with a conditional update that records this
+    process as its owner and a lease of JOB_LEASE_SECONDS, which the owner
+    renews while it works. Jobs whose lease expired, because their process
+    stopped or died, are resumed from the last completed stage by whichever
+    queue sweeps the table next; a stage finished after its lease was lost
+    is discarded.
+    """
+
+    def __init__(self):
+        self._extract_queue: FairQueue | None = None
+        self._parse_queue: FairQueue | None = None
+        self._workers: list[asyncio.Task] = []
+        # When each queued job was put on its stage queue, for the wait-time histograms
+        self._enqueued_at: dict[str, float] = {}
+        # Jobs a worker of this process is running; only their leases are renewed
+        self._running: set[str] = set()
+
+    def _put(self, queue: FairQueue, chat_id: str, job_id: str):
+        if job_id in self._enqueued_at:
+            return  # Already waiting in this process
+        self._enqueued_at[job_id] = time.perf_counter()
+        queue.put_nowait(chat_id, job_id)
+
+    async def _get(self, queue: FairQueue, stage: str) -> str:
+        job_id = await queue.get()
+        enqueued_at = self._enqueued_at.pop(job_id, None)
+        if enqueued_at is not None:
+            stage_seconds.observe(time.perf_counter() - enqueued_at, "queue", stage)
+        return job_id
+
+    async def start(self, bot):
+        """Recover persisted jobs and start the worker pools and the bot outbox on the running loop."""
+        bot_outbox.start(bot)
+        self._extract_queue = FairQueue()
+        self._parse_queue = FairQueue()
+
+        resumed = await self._sweep()
+        if resumed:
+            logger.info("Resumed %d waiting jobs", resumed)
+
+        self._workers = [
+            asyncio.create_task(self._extract_worker(), name=f"extract-worker-{i}")
+            for i in range(settings.EXTRACT_WORKERS)
+        ] + [
+            asyncio.create_task(self._parse_worker(), name=f"parse-worker-{i}")
+            for i in range(settings.PARSE_WORKERS)
+        ] + [asyncio.create_task(self._maintain_leases(), name="job-lease-keeper")]
+        logger.info(
+            "Ingestion queue started with %d extraction and %d parsing workers",
+            settings.EXTRACT_WORKERS, settings.PARSE_WORKERS
+        )
+
+    async def _sweep(self) -> int:
+        """Queue the waiting jobs of the table, including those of expired leases, that are not queued here yet."""
+        to_extract, to_parse = await _db_call(_recover_jobs())
+        waiting = len(self._enqueued_at)
+        for chat_id, job_id in to_extract:
+            self._put(self._extract_queue, chat_id, job_id)
+        for chat_id, job_id in to_parse:
+            self._put(self._parse_queue, chat_id, job_id)
+        return len(self._enqueued_at) - waiting
+
+    async def _maintain_leases(self):
+        # Renew well before expiry, then pick up jobs left behind by processes that stopped
+        interval = settings.JOB_LEASE_SECONDS / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await _db_call(_renew_leases(list(self._running)))
+                await self._sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Failed to renew job leases: %s", str(e))
+
+    async def stop(self):
+        """Cancel the workers; unfinished jobs stay in the table and resume once their lease expires."""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await bot_outbox.stop()
+        logger.info("Ingestion queue stopped")
+
+    async def submit(self, chat_id, filename: str, invoice_type: str, pdf_data: bytes,
+                     content_hash: str | None = None) -> int:
+        """
+        Persist a new job and schedule it for extraction.
+
+        Returns:
+            int: 1-based position of the job among all active jobs, in round-robin order.
+
+        Raises:
+            QueueFullError: If the queue is at QUEUE_MAX_DEPTH.
+            ChatQuotaError: If the chat is at QUEUE_MAX_PER_CHAT.
+        """
+        job_id, position = await _db_call(_insert_job(
+            str(chat_id), filename, invoice_type, pdf_data, content_hash,
+            settings.QUEUE_MAX_DEPTH, settings.QUEUE_MAX_PER_CHAT
+        ))
+        self._put(self._extract_queue, str(chat_id), job_id)
+        logger.info("Queued job %s for %s at position %d", job_id, filename, position)
+        return position
+
+    def depth(self) -> dict[tuple[str], int]:
+        """Return the number of jobs waiting for each stage, keyed by stage name."""
+        return {
+            ("extract",): self._extract_queue.qsize() if self._extract_queue else 0,
+            ("parse",): self._parse_queue.qsize() if self._parse_queue else 0,
+        }
+
+    async def chat_status(self, chat_id, limit: int = 5) -> list[dict]:
+        """Return the most recent jobs submitted from a chat."""
+        return await _db_call(_chat_jobs(str(chat_id), limit))
+
+    async def _fail(self, job: dict, message: str, error: Exception):
+        logger.error("Job %s failed: %s", job["id"], str(error))
+        jobs_total.inc("failed")
+        await _db_call(_fail_job(job["id"], str(error)))
+        bot_outbox.send(job["chat_id"], f"{message} ({job['filename']}): {str(error)}")
+
+    async def _release(self, job_id: str):
+        # Hand the job back for the next sweep to retry; attempts still count against JOB_MAX_ATTEMPTS.
+        # If even that fails, its lease is no longer renewed and it is recovered once it expires.
+        try:
+            if await _db_call(_release_job(job_id)):
+                logger.warning("Released job %s for a retry", job_id)
+        except Exception as e:
+            logger.error("Failed to release job %s: %s", job_id, str(e))
+
+    async def _extract_worker(self):
+        while True:
+            job_id = await self._get(self._extract_queue, "extract_wait")
+            token = bind_log_context(job_id=job_id)
+            self._running.add(job_id)
+            try:
+                async with slow_request_tracker.track("job", f"extract {job_id}"):
+                    await self._run_extraction(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Unexpected error in extraction worker for job %s: %s", job_id, str(e))
+                await self._release(job_id)
+            finally:
+                self._running.discard(job_id)
+                log_context.reset(token)
+
+    async def _parse_worker(self):
+        while True:
+            job_id = await self._get(self._parse_queue, "parse_wait")
+            token = bind_log_context(job_id=job_id)
+            self._running.add(job_id)
+            try:
+                async with slow_request_tracker.track("job", f"parse {job_id}"):
+                    await self._run_parsing(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Unexpected error in parsing worker for job %s: %s", job_id, str(e))
+                await self._release(job_id)
+            finally:
+                self._running.discard(job_id)
+                log_context.reset(token)
+
+    async def _run_extraction(self, job_id: str):
+        job = await _db_call(_claim_job(job_id, JobStatus.QUEUED, JobStatus.EXTRACTING))
+        if job is None:
+            return
+        bind_log_context(chat_id=job["chat_id"])
+        if job["attempts"] > settings.JOB_MAX_ATTEMPTS:
+            await self._fail(job, "Giving up on PDF", RuntimeError("too many attempts"))
+            return
+
+        extracted_text = await _db_call(_cached_text(job["content_hash"]))
+        from_cache = extracted_text is not None
+        if from_cache:
+            logger.info("Reusing cached text for %s", job["filename"])
+        else:
+            source = job["pdf_data"]
+            if source is None:
+                await self._fail(job, "Failed to extract PDF text", FileNotFoundError("uploaded PDF is missing"))
+                return
+            try:
+                with stage_seconds.time("queue", "extract"):
+                    extracted_text = await extract_pdf_text(source)
+                logger.info("PDF text extracted for %s", job["filename"])
+            except Exception as e:
+                await self._fail(job, "Failed to extract PDF text", e)
+                return
+
+        try:
+            with stage_seconds.time("queue", "db_write"):
+                await _db_call(db_writer.submit(_complete_extraction, job_id, extracted_text, from_cache))
+            logger.info("Saved invoice data to database for %s", job["filename"])
+        except LeaseLostError as e:
+            logger.warning("Discarding extraction: %s", str(e))
+            return
+        except Exception as e:
+            await self._fail(job, "Failed to save invoice data", e)
+            return
+
+        self._put(self._parse_queue, job["chat_id"], job_id)
+
+    async def _run_parsing(self, job_id: str):
+        job = await _db_call(_claim_job(job_id, JobStatus.EXTRACTED, JobStatus.PARSING))
+        if job is None:
+            return
+        bind_log_context(chat_id=job["chat_id"])
+        if job["attempts"] > settings.JOB_MAX_ATTEMPTS:
+            await self._fail(job, "Giving up on PDF", RuntimeError("too many attempts"))
+            return
+
+        invoice_type_display = job["invoice_type"].replace('_', ' ').title()
+        try:
+            with stage_seconds.time("queue", "db_write"):
+                from_cache = await _db_call(db_writer.submit(_complete_from_cache, job_id))
+        except LeaseLostError as e:
+            logger.warning("Discarding cached result: %s", str(e))
+            return
+        except Exception as e:
+            await self._fail(job, "Failed to save invoice data", e)
+            return
+        if from_cache:
+            logger.info("Reusing cached Gemini result for %s", job["filename"])
+            jobs_total.inc("cached")
+            bot_outbox.send(job["chat_id"], f"Record already saved in {invoice_type_display} table")
+            return
+
+        try:
+            with stage_seconds.time("queue", "gemini"):
+                gemini_json = await gemini_batcher.submit(job["extracted_text"], job["invoice_type"], job["filename"])
+        except Exception as e:
+            await self._fail(job, "Failed to process text with Gemini", e)
+            return
+
+        try:
+            with stage_seconds.time("queue", "db_write"):
+                await _db_call(db_writer.submit(_complete_parsing, job_id, gemini_json))
+            logger.info("Saved Gemini JSON to database for invoice_type: %s", job["invoice_type"])
+        except LeaseLostError as e:
+            logger.warning("Discarding parsed invoice: %s", str(e))
+            return
+        except Exception as e:
+            await self._fail(job, "Failed to save Gemini JSON", e)
+            return
+
+        jobs_total.inc("done")
+        bot_outbox.send(job["chat_id"], f"Record Saved into {invoice_type_display} table")
+
+ingestion_queue = IngestionQueue()
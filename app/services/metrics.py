@@ -0,0 +1,64 @@
+from app.core.db_writer import db_writer
+from app.core.logging import logging_stats
+from app.core.metrics import Counter, Gauge, registry
+from app.services.bot_outbox import bot_outbox
+from app.services.dedup_cache import dedup_cache
+from app.services.gemini_batcher import gemini_batcher
+from app.services.job_queue import ingestion_queue
+from app.services.pdf_cache import pdf_cache
+
+# Counters the services already keep, read at scrape time so the hot path pays nothing extra
+
+def _dedup_lookups() -> dict:
+    stats = dedup_cache.stats()
+    return {
+        (layer, result): stats[f"{layer}_{result}"]
+        for layer in ("pdf", "text") for result in ("hits", "misses")
+    }
+
+def _pdf_cache_counters() -> dict:
+    stats = pdf_cache.stats()
+    return {(name,): stats[name] for name in ("hits", "misses", "evictions")}
+
+registry.register(Gauge(
+    "ingestion_queue_depth", "Jobs waiting for each ingestion stage.", ("stage",), func=ingestion_queue.depth
+))
+registry.register(Counter(
+    "dedup_cache_lookups_total", "Dedup cache lookups by layer and result.", ("layer", "result"), func=_dedup_lookups
+))
+registry.register(Counter(
+    "pdf_cache_events_total", "Rendered PDF cache hits, misses and evictions.", ("event",), func=_pdf_cache_counters
+))
+registry.register(Gauge(
+    "pdf_cache_bytes", "Size of the rendered PDF cache.", func=lambda: pdf_cache.stats()["bytes"]
+))
+registry.register(Counter(
+    "gemini_batches_total", "Gemini batch requests sent.", func=lambda: gemini_batcher.stats()["batches"]
+))
+registry.register(Counter(
+    "gemini_documents_total", "Documents sent to Gemini in batches.", func=lambda: gemini_batcher.stats()["documents"]
+))
+registry.register(Counter(
+    "gemini_fallbacks_total", "Documents retried as single Gemini calls.", func=lambda: gemini_batcher.stats()["fallbacks"]
+))
+registry.register(Counter(
+    "db_group_commits_total", "Group-commit transactions.", func=lambda: db_writer.stats()["batches"]
+))
+registry.register(Counter(
+    "db_group_commit_writes_total", "Writes carried by group commits.", func=lambda: db_writer.stats()["writes"]
+))
+registry.register(Counter(
+    "bot_messages_total", "Outgoing bot messages by outcome.", ("outcome",),
+    func=lambda: {(name,): value for name, value in bot_outbox.stats().items() if name != "pending"}
+))
+registry.register(Gauge(
+    "bot_messages_pending", "Outgoing bot messages waiting to be sent.", func=lambda: bot_outbox.stats()["pending"]
+))
+registry.register(Counter(
+    "log_records_dropped_total", "Log records dropped by sampling or a full log queue.", ("reason",),
+    func=lambda: {(reason,): value for reason, value in logging_stats().items()}
+))
+
+def render_metrics() -> str:
+    """Render every metric of this process in the Prometheus text format."""
+    return registry.render()
@@ -0,0 +1,110 @@
+import hashlib
+import logging
+import os
+import threading
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+def render_cache_key(backend: str, document: str) -> str:
+    """Cache key for a rendered PDF, from the SHA-256 of the backend and the document it was rendered from."""
+    return hashlib.sha256(f"{backend}\x00{document}".encode("utf-8")).hexdigest()
+
+class PDFCache:
+    """
+    Least recently used cache of rendered PDFs, stored as <key>.pdf files.
+
+    The directory is the only state, so every worker process shares one
+    cache: a hit touches its file, and each put sums the sizes of the files
+    on disk and deletes the least recently modified ones beyond max_bytes.
+    The limit therefore holds for all processes together, at the cost of one
+    directory scan per stored PDF. All methods are blocking; call them
+    through run_io_bound.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # As of the last scan, for stats()
+        self._entries = 0
+        self._total_bytes = 0
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def _scan(self) -> list[tuple[float, str, int]]:
+        """Return (modification time, key, size) of every cached PDF, least recently used first."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".pdf"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue  # Evicted by another process
+                    entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        entries.sort()
+        return entries
+
+    def get(self, key: str) -> bytes | None:
+        """Return the cached PDF for a key, or None."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.counters["misses"] += 1
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # Evicted by another process since it was read
+        with self._lock:
+            self.counters["hits"] += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Store a PDF, evicting the least recently used ones beyond max_bytes."""
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+
+            entries = self._scan()
+            total_bytes = sum(size for _, _, size in entries)
+            evicted = 0
+            for _, old_key, size in entries:
+                if total_bytes <= self.max_bytes:
+                    break
+                if old_key == key:
+                    continue
+                try:
+                    os.remove(self._path(old_key))
+                except FileNotFoundError:
+                    pass  # Another process evicted it first
+                total_bytes -= size
+                evicted += 1
+            self._entries = len(entries) - evicted
+            self._total_bytes = total_bytes
+            self.counters["evictions"] += evicted
+        if evicted:
+            logger.debug("Evicted %d cached PDFs", evicted)
+
+    def stats(self) -> dict:
+        """Return the hit/miss/eviction counters and the cache size as of the last stored PDF."""
+        with self._lock:
+            return {
+                **self.counters,
+                "entries": self._entries,
+                "bytes": self._total_bytes,
+            }
+
+pdf_cache = PDFCache(settings.PDF_CACHE_DIR, settings.PDF_CACHE_MAX_BYTES)
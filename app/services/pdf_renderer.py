@@ -0,0 +1,198 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from app.core.config import settings
+from app.core.executors import WORKER_KILL_GRACE, run_io_bound, run_with_deadline, terminate_pool
+from app.core.profiling import memory_tracer, span
+from app.services.pdf_cache import PDFCache, pdf_cache, render_cache_key
+from app.utils.invoice_pdf import INVOICE_BACKENDS, render_invoice_reportlab
+from app.utils.invoice_template import render_invoice_html
+from app.utils.pdf import HTML_BACKENDS, render_pdf, warm_renderer
+
+logger = logging.getLogger(__name__)
+
+class RenderQueueFullError(Exception):
+    """Raised when RENDER_QUEUE_SIZE renders are already waiting for a worker."""
+
+class PDFRenderer:
+    """
+    PDF rendering in a dedicated pool of warm worker processes.
+
+    Renders never run on the event loop, and get their own pool so they do
+    not queue behind PDF extraction. Each worker renders a small document
+    when it starts, so fonts and the default CSS are loaded before the first
+    request. At most `workers` renders run at once and `queue_size` more may
+    wait; beyond that callers are refused instead of piling up. Every render
+    is bound by `timeout` seconds: the worker stops it at the deadline, and
+    a worker that does not is killed by replacing the pool.
+
+    HTML is rendered with `backend`; invoice drafts with `invoice_backend`,
+    either "reportlab" or an HTML backend rendering the invoice template.
+    Rendered PDFs are kept in `cache`, keyed by the SHA-256 of the backend
+    and document, and concurrent requests for the same document share one
+    render.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        queue_size: int,
+        timeout: float,
+        backend: str = "xhtml2pdf",
+        invoice_backend: str = "xhtml2pdf",
+        cache: PDFCache | None = None,
+    ):
+        if backend not in HTML_BACKENDS:
+            raise ValueError(f"Unknown PDF backend: {backend}")
+        if invoice_backend not in INVOICE_BACKENDS:
+            raise ValueError(f"Unknown invoice PDF backend: {invoice_backend}")
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.backend = backend
+        self.invoice_backend = invoice_backend
+        self.cache = cache
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._in_flight: dict[str, asyncio.Task] = {}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=warm_renderer,
+                    initargs=(self.backend,),
+                )
+                logger.info("Started %s render pool with %d workers", self.backend, self.workers)
+            return self._pool
+
+    async def start(self):
+        """Spawn and warm every worker ahead of the first request."""
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        await asyncio.gather(*(loop.run_in_executor(pool, os.getpid) for _ in range(self.workers)))
+
+    async def render(self, html_content: str) -> bytes:
+        """
+        Render HTML to PDF bytes, from the cache when the same HTML was rendered before.
+
+        Args:
+            html_content (str): Complete HTML document.
+
+        Returns:
+            bytes: The PDF document.
+
+        Raises:
+            RenderQueueFullError: If the render queue is full.
+            asyncio.TimeoutError: If the render takes longer than the timeout.
+            PDFRenderError: If the document cannot be rendered.
+        """
+        key = render_cache_key(self.backend, html_content)
+        return await self._cached(key, render_pdf, html_content, self.backend)
+
+    async def render_invoice(self, details: dict) -> bytes:
+        """
+        Render an invoice draft to PDF bytes with the invoice backend.
+
+        Args:
+            details (dict): Invoice details as returned by get_invoice_details.
+
+        Returns:
+            bytes: The PDF document.
+
+        Raises:
+            RenderQueueFullError: If the render queue is full.
+            asyncio.TimeoutError: If the render takes longer than the timeout.
+            PDFRenderError: If the document cannot be rendered.
+        """
+        if self.invoice_backend != "reportlab":
+            html_content = render_invoice_html(details)
+            key = render_cache_key(self.invoice_backend, html_content)
+            return await self._cached(key, render_pdf, html_content, self.invoice_backend)
+        key = render_cache_key("reportlab", json.dumps(details, sort_keys=True, default=str))
+        return await self._cached(key, render_invoice_reportlab, details)
+
+    async def _cached(self, key: str, func, *args) -> bytes:
+        if self.cache is None:
+            return await self._render(func, *args)
+
+        pdf_bytes = await run_io_bound(self.cache.get, key)
+        if pdf_bytes is not None:
+            return pdf_bytes
+
+        # Join a render of the same document that is already running. The
+        # render is a task of its own, so a caller that goes away (a client
+        # disconnecting) cancels only its own wait, not the others'.
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._render_and_store(key, func, *args))
+            self._in_flight[key] = task
+            task.add_done_callback(partial(self._render_done, key))
+        return await asyncio.shield(task)
+
+    async def _render_and_store(self, key: str, func, *args) -> bytes:
+        pdf_bytes = await self._render(func, *args)
+        await run_io_bound(self.cache.put, key, pdf_bytes)
+        return pdf_bytes
+
+    def _render_done(self, key: str, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved when every caller went away
+
+    async def _render(self, func, *args) -> bytes:
+        with self._lock:
+            if self._admitted >= self.workers + self.queue_size:
+                raise RenderQueueFullError("Too many PDF renders in progress, try again shortly")
+            self._admitted += 1
+        try:
+            pool = self._get_pool()
+            # The worker stops the render itself at the deadline; see run_with_deadline
+            deadline = time.time() + self.timeout
+            future = pool.submit(run_with_deadline, deadline, memory_tracer.wrap("render", func), *args)
+            with span("render"):
+                try:
+                    return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout + WORKER_KILL_GRACE)
+                except asyncio.TimeoutError:
+                    if future.running():
+                        self._recycle_pool(pool)
+                    raise
+        finally:
+            with self._lock:
+                self._admitted -= 1
+
+    def _recycle_pool(self, pool: ProcessPoolExecutor):
+        # A worker stuck in native code ignored its deadline; replace the pool
+        with self._lock:
+            if self._pool is not pool:
+                return  # Already replaced
+            self._pool = None
+        logger.warning("A render worker ignored its deadline; replacing the render pool")
+        terminate_pool(pool)
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+            logger.info("Render pool shut down")
+
+pdf_renderer = PDFRenderer(
+    workers=settings.RENDER_WORKERS,
+    queue_size=settings.RENDER_QUEUE_SIZE,
+    timeout=settings.RENDER_TIMEOUT,
+    backend=settings.PDF_BACKEND,
+    invoice_backend=settings.INVOICE_PDF_BACKEND,
+    cache=pdf_cache,
+)
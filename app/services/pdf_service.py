@@ -1,18 +1,78 @@
+import asyncio
+import hashlib
 import logging
 import os
-import fitz  # PyMuPDF
+import tempfile
+import aiofiles
+from fastapi import UploadFile
 from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.executors import run_cpu_bound, run_io_bound
+from app.core.metrics import pdf_pages, stage_seconds
+from app.core.profiling import memory_tracer
 from app.models.invoice_pdf import InvoicePDF
-from datetime import datetime
+from app.services.dedup_cache import dedup_cache
+from app.utils.pdf_extract import extract_or_plan, extract_page_range, page_ranges
 
-# Configure logging
-logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
-def save_pdf_to_db(db: Session, filename: str, invoice_type: str, extracted_text: str | None):
+async def extract_pdf_text(source: bytes | bytearray | str, backend: str | None = None) -> str:
+    """
+    Extract PDF text in the process pool, sharding large documents by page range.
+
+    PDFs below PAGE_SHARD_THRESHOLD pages are extracted by a single worker in
+    one hop; larger ones are split into one page range per pool worker and
+    reassembled in page order. Shards read the PDF from a temporary file
+    written once, and each hop is stopped after EXTRACT_TIMEOUT seconds.
+
+    Args:
+        source (bytes | bytearray | str): PDF bytes or a path to the PDF.
+        backend (str | None): Extraction backend; defaults to PDF_EXTRACT_BACKEND.
+
+    Returns:
+        str: Text of all pages joined with newlines.
+    """
+    backend = backend or settings.PDF_EXTRACT_BACKEND
+    text, page_count, backend = await run_cpu_bound(
+        memory_tracer.wrap("extract", extract_or_plan), source, backend, settings.PAGE_SHARD_THRESHOLD,
+        timeout=settings.EXTRACT_TIMEOUT,
+    )
+    pdf_pages.observe(page_count)
+    if text is not None:
+        return text
+
+    ranges = page_ranges(page_count, settings.CPU_POOL_SIZE)
+    logger.info("Extracting %d pages in %d shards with %s", page_count, len(ranges), backend)
+    # Shards open one spooled copy of the PDF rather than each receiving its bytes through a pipe
+    spooled = await run_io_bound(_spool_pdf, source) if isinstance(source, (bytes, bytearray)) else None
+    try:
+        parts = await asyncio.gather(*(
+            run_cpu_bound(
+                memory_tracer.wrap("extract", extract_page_range), spooled or source, start, end, backend,
+                timeout=settings.EXTRACT_TIMEOUT,
+            )
+            for start, end in ranges
+        ), return_exceptions=True)  # Every shard is done with the file before it is removed
+    finally:
+        if spooled:
+            await run_io_bound(os.remove, spooled)
+    for part in parts:
+        if isinstance(part, BaseException):
+            raise part
+    return "\n".join(part for part in parts if part)
+
+def _spool_pdf(data: bytes | bytearray) -> str:
+    with tempfile.NamedTemporaryFile(prefix="shard-", suffix=".pdf", delete=False) as spool:
+        spool.write(data)
+    return spool.name
+
+def save_pdf_to_db(db: Session, filename: str, invoice_type: str, extracted_text: str | None,
+                   content_hash: str | None = None):
     """Save PDF details to the database."""
     try:
-        pdf_record = InvoicePDF(filename=filename, invoice_type=invoice_type, extracted_text=extracted_text)
+        pdf_record = InvoicePDF(
+            filename=filename, invoice_type=invoice_type, extracted_text=extracted_text, content_hash=content_hash
+        )
         db.add(pdf_record)
         db.commit()
         db.refresh(pdf_record)
@@ -22,60 +82,93 @@ def save_pdf_to_db(db: Session, filename: str, invoice_type: str, extracted_text
         logger.error("Failed to save PDF to database: %s", str(e))
         raise
 
-def process_pdf(pdf_file: bytes, filename: str, invoice_type: str, db: Session):
-    """Process uploaded PDF and save to database."""
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds its size limit."""
+
+async def save_upload(upload: UploadFile, filename: str, files_dir: str = "files",
+                      max_bytes: int | None = None) -> tuple[str, str, int]:
+    """
+    Stream an upload to files_dir in chunks, hashing it on the way.
+
+    The file is written to a .part path and renamed once complete, so a failed
+    or oversized upload never leaves a truncated file behind.
+
+    Args:
+        upload (UploadFile): Incoming multipart file.
+        filename (str): Target file name inside files_dir.
+        files_dir (str): Directory to save into.
+        max_bytes (int | None): Size limit; defaults to MAX_UPLOAD_BYTES.
+
+    Returns:
+        tuple: (saved path, SHA-256 hex digest, size in bytes).
+
+    Raises:
+        UploadTooLargeError: If the upload exceeds the size limit.
+    """
+    max_bytes = max_bytes or settings.MAX_UPLOAD_BYTES
+    os.makedirs(files_dir, exist_ok=True)
+    permanent_filepath = os.path.join(files_dir, os.path.basename(filename))
+    partial_filepath = f"{permanent_filepath}.part"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(partial_filepath, "wb") as f:
+            while chunk := await upload.read(settings.UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"Upload exceeds the {max_bytes} byte limit")
+                digest.update(chunk)
+                await f.write(chunk)
+        os.replace(partial_filepath, permanent_filepath)
+    except Exception:
+        if os.path.exists(partial_filepath):
+            os.remove(partial_filepath)
+        raise
+    logger.info("Saved PDF to permanent file: %s (%d bytes)", permanent_filepath, size)
+    return permanent_filepath, digest.hexdigest(), size
+
+def _lookup_text(db: Session, content_hash: str) -> str | None:
+    extracted_text = dedup_cache.get_text(db, content_hash)
+    db.commit()
+    return extracted_text
+
+def _store_pdf(db: Session, filename: str, invoice_type: str, content_hash: str,
+               extracted_text: str | None, from_cache: bool):
+    if extracted_text is not None and not from_cache:
+        dedup_cache.put_text(db, content_hash, extracted_text)
+    return save_pdf_to_db(db, filename, invoice_type, extracted_text, content_hash)
+
+async def process_pdf(pdf_path: str, content_hash: str, filename: str, invoice_type: str, db: Session):
+    """
+    Extract the text of a saved PDF and store it in the database.
+
+    Extraction runs in the process pool straight from the file, and the
+    blocking session work in the I/O pool, so the event loop never holds the
+    PDF in memory or waits on SQLite.
+    """
     try:
         logger.info("Processing PDF: %s, type: %s", filename, invoice_type)
-        # Validate input
-        if not isinstance(pdf_file, (bytes, bytearray)):
-            logger.error("Invalid PDF file type: %s", type(pdf_file))
-            raise ValueError(f"Expected bytes or bytearray, got {type(pdf_file)}")
         
-        # Create temporary directory
-        temp_dir = os.path.join("files", "temp_pdf")
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # Generate unique filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        temp_filename = f"{timestamp}_{filename}"
-        temp_filepath = os.path.join(temp_dir, temp_filename)
-        
-        # Save PDF to temporary file
-        with open(temp_filepath, "wb") as f:
-            f.write(pdf_file)
-            logger.info("Saved PDF to temporary file: %s", temp_filepath)
-        
-        # Save PDF to permanent files/ directory
-        files_dir = "files"
-        os.makedirs(files_dir, exist_ok=True)
-        permanent_filepath = os.path.join(files_dir, filename)
-        with open(permanent_filepath, "wb") as f:
-            f.write(pdf_file)
-            logger.info("Saved PDF to permanent file: %s", permanent_filepath)
-        
-        # Extract text from temporary PDF using PyMuPDF
-        extracted_text = None
-        logger.info("Opening PDF with PyMuPDF: %s", temp_filename)
-        with fitz.open(temp_filepath) as pdf:
-            logger.info("Extracting text from PDF: %s", temp_filename)
-            text = ""
-            for page in pdf:
-                page_text = page.get_text("text")
-                text += page_text or ""
-            extracted_text = text if text else None
+        # Reuse the text of a byte-identical PDF processed earlier
+        with stage_seconds.time("api", "dedup_lookup"):
+            extracted_text = await run_io_bound(_lookup_text, db, content_hash, timeout=settings.DB_TIMEOUT)
+        from_cache = extracted_text is not None
+        if from_cache:
+            logger.info("Reusing cached text for %s", filename)
+        else:
+            logger.info("Extracting text from PDF: %s", pdf_path)
+            with stage_seconds.time("api", "extract"):
+                extracted_text = await extract_pdf_text(pdf_path) or None
             logger.info("Extracted text length: %d characters", len(extracted_text or ""))
         
         # Save to database
-        save_pdf_to_db(db, filename, invoice_type, extracted_text)
+        with stage_seconds.time("api", "db_write"):
+            await run_io_bound(
+                _store_pdf, db, filename, invoice_type, content_hash, extracted_text, from_cache,
+                timeout=settings.DB_TIMEOUT
+            )
         logger.info("Processed PDF %s for invoice type %s", filename, invoice_type)
         
-        # Delete temporary file
-        try:
-            os.remove(temp_filepath)
-            logger.info("Deleted temporary PDF file: %s", temp_filepath)
-        except Exception as e:
-            logger.warning("Failed to delete temporary PDF file %s: %s", temp_filepath, str(e))
-        
         return {
             "filename": filename,
             "invoice_type": invoice_type,
@@ -84,11 +177,4 @@ def process_pdf(pdf_file: bytes, filename: str, invoice_type: str, db: Session):
         }
     except Exception as e:
         logger.error("Failed to process PDF %s: %s", filename, str(e))
-        # Attempt to delete temporary file in case of failure
-        if 'temp_filepath' in locals():
-            try:
-                os.remove(temp_filepath)
-                logger.info("Deleted temporary PDF file on error: %s", temp_filepath)
-            except Exception as e:
-                logger.warning("Failed to delete temporary PDF file on error %s: %s", temp_filepath, str(e))
         raise
\ No newline at end of file
@@ -0,0 +1,122 @@
+import base64
+import json
+import logging
+from datetime import date, datetime
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+from app.models.invoice_json import InvoiceJSON
+from app.models.invoice_pdf import InvoicePDF
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 200
+
+# Columns returned for list pages; json_data is only loaded for single records
+LIST_COLUMNS = (
+    InvoiceJSON.id, InvoiceJSON.invoice_type, InvoiceJSON.invoice_number, InvoiceJSON.issued_date,
+    InvoiceJSON.amount, InvoiceJSON.billed_to, InvoiceJSON.created_at,
+)
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+def encode_cursor(created_at: datetime, record_id: str) -> str:
+    """Encode the sort key of the last row of a page as an opaque cursor."""
+    raw = json.dumps([created_at.isoformat(), record_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """Decode a cursor produced by encode_cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, record_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(record_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError("Invalid cursor") from e
+
+def list_invoices(
+    db: Session,
+    invoice_type: str | None = None,
+    invoice_number: str | None = None,
+    billed_to: str | None = None,
+    amount_min: float | None = None,
+    amount_max: float | None = None,
+    issued_from: date | None = None,
+    issued_to: date | None = None,
+    limit: int = 50,
+    cursor: str | None = None,
+) -> dict:
+    """
+    Return one page of parsed invoices, newest first, using keyset pagination.
+
+    Pages are addressed by the (created_at, id) of the last row returned, so
+    every page is an index range scan no matter how deep it is.
+
+    Args:
+        db (Session): Database session.
+        invoice_type (str | None): Exact invoice type.
+        invoice_number (str | None): Exact invoice number.
+        billed_to (str | None): Prefix of the billed party.
+        amount_min (float | None): Inclusive lower bound on the amount.
+        amount_max (float | None): Inclusive upper bound on the amount.
+        issued_from (date | None): Inclusive lower bound on the issue date.
+        issued_to (date | None): Inclusive upper bound on the issue date.
+        limit (int): Page size, capped at MAX_PAGE_SIZE.
+        cursor (str | None): next_cursor of the previous page.
+
+    Returns:
+        dict: items and next_cursor (None on the last page).
+
+    Raises:
+        InvalidCursorError: If the cursor cannot be decoded.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = select(*LIST_COLUMNS)
+    if invoice_type:
+        query = query.where(InvoiceJSON.invoice_type == invoice_type)
+    if invoice_number:
+        query = query.where(InvoiceJSON.invoice_number == invoice_number)
+    if billed_to:
+        # Range form of a prefix match, so the billed_to index is used
+        query = query.where(InvoiceJSON.billed_to >= billed_to, InvoiceJSON.billed_to < billed_to + "\uffff")
+    if amount_min is not None:
+        query = query.where(InvoiceJSON.amount >= amount_min)
+    if amount_max is not None:
+        query = query.where(InvoiceJSON.amount <= amount_max)
+    if issued_from is not None:
+        query = query.where(InvoiceJSON.issued_date >= issued_from)
+    if issued_to is not None:
+        query = query.where(InvoiceJSON.issued_date <= issued_to)
+    if cursor:
+        created_at, record_id = decode_cursor(cursor)
+        query = query.where(tuple_(InvoiceJSON.created_at, InvoiceJSON.id) < tuple_(created_at, record_id))
+
+    rows = db.execute(
+        query.order_by(InvoiceJSON.created_at.desc(), InvoiceJSON.id.desc()).limit(limit + 1)
+    ).all()
+    next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+    return {"items": [row._asdict() for row in rows[:limit]], "next_cursor": next_cursor}
+
+def get_invoice(db: Session, invoice_id: str) -> dict | None:
+    """
+    Return a parsed invoice with its full JSON and the PDFs it was parsed from.
+
+    Args:
+        db (Session): Database session.
+        invoice_id (str): InvoiceJSON id.
+
+    Returns:
+        dict | None: The record, or None if it does not exist.
+    """
+    invoice_json = db.get(InvoiceJSON, invoice_id)
+    if invoice_json is None:
+        return None
+    pdfs = db.execute(
+        select(InvoicePDF.id, InvoicePDF.filename, InvoicePDF.created_at)
+        .where(InvoicePDF.invoice_json_id == invoice_id)
+        .order_by(InvoicePDF.created_at)
+    ).all()
+    record = {column.key: getattr(invoice_json, column.key) for column in LIST_COLUMNS}
+    record["data"] = json.loads(invoice_json.json_data)
+    record["pdfs"] = [row._asdict() for row in pdfs]
+    return record
@@ -0,0 +1,114 @@
+import html
+import logging
+import re
+from sqlalchemy import DateTime, text
+from sqlalchemy.orm import Session
+from app.core.db_config import IS_SQLITE, SEARCH_TABLE, async_session_scope
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 50
+MAX_OFFSET = 1000
+SNIPPET_TOKENS = 16
+
+# Markers snippet() puts around matched terms; swapped for tags after HTML escaping
+_MATCH_START, _MATCH_END = "\x02", "\x03"
+_TERM_RE = re.compile(r"\w+\*?")
+
+_SEARCH_SQL = f"""
+    SELECT p.id, p.filename, p.invoice_type, p.invoice_json_id, p.created_at,
+           snippet({SEARCH_TABLE}, 1, '{_MATCH_START}', '{_MATCH_END}', '...', {SNIPPET_TOKENS}) AS snippet
+    FROM {SEARCH_TABLE}
+    JOIN invoice_pdfs AS p ON p.rowid = {SEARCH_TABLE}.rowid
+    WHERE {SEARCH_TABLE} MATCH :match {{type_filter}}
+    ORDER BY bm25({SEARCH_TABLE}, 2.0, 1.0)
+    LIMIT :limit OFFSET :offset
+"""
+
+class SearchUnavailableError(Exception):
+    """Raised when the database has no full-text index (only SQLite has one)."""
+
+class InvalidSearchQueryError(ValueError):
+    """Raised when a search query contains no searchable terms."""
+
+def build_match_query(query: str) -> str:
+    """
+    Turn free text into an FTS5 query matching all of its words.
+
+    Each word is quoted so punctuation and FTS5 operators in user input cannot
+    break the query; a trailing * keeps its prefix-match meaning.
+    """
+    terms = _TERM_RE.findall(query)
+    if not terms:
+        raise InvalidSearchQueryError("Search query has no searchable terms")
+    return " ".join(f'"{term[:-1]}"*' if term.endswith("*") else f'"{term}"' for term in terms)
+
+def highlight(snippet: str, start: str, end: str) -> str:
+    """HTML-escape a snippet and wrap its matched terms in the given tags."""
+    return html.escape(snippet or "").replace(_MATCH_START, start).replace(_MATCH_END, end)
+
+def search_invoices(
+    db: Session,
+    query: str,
+    invoice_type: str | None = None,
+    limit: int = 10,
+    offset: int = 0,
+    start: str = "<mark>",
+    end: str = "</mark>",
+    chat_id: str | None = None,
+) -> dict:
+    """
+    Full-text search over invoice text and filenames, best matches first.
+
+    Args:
+        db (Session): Database session.
+        query (str): Words to search for; all must match. word* matches a prefix.
+        invoice_type (str | None): Restrict results to one invoice type.
+        limit (int): Page size, capped at MAX_PAGE_SIZE.
+        offset (int): Results to skip, capped at MAX_OFFSET.
+        start (str): Tag opening each highlighted term in the snippet.
+        end (str): Tag closing each highlighted term in the snippet.
+        chat_id (str | None): Restrict results to PDFs uploaded from this Telegram chat.
+
+    Returns:
+        dict: items (with an HTML snippet) and next_offset (None on the last page).
+
+    Raises:
+        SearchUnavailableError: If the database is not SQLite.
+        InvalidSearchQueryError: If the query has no searchable terms.
+    """
+    if not IS_SQLITE:
+        raise SearchUnavailableError("Full-text search requires the SQLite database")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    offset = max(0, min(offset, MAX_OFFSET))
+    params = {"match": build_match_query(query), "limit": limit + 1, "offset": offset}
+    type_filter = ""
+    if invoice_type:
+        type_filter = "AND p.invoice_type = :invoice_type"
+        params["invoice_type"] = invoice_type
+    if chat_id is not None:
+        type_filter += " AND p.chat_id = :chat_id"
+        params["chat_id"] = chat_id
+
+    statement = text(_SEARCH_SQL.format(type_filter=type_filter)).columns(created_at=DateTime)
+    rows = db.execute(statement, params).mappings().all()
+    items = [
+        {**row, "snippet": highlight(row["snippet"], start, end)}
+        for row in rows[:limit]
+    ]
+    next_offset = offset + limit if len(rows) > limit and offset + limit <= MAX_OFFSET else None
+    return {"items": items, "next_offset": next_offset}
+
+async def find_invoices(query: str, chat_id: str | None, limit: int, offset: int = 0,
+                        start: str = "<b>", end: str = "</b>") -> dict:
+    """
+    Run search_invoices in its own async session, for the bot.
+
+    Args:
+        chat_id (str | None): Only search PDFs uploaded from this chat; None searches every invoice.
+
+    Returns:
+        dict: items and next_offset, as returned by search_invoices.
+    """
+    async with async_session_scope() as db:
+        return await db.run_sync(search_invoices, query, None, limit, offset, start, end, chat_id)
@@ -1,9 +1,6 @@
 import logging
 import os
 
-# Configure logging
-logging.basicConfig(level=logging.WARNING)
-logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 def save_uploaded_pdf(file_path):
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import threading
+from telegram import Update
+from telegram.ext import Application
+from app.core.config import settings
+from app.core.db_config import dispose_async_engine
+from app.core.db_writer import db_writer
+from app.core.profiling import slow_request_tracker
+from app.services.bot_commands import register_bot_commands
+from app.services.bot_persistence import create_bot_persistence
+from app.services.gemini_service import gemini_client
+from app.services.job_queue import ingestion_queue
+from app.services.telegram_handler import setup_telegram_handlers
+
+logger = logging.getLogger(__name__)
+
+class BotMode:
+    POLLING = "polling"
+    WEBHOOK = "webhook"
+
+class TrackedApplication(Application):
+    """Application reporting the updates that take longer than SLOW_REQUEST_SECONDS."""
+
+    __slots__ = ()
+
+    async def process_update(self, update: object):
+        # Runs in the update's own task, so the trace covers all of its handlers
+        if slow_request_tracker.threshold <= 0:
+            await super().process_update(update)
+            return
+        async with slow_request_tracker.track("bot", _describe_update(update)):
+            await super().process_update(update)
+
+def _describe_update(update: object) -> str:
+    if not isinstance(update, Update):
+        return type(update).__name__
+    message = update.effective_message
+    if update.callback_query is not None:
+        kind = "callback_query"
+    elif message is not None and message.document is not None:
+        kind = "document"
+    elif message is not None and message.text and message.text.startswith("/"):
+        kind = message.text.split()[0]
+    else:
+        kind = "message"
+    return f"{kind} (update {update.update_id})"
+
+# Initialize Telegram bot application
+_builder = (
+    Application.builder()
+    .application_class(TrackedApplication)
+    .token(settings.TELEGRAM_BOT_TOKEN)
+    .concurrent_updates(settings.BOT_CONCURRENT_UPDATES)
+)
+_persistence = create_bot_persistence(
+    settings.BOT_PERSISTENCE, settings.BOT_PERSISTENCE_PATH, settings.BOT_PERSISTENCE_INTERVAL
+)
+if _persistence is not None:
+    _builder = _builder.persistence(_persistence)
+telegram_app = _builder.build()
+
+async def _start_pipeline():
+    # Handlers first, so initialize() restores the persisted conversations into them
+    setup_telegram_handlers(telegram_app)
+    await telegram_app.initialize()
+    await register_bot_commands()
+    # Resume persisted jobs and start the ingestion workers on the bot loop
+    await ingestion_queue.start(telegram_app.bot)
+
+async def _stop_pipeline():
+    await ingestion_queue.stop()
+    # Writes the persisted bot data a last time, so it runs before the engine is disposed
+    await telegram_app.shutdown()
+    await gemini_client.aclose()
+    await db_writer.aclose()
+    # Only this loop's engine; the REST side keeps its own
+    await dispose_async_engine()
+
+# Loop of the polling thread and the event that ends polling on it
+_polling_loop: asyncio.AbstractEventLoop | None = None
+_polling_stop: asyncio.Event | None = None
+_stop_requested = threading.Event()
+
+def run_polling():
+    """
+    Run Telegram bot polling in a separate event loop, on its own thread, until stop_polling().
+
+    Application.run_polling() is not used: it installs signal handlers, which
+    only works on the main thread, and closes the loop itself. The application
+    is started and stopped step by step on this thread's loop instead.
+    """
+    global _polling_loop, _polling_stop
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    _polling_stop = asyncio.Event()
+    _polling_loop = loop
+    try:
+        # Checked after the loop is published, so a stop_polling() racing with startup is not lost
+        if not _stop_requested.is_set():
+            loop.run_until_complete(_poll_until_stopped())
+    except Exception as e:
+        logger.error("Polling error: %s", str(e))
+    finally:
+        _polling_loop = None
+        loop.close()
+
+async def _poll_until_stopped():
+    try:
+        await _start_pipeline()
+        await telegram_app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+        await telegram_app.start()
+        logger.info("Telegram bot polling started")
+        await _polling_stop.wait()
+    finally:
+        # Ensure clean shutdown
+        if telegram_app.updater.running:
+            await telegram_app.updater.stop()
+        if telegram_app.running:
+            await telegram_app.stop()
+        await _stop_pipeline()
+        logger.info("Telegram bot polling stopped")
+
+def stop_polling():
+    """Ask the polling thread to stop; run_polling() returns once the bot has shut down."""
+    _stop_requested.set()
+    loop = _polling_loop
+    if loop is not None:
+        try:
+            loop.call_soon_threadsafe(_polling_stop.set)
+        except RuntimeError:
+            pass  # The loop already closed
+
+async def start_webhook():
+    """
+    Start the bot on the running loop and point Telegram's webhook at this app.
+
+    Updates arrive through the webhook route and are put on the application's
+    update_queue, which is processed with BOT_CONCURRENT_UPDATES concurrent
+    handlers. Every replica registers the same URL and secret, so any of them
+    can take the next update.
+
+    Raises:
+        RuntimeError: If WEBHOOK_URL or WEBHOOK_SECRET is not set.
+    """
+    if not settings.WEBHOOK_URL or not settings.WEBHOOK_SECRET:
+        raise RuntimeError("BOT_MODE=webhook needs WEBHOOK_URL and WEBHOOK_SECRET")
+    await _start_pipeline()
+    await telegram_app.bot.set_webhook(
+        url=settings.WEBHOOK_URL.rstrip("/") + settings.WEBHOOK_PATH,
+        secret_token=settings.WEBHOOK_SECRET,
+        allowed_updates=Update.ALL_TYPES,
+        max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+    )
+    await telegram_app.start()
+    logger.info("Telegram webhook set to %s%s", settings.WEBHOOK_URL, settings.WEBHOOK_PATH)
+
+async def stop_webhook():
+    """Stop processing updates; the webhook stays registered for the other replicas."""
+    await telegram_app.stop()
+    await _stop_pipeline()
+    logger.info("Telegram webhook processing stopped")
+
+async def enqueue_update(data: dict):
+    """Decode an update posted to the webhook and queue it for the handlers."""
+    update = Update.de_json(data, telegram_app.bot)
+    await telegram_app.update_queue.put(update)
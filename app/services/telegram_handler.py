@@ -1,29 +1,39 @@
+import asyncio
+import hashlib
+import html
 import logging
+import math
 import re
-import os
-import json
 from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ConversationHandler, filters
+from telegram.constants import ParseMode
+from telegram.ext import (
+    Application, CommandHandler, MessageHandler, CallbackQueryHandler, ConversationHandler, TypeHandler, filters
+)
 from app.core.config import settings
-from app.services.telegram import save_uploaded_pdf
-from app.core.db_config import get_db
-from app.models.invoice_pdf import InvoicePDF
-from app.models.invoice_json import InvoiceJSON
-from app.services.gemini_service import process_text_with_gemini
-from app.utils.file_utils import delete_file
-from app.utils.keyboard_utils import get_invoice_keyboard
+from app.core.logging import bind_log_context
+from app.core.metrics import pdf_bytes, rate_limit_rejections, stage_seconds
+from app.core.rate_limit import upload_rate_limiter
+from app.services.dedup_cache import find_processed_upload
+from app.services.job_queue import ingestion_queue, ChatQuotaError, QueueFullError
+from app.services.search import find_invoices, InvalidSearchQueryError, SearchUnavailableError
+from app.utils.keyboard_utils import (
+    INVOICE_OPTIONS, SEARCH_CALLBACK_PREFIX, get_invoice_keyboard, get_search_keyboard
+)
 from datetime import datetime
-import pdfplumber
-from sqlalchemy.orm import Session
 
-# Configure logging
-logging.basicConfig(level=logging.WARNING)
-logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 # Conversation states
 SELECT_INVOICE, AWAITING_PDF = range(2)
 
+# Search results per bot message
+SEARCH_PAGE_SIZE = 5
+
+async def bind_update_context(update: Update, context):
+    """Tag the records logged while handling this update with its update and chat ids."""
+    chat = update.effective_chat
+    bind_log_context(update_id=update.update_id, chat_id=chat.id if chat else None)
+
 async def invoices_handler(update: Update, context):
     """Handle /invoices command or 'invoices' text message."""
     reply_markup = get_invoice_keyboard()
@@ -40,6 +50,9 @@ async def callback_query_handler(update: Update, context):
     await query.answer()  # Acknowledge the callback
     invoice_type = query.data
     context.user_data['invoice_type'] = invoice_type  # Store selected invoice type
+    if context.application.persistence:
+        # Write through at once, so the upload can be handled by any worker or replica
+        await context.application.persistence.update_user_data(update.effective_user.id, context.user_data)
     await query.message.reply_text(
         f"You selected: {invoice_type.replace('_', ' ').title()}. Please upload a PDF file."
     )
@@ -52,93 +65,67 @@ async def handle_pdf_upload(update: Update, context):
         await update.message.reply_text("Please upload a valid PDF file.")
         return AWAITING_PDF
 
-    invoice_type = context.user_data.get('invoice_type')
+    # Taken for this upload only; the next one needs a new selection
+    invoice_type = context.user_data.pop('invoice_type', None)
     if not invoice_type:
         await update.message.reply_text("No invoice type selected. Please start again with /invoices or 'invoices'.")
         return ConversationHandler.END
 
-    file = await update.message.document.get_file()
+    # Per-chat upload limit, checked before anything is downloaded
+    limit = await upload_rate_limiter.hit(str(update.message.chat_id))
+    if not limit.allowed:
+        rate_limit_rejections.inc("upload")
+        await update.message.reply_text(
+            f"You are uploading too fast. Please wait {math.ceil(limit.retry_after)} seconds and send the PDF again."
+        )
+        logger.info("Upload rate limit exceeded for chat_id: %s", update.message.chat_id)
+        context.user_data['invoice_type'] = invoice_type  # Keep the selection for the retry
+        return AWAITING_PDF
+
     file_name = update.message.document.file_name or "invoice"
     current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
     formatted_file_name = f"{file_name}_{invoice_type}_{current_time}.pdf"
 
-    # Download the PDF file
-    pdf_path = os.path.join("files", "temp_pdf", formatted_file_name)
-    os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
-    await file.download_to_drive(pdf_path)
-
     try:
-        # Save the PDF
-        save_uploaded_pdf(pdf_path)
-        logger.info("PDF saved to %s", pdf_path)
-        await update.message.reply_text("Processing...")
-
-        # Extract text from PDF
-        extracted_text = []
-        try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    text = page.extract_text()
-                    if text:
-                        extracted_text.append(text)
-            extracted_text = "\n".join(extracted_text)  # Combine text from all pages
-            logger.info("PDF text extracted for %s", pdf_path)
-        except Exception as e:
-            logger.error("Failed to extract PDF text: %s", str(e))
-            await update.message.reply_text(f"Failed to extract PDF text: {str(e)}")
-            return ConversationHandler.END
-
-        # Save to invoice_pdfs table
-        db = next(get_db())
-        try:
-            invoice_pdf = InvoicePDF(
-                filename=formatted_file_name,
-                invoice_type=invoice_type,
-                extracted_text=extracted_text
+        # Download the PDF into memory; it is stored with the job, not on disk
+        with stage_seconds.time("bot", "download"):
+            file = await update.message.document.get_file()
+            pdf_data = bytes(await file.download_as_bytearray())
+        pdf_bytes.observe(len(pdf_data), "bot")
+        logger.info("PDF downloaded: %s (%d bytes)", formatted_file_name, len(pdf_data))
+
+        # Duplicate uploads are answered from the dedup cache without extraction or Gemini
+        content_hash = hashlib.sha256(pdf_data).hexdigest()
+        with stage_seconds.time("bot", "dedup_lookup"):
+            cached_json = await asyncio.wait_for(
+                find_processed_upload(content_hash, invoice_type), settings.DB_TIMEOUT
             )
-            db.add(invoice_pdf)
-            db.commit()
-            logger.info("Saved invoice data to database for %s", formatted_file_name)
-        except Exception as e:
-            db.rollback()
-            logger.error("Failed to save to invoice_pdfs: %s", str(e))
-            await update.message.reply_text(f"Failed to save invoice data: {str(e)}")
+        if cached_json is not None:
+            invoice_type_display = invoice_type.replace('_', ' ').title()
+            invoice_number = cached_json.get("invoice_number")
+            suffix = f" (invoice {invoice_number})" if invoice_number else ""
+            with stage_seconds.time("bot", "reply"):
+                await update.message.reply_text(f"Record already saved in {invoice_type_display} table{suffix}")
+            logger.info("Duplicate upload %s served from cache", formatted_file_name)
             return ConversationHandler.END
 
-        # Delete the original PDF
+        # Hand the PDF to the ingestion queue; workers reply when it is done
         try:
-            await delete_file(pdf_path)
-        except Exception as e:
-            await update.message.reply_text(f"Failed to delete PDF: {str(e)}")
-            return ConversationHandler.END
-
-        # Send extracted text to Gemini API
-        try:
-            gemini_json = await process_text_with_gemini(extracted_text, invoice_type, formatted_file_name)
-        except Exception as e:
-            await update.message.reply_text(f"Failed to process text with Gemini: {str(e)}")
-            return ConversationHandler.END
-
-        # Save Gemini JSON response to invoice_jsons table
-        try:
-            invoice_json = InvoiceJSON(
-                invoice_type=invoice_type,
-                json_data=json.dumps(gemini_json, indent=2, ensure_ascii=False)
+            with stage_seconds.time("bot", "enqueue"):
+                position = await ingestion_queue.submit(
+                    update.message.chat_id, formatted_file_name, invoice_type, pdf_data, content_hash
+                )
+        except ChatQuotaError:
+            await update.message.reply_text(
+                f"You already have {settings.QUEUE_MAX_PER_CHAT} invoices in progress. "
+                "Please wait for them to finish; use /status to check."
             )
-            db.add(invoice_json)
-            db.commit()
-            logger.info("Saved Gemini JSON to database for invoice_type: %s", invoice_type)
-        except Exception as e:
-            db.rollback()
-            logger.error("Failed to save to invoice_jsons: %s", str(e))
-            await update.message.reply_text(f"Failed to save Gemini JSON: {str(e)}")
             return ConversationHandler.END
-        finally:
-            db.close()
-
-        # Send success message to Telegram
-        invoice_type_display = invoice_type.replace('_', ' ').title()
-        await update.message.reply_text(f"Record Saved into {invoice_type_display} table")
+        except QueueFullError:
+            await update.message.reply_text("The processing queue is full. Please try again in a few minutes.")
+            return ConversationHandler.END
+        with stage_seconds.time("bot", "reply"):
+            await update.message.reply_text(f"Queued, position {position}. Use /status to check progress.")
 
     except Exception as e:
         await update.message.reply_text(f"Failed to process PDF: {str(e)}")
@@ -147,6 +134,64 @@ async def handle_pdf_upload(update: Update, context):
 
     return ConversationHandler.END
 
+async def status_handler(update: Update, context):
+    """Handle /status command: report the chat's recent ingestion jobs."""
+    jobs = await ingestion_queue.chat_status(update.message.chat_id)
+    if not jobs:
+        await update.message.reply_text("No invoices submitted yet. Start with /invoices.")
+        return
+
+    lines = []
+    for job in jobs:
+        line = f"{job['filename']}: {job['status']}"
+        if job["position"] is not None:
+            line += f" (position {job['position']})"
+        elif job["error"]:
+            line += f" - {job['error']}"
+        lines.append(line)
+    await update.message.reply_text("\n".join(lines))
+
+async def _send_search_page(message, query: str, offset: int):
+    # Each chat searches the invoices it uploaded; only the admin chat (CHAT_ID) searches them all
+    chat_id = str(message.chat_id)
+    scope = None if chat_id == str(settings.CHAT_ID) else chat_id
+    try:
+        page = await asyncio.wait_for(find_invoices(query, scope, SEARCH_PAGE_SIZE, offset), settings.DB_TIMEOUT)
+    except (InvalidSearchQueryError, SearchUnavailableError) as e:
+        await message.reply_text(str(e))
+        return
+    if not page["items"]:
+        await message.reply_text("No matching invoices." if offset == 0 else "No more results.")
+        return
+
+    lines = []
+    for number, item in enumerate(page["items"], start=offset + 1):
+        invoice_type_display = item["invoice_type"].replace('_', ' ').title()
+        lines.append(f"{number}. <b>{html.escape(item['filename'])}</b> ({invoice_type_display})\n{item['snippet']}")
+    reply_markup = get_search_keyboard(page["next_offset"]) if page["next_offset"] is not None else None
+    await message.reply_text("\n\n".join(lines), parse_mode=ParseMode.HTML, reply_markup=reply_markup)
+
+async def search_handler(update: Update, context):
+    """Handle /search command: full-text search over stored invoice text."""
+    query = " ".join(context.args or [])
+    if not query:
+        await update.message.reply_text("Usage: /search <words>, e.g. /search acme consulting")
+        return
+    context.user_data['search_query'] = query  # Callback data is too small to carry the query
+    await _send_search_page(update.message, query, 0)
+    logger.info("Search from chat_id %s: %s", update.message.chat_id, query)
+
+async def search_more_handler(update: Update, context):
+    """Handle the "More results" button of a search reply."""
+    query = update.callback_query
+    await query.answer()
+    search_query = context.user_data.get('search_query')
+    if not search_query:
+        await query.message.reply_text("This search has expired. Please run /search again.")
+        return
+    offset = int(query.data.removeprefix(SEARCH_CALLBACK_PREFIX))
+    await _send_search_page(query.message, search_query, offset)
+
 async def cancel(update: Update, context):
     """Cancel the conversation."""
     await update.message.reply_text("Operation cancelled.")
@@ -155,6 +200,9 @@ async def cancel(update: Update, context):
 
 def setup_telegram_handlers(application: Application):
     """Set up Telegram bot handlers."""
+    # Runs first, in the task that handles the update, so the ids reach every later handler
+    application.add_handler(TypeHandler(Update, bind_update_context), group=-1)
+    invoice_type_pattern = f"^({'|'.join(option['callback_data'] for option in INVOICE_OPTIONS)})$"
     # Conversation handler for invoice selection and PDF upload
     conv_handler = ConversationHandler(
         entry_points=[
@@ -162,11 +210,20 @@ def setup_telegram_handlers(application: Application):
             MessageHandler(filters.TEXT & filters.Regex(re.compile(r'^invoices$', re.IGNORECASE)), invoices_handler),
         ],
         states={
-            SELECT_INVOICE: [CallbackQueryHandler(callback_query_handler)],
+            SELECT_INVOICE: [CallbackQueryHandler(callback_query_handler, pattern=invoice_type_pattern)],
             AWAITING_PDF: [MessageHandler(filters.Document.PDF, handle_pdf_upload)],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
-        per_message=False  # Disable per-message tracking for CallbackQueryHandler
+        per_message=False,  # Disable per-message tracking for CallbackQueryHandler
+        name="invoice_upload",
+        persistent=application.persistence is not None,
     )
     application.add_handler(conv_handler)
+    # Conversation state is per process; with webhook replicas the selection and the upload can reach
+    # different ones, which then go by the persisted user_data instead
+    application.add_handler(CallbackQueryHandler(callback_query_handler, pattern=invoice_type_pattern))
+    application.add_handler(MessageHandler(filters.Document.PDF, handle_pdf_upload))
+    application.add_handler(CommandHandler("status", status_handler))
+    application.add_handler(CommandHandler("search", search_handler))
+    application.add_handler(CallbackQueryHandler(search_more_handler, pattern=rf"^{SEARCH_CALLBACK_PREFIX}\d+$"))
     logger.info("Telegram handlers set up successfully")
\ No newline at end of file
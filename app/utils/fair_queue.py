@@ -0,0 +1,41 @@
+import asyncio
+from collections import OrderedDict, deque
+
+class FairQueue:
+    """
+    Asyncio queue that serves its keys round-robin.
+
+    Items are kept in a FIFO per key (a Telegram chat), and get() takes one
+    item from each key in turn, so a key with many queued items cannot delay
+    the others by more than one item per turn. Order is kept within a key.
+    """
+
+    def __init__(self):
+        self._queues: OrderedDict[str, deque] = OrderedDict()
+        self._items = asyncio.Semaphore(0)
+        self._size = 0
+
+    def put_nowait(self, key: str, item):
+        """Append an item to its key's FIFO."""
+        self._queues.setdefault(key, deque()).append(item)
+        self._size += 1
+        self._items.release()
+
+    async def get(self):
+        """Remove and return the next item, waiting until one is available."""
+        await self._items.acquire()
+        key, items = next(iter(self._queues.items()))
+        item = items.popleft()
+        self._size -= 1
+        if items:
+            self._queues.move_to_end(key)  # This key's turn is over
+        else:
+            del self._queues[key]
+        return item
+
+    def qsize(self) -> int:
+        return self._size
+
+    def key_sizes(self) -> dict[str, int]:
+        """Return the number of queued items per key."""
+        return {key: len(items) for key, items in self._queues.items()}
@@ -2,8 +2,6 @@ import logging
 import os
 import aiofiles.os
 
-# Configure logging
-logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
 async def delete_file(file_path: str):
@@ -0,0 +1,94 @@
+import json
+import re
+from datetime import date, datetime
+
+# Keys Gemini uses for each promoted field, in order of preference
+FIELD_ALIASES = {
+    "invoice_number": ("invoice_number", "invoice_no", "invoice_id", "number"),
+    "issued_date": ("issued_date", "issue_date", "invoice_date", "date"),
+    "amount": ("amount", "total_amount", "total", "amount_due", "grand_total"),
+    "billed_to": ("billed_to", "bill_to", "customer", "client", "customer_name"),
+}
+
+DATE_FORMATS = (
+    "%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y", "%d.%m.%Y",
+    "%B %d, %Y", "%b %d, %Y", "%d %B %Y", "%d %b %Y",
+)
+
+_AMOUNT_RE = re.compile(r"-?\d[\d.,]*")
+
+def compact_json(data: dict) -> str:
+    """Serialize JSON without indentation or padding for storage."""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+def _first(data: dict, field: str):
+    for key in FIELD_ALIASES[field]:
+        value = data.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+def parse_date(value) -> date | None:
+    """Parse an invoice date in the common formats Gemini returns, or return None."""
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def _normalize_amount(number: str) -> str:
+    """Drop the thousands separators of "1.234,50" or "1,234.50", making the decimal separator a dot."""
+    number = number.rstrip(".,")
+    last = max(number.rfind("."), number.rfind(","))
+    if last < 0:
+        return number
+    separator = number[last]
+    other = "," if separator == "." else "."
+    fraction = number[last + 1:]
+    # The last separator is the decimal one after the other kind ("1.234,50"), or when it occurs once
+    # and is a dot ("12.5") or a comma not followed by exactly three digits ("12,50"; "1,234" is thousands)
+    if other in number or (number.count(separator) == 1 and (separator == "." or len(fraction) != 3)):
+        return number[:last].replace(".", "").replace(",", "") + "." + fraction
+    return number.replace(separator, "")
+
+def parse_amount(value) -> float | None:
+    """Parse a number or a formatted amount such as "$1,234.50" or "1.234,50 €", or return None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict):
+        return parse_amount(value.get("value", value.get("amount")))
+    if not isinstance(value, str):
+        return None
+    match = _AMOUNT_RE.search(value)
+    return float(_normalize_amount(match.group())) if match else None
+
+def _text(value) -> str | None:
+    if isinstance(value, dict):
+        value = value.get("name") or value.get("company") or next(iter(value.values()), None)
+    if value is None or isinstance(value, (list, dict)):
+        return None
+    return str(value).strip() or None
+
+def extract_invoice_fields(data: dict) -> dict:
+    """
+    Pull the key invoice fields out of a Gemini JSON object.
+
+    Args:
+        data (dict): Parsed Gemini JSON.
+
+    Returns:
+        dict: invoice_number, issued_date, amount and billed_to, each None when
+        missing or unparseable.
+    """
+    return {
+        "invoice_number": _text(_first(data, "invoice_number")),
+        "issued_date": parse_date(_first(data, "issued_date")),
+        "amount": parse_amount(_first(data, "amount")),
+        "billed_to": _text(_first(data, "billed_to")),
+    }
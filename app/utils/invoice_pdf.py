@@ -0,0 +1,95 @@
+from html import escape
+from io import BytesIO
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+from app.utils.invoice_template import CURRENCY, render_invoice_html
+from app.utils.pdf import HTML_BACKENDS, render_pdf
+
+# Backends that can render an invoice draft, selected by INVOICE_PDF_BACKEND
+INVOICE_BACKENDS = ("reportlab", *HTML_BACKENDS)
+
+_STYLES = getSampleStyleSheet()
+_TABLE_STYLE = TableStyle([
+    ("FONTNAME", (0, 0), (-1, -1), "Helvetica"),
+    ("FONTSIZE", (0, 0), (-1, -1), 9),
+    ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#007bff")),
+    ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+    ("GRID", (0, 0), (-1, -1), 0.5, colors.HexColor("#dddddd")),
+    ("VALIGN", (0, 0), (-1, -1), "TOP"),
+    ("ALIGN", (2, 1), (-1, -1), "RIGHT"),
+])
+_COLUMN_WIDTHS = [12 * mm, 88 * mm, 15 * mm, 30 * mm, 30 * mm]
+
+def _money(value: float) -> str:
+    return f"{value:,.2f}"
+
+def render_invoice_reportlab(details: dict) -> bytes:
+    """
+    Draw an invoice draft with ReportLab directly, skipping HTML and CSS parsing.
+
+    Lays out the same content as app/templates/invoice.html, with the header
+    row repeated on every page.
+
+    Args:
+        details (dict): Invoice details as returned by get_invoice_details.
+
+    Returns:
+        bytes: The PDF document.
+    """
+    body = _STYLES["BodyText"]
+    issued_to = details["issued_to"]
+    bank = details["bank_details"]
+    story = [
+        Paragraph("Invoice", _STYLES["Title"]),
+        Paragraph("Invoice Details", _STYLES["Heading2"]),
+        Paragraph(f"<b>Date Issued:</b> {escape(details['date_issued'])}", body),
+        Paragraph(f"<b>Invoice No:</b> {escape(details['invoice_number'])}", body),
+        Paragraph(f"<b>Issued to:</b> {escape(issued_to['name'])}, {escape(issued_to['address'])}", body),
+        Paragraph(f"<b>Bank Name:</b> {escape(bank['bank_name'])}", body),
+        Paragraph(f"<b>Account No:</b> {escape(bank['account_no'])}", body),
+        Spacer(1, 6 * mm),
+    ]
+    rows = [["NO", "DESCRIPTION", "QTY", f"PRICE ({CURRENCY})", f"SUBTOTAL ({CURRENCY})"]]
+    rows.extend(
+        [
+            str(row["no"]),
+            Paragraph(escape(row["description"]), body),
+            str(row["quantity"]),
+            _money(row["price"]),
+            _money(row["subtotal"]),
+        ]
+        for row in details["table_data"]
+    )
+    story.append(Table(rows, colWidths=_COLUMN_WIDTHS, repeatRows=1, style=_TABLE_STYLE))
+    story.append(Spacer(1, 4 * mm))
+    story.append(Paragraph(
+        f"<para alignment='right'><b>GRAND TOTAL: {CURRENCY} {_money(details['grand_total'])}</b></para>", body
+    ))
+
+    output = BytesIO()
+    SimpleDocTemplate(output, pagesize=A4, title=details["invoice_number"]).build(story)
+    return output.getvalue()
+
+def render_invoice(details: dict, backend: str = "reportlab") -> bytes:
+    """
+    Render an invoice draft to PDF bytes with the given backend.
+
+    Runs in a render worker process, so it must stay a module-level function.
+
+    Args:
+        details (dict): Invoice details as returned by get_invoice_details.
+        backend (str): "reportlab", or an HTML backend to render the invoice template with.
+
+    Returns:
+        bytes: The PDF document.
+
+    Raises:
+        PDFRenderError: If the backend reports an error.
+        ValueError: If the backend is unknown.
+    """
+    if backend == "reportlab":
+        return render_invoice_reportlab(details)
+    return render_pdf(render_invoice_html(details), backend)
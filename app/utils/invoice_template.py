@@ -0,0 +1,53 @@
+from functools import lru_cache
+from html import escape
+from pathlib import Path
+from string import Template
+
+TEMPLATE_DIR = Path(__file__).resolve().parent.parent / "templates"
+
+# The PDF fonts have no glyph for the rupee sign, so amounts are labelled in text
+CURRENCY = "Rs."
+
+@lru_cache(maxsize=None)
+def load_template(name: str) -> Template:
+    """Read and compile a template from app/templates once per process."""
+    return Template((TEMPLATE_DIR / name).read_text(encoding="utf-8"))
+
+def _money(value: float) -> str:
+    return f"{value:,.2f}"
+
+def render_invoice_html(details: dict) -> str:
+    """
+    Render an invoice draft to HTML for the PDF renderer.
+
+    Every value is HTML-escaped, so the same draft always renders to the same
+    document and nothing in a row description can inject markup.
+
+    Args:
+        details (dict): Invoice details as returned by get_invoice_details.
+
+    Returns:
+        str: Complete HTML document.
+    """
+    row_template = load_template("invoice_row.html")
+    rows = "".join(
+        row_template.substitute(
+            no=row["no"],
+            description=escape(row["description"]),
+            quantity=row["quantity"],
+            price=_money(row["price"]),
+            subtotal=_money(row["subtotal"]),
+        )
+        for row in details["table_data"]
+    )
+    return load_template("invoice.html").substitute(
+        date_issued=escape(details["date_issued"]),
+        invoice_number=escape(details["invoice_number"]),
+        issued_to_name=escape(details["issued_to"]["name"]),
+        issued_to_address=escape(details["issued_to"]["address"]),
+        bank_name=escape(details["bank_details"]["bank_name"]),
+        account_no=escape(details["bank_details"]["account_no"]),
+        currency=CURRENCY,
+        rows=rows.rstrip("\n"),
+        grand_total=_money(details["grand_total"]),
+    )
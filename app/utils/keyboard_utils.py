@@ -22,4 +22,21 @@ def get_invoice_keyboard():
         ]
         for i in range(0, len(INVOICE_OPTIONS), 2)
     ]
-    return InlineKeyboardMarkup(keyboard)
\ No newline at end of file
+    return InlineKeyboardMarkup(keyboard)
+
+# Callback data prefix of the "More results" button; the offset follows it
+SEARCH_CALLBACK_PREFIX = "search:"
+
+def get_search_keyboard(next_offset: int):
+    """
+    Create an inline keyboard with a button fetching the next page of search results.
+
+    Args:
+        next_offset (int): Offset of the first result on the next page.
+
+    Returns:
+        InlineKeyboardMarkup: Telegram inline keyboard with a "More results" button.
+    """
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("More results", callback_data=f"{SEARCH_CALLBACK_PREFIX}{next_offset}")]
+    ])
@@ -1,31 +1,66 @@
-from xhtml2pdf import pisa
 from io import BytesIO
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def generate_pdf(html_content: str, output_path: str, return_bytes: bool = False):
+# Small document rendered once per worker to load fonts and the default CSS
+WARMUP_HTML = """
+<html><head><meta charset="UTF-8"><style>body { font-family: Helvetica; } td { padding: 4px; }</style></head>
+<body><h1>Invoice</h1><table><tr><th>NO</th><td>1</td><td>0.00</td></tr></table></body></html>
+"""
+
+class PDFRenderError(Exception):
+    """Raised when a backend cannot render a document."""
+
+def _render_xhtml2pdf(html_content: str) -> bytes:
+    from xhtml2pdf import pisa
+
+    output = BytesIO()
+    pisa_status = pisa.CreatePDF(html_content, dest=output, encoding='UTF-8')
+    if pisa_status.err:
+        logger.error("PDF generation failed with error code: %s", pisa_status.err)
+        raise PDFRenderError("PDF generation failed")
+    return output.getvalue()
+
+def _render_weasyprint(html_content: str) -> bytes:
+    # Imported lazily: WeasyPrint needs the Pango system libraries
+    from weasyprint import HTML
+
     try:
-        # Ensure UTF-8 encoding
-        html_content = html_content.encode('utf-8').decode('utf-8')
-        # Convert HTML to PDF
-        output = BytesIO()
-        pisa_status = pisa.CreatePDF(html_content, dest=output, encoding='UTF-8')
-        if pisa_status.err:
-            logger.error("PDF generation failed with error code: %s", pisa_status.err)
-            raise Exception("PDF generation failed")
-        
-        # Save to file
-        with open(output_path, 'wb') as pdf_file:
-            pdf_file.write(output.getvalue())
-        
-        logger.info("PDF generated successfully at: %s", output_path)
-        
-        # Return byte stream if requested
-        if return_bytes:
-            return output.getvalue()
+        return HTML(string=html_content).write_pdf()
     except Exception as e:
-        logger.error("Error during PDF generation: %s", str(e))
-        raise
\ No newline at end of file
+        logger.error("PDF generation failed: %s", e)
+        raise PDFRenderError("PDF generation failed") from e
+
+# HTML-to-PDF backends, selected by PDF_BACKEND
+HTML_BACKENDS = {
+    "xhtml2pdf": _render_xhtml2pdf,
+    "weasyprint": _render_weasyprint,
+}
+
+def render_pdf(html_content: str, backend: str = "xhtml2pdf") -> bytes:
+    """
+    Render HTML to PDF bytes in memory.
+
+    Runs in a render worker process, so it must stay a module-level function.
+
+    Args:
+        html_content (str): Complete HTML document.
+        backend (str): Name of an HTML_BACKENDS entry.
+
+    Returns:
+        bytes: The PDF document.
+
+    Raises:
+        PDFRenderError: If the backend reports an error.
+        ValueError: If the backend is unknown.
+    """
+    try:
+        render = HTML_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown PDF backend: {backend}") from None
+    return render(html_content)
+
+def warm_renderer(backend: str = "xhtml2pdf"):
+    """Process pool initializer: import the backend and render once so the first request is not cold."""
+    render_pdf(WARMUP_HTML, backend)
@@ -0,0 +1,122 @@
+from io import BytesIO
+import fitz  # PyMuPDF
+import pdfplumber
+
+# Extraction backends
+BACKEND_AUTO = "auto"
+BACKEND_PYMUPDF = "pymupdf"
+BACKEND_PDFPLUMBER = "pdfplumber"
+
+# Table detection: pages sampled and ruling lines per page that mark a table-heavy layout
+TABLE_SAMPLE_PAGES = 3
+TABLE_RULE_THRESHOLD = 12
+
+def open_pdf(source: bytes | bytearray | str) -> fitz.Document:
+    """Open a PDF from in-memory bytes or a file path with PyMuPDF."""
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=bytes(source), filetype="pdf")
+    return fitz.open(source)
+
+def _count_rules(page: fitz.Page) -> int:
+    """Count horizontal and vertical line segments and thin rectangles drawn on a page."""
+    rules = 0
+    for drawing in page.get_drawings():
+        for item in drawing["items"]:
+            if item[0] == "l":
+                start, end = item[1], item[2]
+                if abs(start.x - end.x) < 1 or abs(start.y - end.y) < 1:
+                    rules += 1
+            elif item[0] == "re":
+                rect = item[1]
+                if rect.width < 2 or rect.height < 2:
+                    rules += 1
+                else:
+                    rules += 4  # A cell border
+    return rules
+
+def is_table_heavy(doc: fitz.Document) -> bool:
+    """Return True when the first pages are dominated by ruled tables."""
+    for page_number in range(min(TABLE_SAMPLE_PAGES, doc.page_count)):
+        if _count_rules(doc[page_number]) >= TABLE_RULE_THRESHOLD:
+            return True
+    return False
+
+def choose_backend(doc: fitz.Document, backend: str = BACKEND_AUTO) -> str:
+    """Resolve the backend for a document: PyMuPDF unless the layout is table-heavy."""
+    if backend != BACKEND_AUTO:
+        return backend
+    return BACKEND_PDFPLUMBER if is_table_heavy(doc) else BACKEND_PYMUPDF
+
+def _extract_pymupdf(doc: fitz.Document, start: int, end: int) -> list[str]:
+    pages = []
+    for page_number in range(start, end):
+        text = doc[page_number].get_text("text")
+        if text:
+            pages.append(text.rstrip("\n"))
+    return pages
+
+def _extract_pdfplumber(source: bytes | bytearray | str, start: int, end: int) -> list[str]:
+    pages = []
+    stream = BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    with pdfplumber.open(stream, pages=list(range(start + 1, end + 1))) as pdf:
+        for page in pdf.pages:
+            text = page.extract_text()
+            if text:
+                pages.append(text)
+    return pages
+
+def extract_page_range(source: bytes | bytearray | str, start: int, end: int, backend: str) -> str:
+    """
+    Extract the text of pages [start, end) with a resolved backend.
+
+    Runs in a worker process, so it must stay a module-level function.
+    """
+    if backend == BACKEND_PYMUPDF:
+        with open_pdf(source) as doc:
+            return "\n".join(_extract_pymupdf(doc, start, min(end, doc.page_count)))
+    return "\n".join(_extract_pdfplumber(source, start, end))
+
+def page_ranges(page_count: int, shards: int) -> list[tuple[int, int]]:
+    """Split page_count pages into at most `shards` contiguous [start, end) ranges."""
+    size = max(1, -(-page_count // max(1, shards)))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+def extract_or_plan(source: bytes | bytearray | str, backend: str, shard_threshold: float) -> tuple[str | None, int, str]:
+    """
+    Extract small PDFs directly, or report what is needed to shard large ones.
+
+    Runs in a worker process, so it must stay a module-level function.
+
+    Args:
+        source (bytes | bytearray | str): PDF bytes or a path to the PDF.
+        backend (str): auto, pymupdf or pdfplumber.
+        shard_threshold (float): Page count from which extraction is left to the caller to shard.
+
+    Returns:
+        tuple: (text or None when the PDF should be sharded, page count, resolved backend).
+    """
+    with open_pdf(source) as doc:
+        page_count = doc.page_count
+        backend = choose_backend(doc, backend)
+        if page_count >= shard_threshold:
+            return None, page_count, backend
+        if backend == BACKEND_PYMUPDF:
+            return "\n".join(_extract_pymupdf(doc, 0, page_count)), page_count, backend
+    return "\n".join(_extract_pdfplumber(source, 0, page_count)), page_count, backend
+
+def extract_text(source: bytes | bytearray | str, backend: str = BACKEND_AUTO) -> str:
+    """
+    Extract the text of a PDF in a single pass, without temporary files.
+
+    Runs in a worker process, so it must stay a module-level function.
+
+    Args:
+        source (bytes | bytearray | str): PDF bytes or a path to the PDF.
+        backend (str): auto, pymupdf or pdfplumber. auto uses PyMuPDF and
+            switches to pdfplumber for table-heavy layouts.
+
+    Returns:
+        str: Text of all pages joined with newlines.
+    """
+    text, _, _ = extract_or_plan(source, backend, shard_threshold=float("inf"))
+    return text
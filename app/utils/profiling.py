@@ -0,0 +1,69 @@
+import os
+import time
+import tracemalloc
+
+# Allocations listed in a tracemalloc report
+TRACEMALLOC_TOP = 25
+
+_IGNORED_FILES = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+)
+
+def profile_path(directory: str, prefix: str, suffix: str) -> str:
+    """Return a new file path in `directory`, named by prefix, local time and process id."""
+    os.makedirs(directory, exist_ok=True)
+    now = time.time()
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"{now % 1:.3f}"[1:]
+    return os.path.join(directory, f"{prefix}-{stamp}-{os.getpid()}{suffix}")
+
+def traced_call(tag: str, directory: str, frames: int, func, *args, **kwargs):
+    """
+    Call func(*args, **kwargs) under tracemalloc and write a report of its allocations.
+
+    Meant to run in a pool worker. Writes `tracemalloc-<tag>-...snapshot`
+    (load it with tracemalloc.Snapshot.load) holding the memory still
+    allocated when the call returned, and a `.txt` summary with the call's
+    duration, its peak traced memory and the lines whose allocations grew
+    the most during the call. Nothing is written if func raises.
+
+    Args:
+        tag (str): Path being traced, e.g. "extract" or "render".
+        directory (str): Where the snapshot and summary are written.
+        frames (int): Traceback depth stored per allocation.
+        func: The function to call.
+
+    Returns:
+        The function's return value.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(frames)
+    try:
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot().filter_traces(_IGNORED_FILES)
+        start_time = time.perf_counter()
+        result = func(*args, **kwargs)
+        duration = time.perf_counter() - start_time
+        after = tracemalloc.take_snapshot().filter_traces(_IGNORED_FILES)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        # Tracing slows every allocation, so it only lasts for this call
+        if started:
+            tracemalloc.stop()
+
+    path = profile_path(directory, f"tracemalloc-{tag}", ".snapshot")
+    after.dump(path)
+    lines = [
+        f"{tag}: {getattr(func, '__qualname__', repr(func))}",
+        f"duration: {duration:.3f} s",
+        f"peak traced memory: {peak / 1024:.1f} KiB",
+        f"traced memory at return: {current / 1024:.1f} KiB",
+        "",
+        f"Top {TRACEMALLOC_TOP} lines by growth during the call:",
+    ]
+    lines.extend(str(stat) for stat in after.compare_to(before, "lineno")[:TRACEMALLOC_TOP])
+    with open(os.path.splitext(path)[0] + ".txt", "w", encoding="utf-8") as summary:
+        summary.write("\n".join(lines) + "\n")
+    return result
@@ -1,9 +1,32 @@
+// The server keeps the invoice as a draft; remember its id across page loads
+const DRAFT_KEY = 'invoiceDraftId';
+
+function showInvoice(data) {
+    document.getElementById('date').textContent = data.date_issued;
+    document.getElementById('invoiceNo').textContent = data.invoice_number || '';
+    updateTable(data.table_data, data.grand_total);
+}
+
 async function fetchInvoiceDetails() {
-    const response = await fetch('http://localhost:8000/invoice/');
+    // Reading never creates a draft; without one the server returns a blank invoice
+    const draftId = localStorage.getItem(DRAFT_KEY);
+    const query = draftId ? `?draft_id=${encodeURIComponent(draftId)}` : '';
+    let response = await fetch(`http://localhost:8000/invoice/${query}`);
+    if (response.status === 404) {
+        // The draft expired
+        localStorage.removeItem(DRAFT_KEY);
+        response = await fetch('http://localhost:8000/invoice/');
+    }
+    showInvoice(await response.json());
+}
+
+async function createDraft() {
+    // The invoice number is assigned here, when the first row is added
+    const response = await fetch('http://localhost:8000/invoice/', { method: 'POST' });
     const data = await response.json();
-    document.getElementById('date').textContent = data.date_issued;
-    document.getElementById('invoiceNo').textContent = data.invoice_number;
-    updateTable(data.table_data);
+    localStorage.setItem(DRAFT_KEY, data.draft_id);
+    showInvoice(data);
+    return data.draft_id;
 }
 
 async function addRow() {
@@ -12,13 +35,26 @@ async function addRow() {
     const price = parseFloat(document.getElementById('price').value);
 
     if (description && quantity > 0 && price >= 0) {
+        const draftId = localStorage.getItem(DRAFT_KEY) || await createDraft();
         const response = await fetch('http://localhost:8000/invoice/add_row', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ description, quantity, price })
+            body: JSON.stringify({ draft_id: draftId, description, quantity, price })
         });
+        if (response.status === 404) {
+            // The draft expired; the next row starts a new one
+            localStorage.removeItem(DRAFT_KEY);
+            await fetchInvoiceDetails();
+            alert('Your invoice draft expired. Add the row again to start a new invoice.');
+            return;
+        }
         const data = await response.json();
-        updateTable(data.table_data);
+        if (!response.ok) {
+            alert(data.detail);
+            return;
+        }
+        appendRow(data.row);
+        document.getElementById('grandTotal').textContent = data.grand_total.toFixed(2);
         document.getElementById('description').value = '';
         document.getElementById('quantity').value = '';
         document.getElementById('price').value = '';
@@ -27,22 +63,22 @@ async function addRow() {
     }
 }
 
-function updateTable(data) {
-    const tbody = document.getElementById('tableBody');
-    tbody.innerHTML = '';
-    let grandTotal = 0;
-    data.forEach(row => {
-        const tr = document.createElement('tr');
-        tr.innerHTML = `
-            <td>${row.no}</td>
-            <td>${row.description}</td>
-            <td>${row.quantity}</td>
-            <td>₹${row.price.toFixed(2)}</td>
-            <td>₹${row.subtotal.toFixed(2)}</td>
-        `;
-        tbody.appendChild(tr);
-        grandTotal += row.subtotal;
-    });
+function appendRow(row) {
+    const tr = document.createElement('tr');
+    tr.innerHTML = `
+        <td>${row.no}</td>
+        <td></td>
+        <td>${row.quantity}</td>
+        <td>₹${row.price.toFixed(2)}</td>
+        <td>₹${row.subtotal.toFixed(2)}</td>
+    `;
+    tr.children[1].textContent = row.description;
+    document.getElementById('tableBody').appendChild(tr);
+}
+
+function updateTable(data, grandTotal) {
+    document.getElementById('tableBody').innerHTML = '';
+    data.forEach(appendRow);
     document.getElementById('grandTotal').textContent = grandTotal.toFixed(2);
 }
 
@@ -80,14 +116,13 @@ async function generatePDFContent() {
 }
 
 async function downloadPDF() {
-    const htmlContent = await generatePDFContent();
-    
-    // Send HTML content to backend for PDF generation
-    const response = await fetch('http://localhost:8000/invoice/generate_pdf', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ html: htmlContent })
-    });
+    // The server renders the PDF from the stored draft
+    if (!localStorage.getItem(DRAFT_KEY)) {
+        alert('Add a row to the invoice first.');
+        return;
+    }
+    const draftId = encodeURIComponent(localStorage.getItem(DRAFT_KEY));
+    const response = await fetch(`http://localhost:8000/invoice/pdf?draft_id=${draftId}`);
     
     if (!response.ok) {
         throw new Error(`PDF generation failed: ${response.statusText}`);
@@ -0,0 +1,45 @@
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+from app.middleware.upload_limit import add_upload_limit_middleware
+
+MAX_BYTES = 1024
+
+def _client() -> TestClient:
+    app = FastAPI()
+    add_upload_limit_middleware(app, MAX_BYTES)
+
+    @app.post("/pdf/upload")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    return TestClient(app)
+
+def _multipart(payload: bytes) -> tuple[bytes, str]:
+    boundary = "limit-test"
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.pdf\"\r\n"
+        f"Content-Type: application/pdf\r\n\r\n"
+    ).encode() + payload + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+def _chunked(body: bytes, chunk_size: int = 256):
+    # A generator body is sent without Content-Length
+    for start in range(0, len(body), chunk_size):
+        yield body[start:start + chunk_size]
+
+def test_chunked_body_over_limit_is_413():
+    body, content_type = _multipart(b"x" * (MAX_BYTES * 4))
+    response = _client().post("/pdf/upload", content=_chunked(body), headers={"Content-Type": content_type})
+    assert response.status_code == 413
+    assert response.json() == {"detail": f"Upload exceeds the {MAX_BYTES} byte limit"}
+
+def test_chunked_body_under_limit_passes():
+    body, content_type = _multipart(b"x" * 100)
+    response = _client().post("/pdf/upload", content=_chunked(body), headers={"Content-Type": content_type})
+    assert response.status_code == 200
+    assert response.json() == {"size": 100}
+
+def test_content_length_over_limit_is_413():
+    body, content_type = _multipart(b"x" * (MAX_BYTES * 4))
+    response = _client().post("/pdf/upload", content=body, headers={"Content-Type": content_type})
+    assert response.status_code == 413